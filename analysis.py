@@ -1,36 +1,27 @@
 # analysis.py
 import pandas as pd
+from compatibility import contar_participacion_prendas
 
-def analizar_prenda_mvp(armario_df: pd.DataFrame, lista_de_atuendos_validos: list):
+def analizar_prenda_mvp(armario_df: pd.DataFrame, matriz=None, umbral_puntuacion=0.6):
     """
     Analiza un armario para encontrar la prenda más valiosa (MVP) basándose
     en la cantidad de atuendos VÁLIDOS y estilísticamente coherentes en los que participa.
+    Los conteos se obtienen directamente de las tablas de compatibilidad, sin generar los atuendos.
 
     Args:
         armario_df (pd.DataFrame): El DataFrame con las prendas del armario seleccionado.
-        lista_de_atuendos_validos (list): La lista de tuplas con los IDs de los atuendos válidos.
+        matriz (MatrizCompatibilidad, opcional): Núcleo de compatibilidad del catálogo, si ya existe.
+        umbral_puntuacion (float): Puntuación mínima para que un atuendo cuente como válido.
 
     Returns:
         dict: Un diccionario con la información de la prenda MVP y sus estadísticas.
     """
-    if armario_df.empty or not lista_de_atuendos_validos:
+    if armario_df.empty:
         return None
 
-    # Crear un diccionario para contar la participación de cada prenda
-    # La clave es el ID de la prenda, el valor es su conteo.
-    conteo_de_participacion = {prenda_id: 0 for prenda_id in armario_df.index}
-
-    # Iterar sobre cada atuendo válido y sumar 1 a cada prenda que lo compone
-    for atuendo in lista_de_atuendos_validos:
-        for prenda_id in atuendo:
-            if prenda_id in conteo_de_participacion:
-                conteo_de_participacion[prenda_id] += 1
-    
-    # Crear un DataFrame con los resultados para un manejo más fácil
-    df_versatilidad = pd.DataFrame(
-        list(conteo_de_participacion.items()), 
-        columns=['ID', 'Poder_Combinacion_Real']
-    ).set_index('ID')
+    # Número de atuendos válidos en los que participa cada prenda (índice = ID de la prenda).
+    conteo_de_participacion = contar_participacion_prendas(armario_df, umbral_puntuacion, matriz=matriz)
+    df_versatilidad = conteo_de_participacion.rename('Poder_Combinacion_Real').to_frame()
 
     # Unir esta información con los nombres y tipos de las prendas
     ranking_completo_df = armario_df.join(df_versatilidad)
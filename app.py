@@ -1,6 +1,6 @@
 import streamlit as st
-import pandas as pd
 import os
+import time
 import numpy as np
 
 # --- IMPORTACIONES ACTUALIZADAS ---
@@ -12,15 +12,19 @@ from colorimetry import (
     COLORES_DE_CABELLO,
     PALETAS_POR_ESTACION
 )
-from compatibility import ESTILOS_ROPA
+from compatibility import ESTILOS_ROPA, contar_atuendos_validos, iterar_atuendos_validos
 from genetic_algorithm import EcoClosetAG
-from utils import crear_mood_board, graficar_evolucion_fitness
+from background_jobs import CANCELADO, EN_CURSO, FALLIDO, lanzar_optimizacion
+from utils import graficar_evolucion_fitness, mood_board_en_cache
 from analysis import analizar_prenda_mvp
-from outfit_visualizer import create_outfit_image
+from database import ingerir_catalogo_csv
+from outfit_visualizer import obtener_precargador, preprocesar_catalogo
 from Conocimientos import COLOR_MAP, DESCRIPCIONES_ESTACIONES, PALETAS_POR_ESTACION, TONOS_DE_PIEL, COLORES_DE_OJOS, COLORES_DE_CABELLO, ESTILOS_ROPA
 
 # --- CONFIGURACIÓN Y FUNCIONES AUXILIARES ---
 st.set_page_config(layout="wide", page_title="EcoCloset AG")
+INTERVALO_REFRESCO = 0.5 # Segundos entre dos actualizaciones de la página mientras el AG trabaja en segundo plano.
+ATUENDOS_A_PRECARGAR = 5 # Primeros atuendos de la prenda elegida que se renderizan por adelantado en el explorador.
 
 def color_swatch_html(color_name):
     hex_code = COLOR_MAP.get(color_name, '#FFFFFF')
@@ -33,6 +37,8 @@ if 'historial_fitness' not in st.session_state: st.session_state.historial_fitne
 if 'catalogo_completo' not in st.session_state: st.session_state.catalogo_completo = None
 if 'outfit_index' not in st.session_state: st.session_state.outfit_index = 0
 if 'prenda_seleccionada' not in st.session_state: st.session_state.prenda_seleccionada = None
+if 'fondos_procesados' not in st.session_state: st.session_state.fondos_procesados = False
+if 'trabajo' not in st.session_state: st.session_state.trabajo = None
 
 # --- INTERFAZ PRINCIPAL ---
 st.title("🌿 EcoCloset AG")
@@ -46,72 +52,107 @@ with st.sidebar:
 
     if uploaded_file is not None:
         if st.session_state.catalogo_completo is None:
-             st.session_state.catalogo_completo = pd.read_csv(uploaded_file)
+            # El CSV se valida y se convierte a formato columnar una sola vez; si ya se subió antes
+            # (en esta u otra sesión), se carga directamente desde la versión columnar.
+            try:
+                st.session_state.catalogo_completo = ingerir_catalogo_csv(uploaded_file.getvalue())
+                st.session_state.fondos_procesados = False
+            except ValueError as e:
+                st.error(f"Error: {e}")
     
     if st.session_state.catalogo_completo is not None:
         catalogo_completo = st.session_state.catalogo_completo
+        # Al cargar el catálogo se quitan los fondos de todas sus imágenes en paralelo, una sola vez,
+        # para que el explorador de atuendos no tenga que esperar al modelo en el primer clic.
+        if not st.session_state.fondos_procesados:
+            barra_fondos = st.progress(0, text="Preparando las imágenes del catálogo...")
+            preprocesar_catalogo(catalogo_completo['Imagen'], callback=lambda p, m: barra_fondos.progress(p, text=m))
+            barra_fondos.empty()
+            st.session_state.fondos_procesados = True
+        st.success("¡Catálogo cargado con éxito!")
         
-        required_cols = ['Nombre', 'Tipo', 'Color', 'Estilo', 'Temporada', 'Imagen', 'Sostenibilidad', 'Material']
-        if not all(col in catalogo_completo.columns for col in required_cols):
-            st.error(f"Error: El CSV debe contener las columnas: {', '.join(required_cols)}")
-            st.session_state.catalogo_completo = None
+        st.header("2. Tus Preferencias de Estilo")
+        tam_armario = st.slider("Tamaño del armario cápsula:", 5, 50, 20, help="Define el número total de prendas que deseas.")
+        st.markdown("**¿Cuáles son tus 5 estilos principales?**")
+        estilos_preferidos = st.multiselect("Selecciona hasta 5 estilos que te representen:", options=ESTILOS_ROPA, max_selections=5, default=['Casual', 'Clásico', 'Minimalista'])
+        preferencias_usuario = {}
+        if estilos_preferidos:
+            st.markdown("**Del 1 al 10, ¿qué tanto usas cada estilo?**")
+            for estilo in estilos_preferidos:
+                puntuacion = st.slider(f"Puntuación para '{estilo}':", 1, 10, 5)
+                preferencias_usuario[estilo] = puntuacion
+
+        st.header("3. Tus Imprescindibles")
+        prendas_obligatorias_nombres = st.multiselect("Prendas que DEBEN estar en el armario:", options=catalogo_completo['Nombre'].tolist())
+        prendas_obligatorias_idx = catalogo_completo[catalogo_completo['Nombre'].isin(prendas_obligatorias_nombres)].index.tolist()
+
+        st.header("4. Tu Perfil de Colorimetría")
+        col1, col2 = st.columns([0.8, 0.2])
+        with col1: tono_piel = st.selectbox("Tu tono de piel:", TONOS_DE_PIEL)
+        with col2: st.markdown(color_swatch_html(tono_piel), unsafe_allow_html=True)
+        col1, col2 = st.columns([0.8, 0.2])
+        with col1: color_ojos = st.selectbox("Tu color de ojos:", COLORES_DE_OJOS)
+        with col2: st.markdown(color_swatch_html(color_ojos), unsafe_allow_html=True)
+        col1, col2 = st.columns([0.8, 0.2])
+        with col1: color_pelo = st.selectbox("Tu color de pelo:", COLORES_DE_CABELLO)
+        with col2: st.markdown(color_swatch_html(color_pelo), unsafe_allow_html=True)
+        todos_los_colores = sorted(list(set(catalogo_completo['Color'].unique())))
+        colores_favoritos_usuario = st.multiselect("Tus colores favoritos:", todos_los_colores)
+        if colores_favoritos_usuario:
+            swatches_html = " ".join([color_swatch_html(c) for c in colores_favoritos_usuario])
+            st.markdown(swatches_html, unsafe_allow_html=True)
+
+        estacion_usuario = determinar_estacion_colorimetria(tono_piel, color_ojos, color_pelo)
+        with st.container(border=True):
+            st.subheader(f"Estación sugerida: {estacion_usuario}")
+            st.markdown(DESCRIPCIONES_ESTACIONES.get(estacion_usuario, ""))
+            st.markdown("**Paleta de colores clave:**")
+            colores_estacion = PALETAS_POR_ESTACION.get(estacion_usuario, [])
+            cols = st.columns(5)
+            for i, color in enumerate(colores_estacion[:10]):
+                with cols[i % 5]:
+                    st.markdown(f"{color_swatch_html(color)} {color}", unsafe_allow_html=True)
+        
+        if st.button("✨ ¡Optimizar mi Armario!", type="primary", use_container_width=True):
+            if len(prendas_obligatorias_idx) > tam_armario:
+                st.error("Error: Has seleccionado más prendas imprescindibles que el tamaño total del armario.")
+            else:
+                user_inputs = {'tam_armario': tam_armario, 'preferencias_estilo': preferencias_usuario, 'prendas_obligatorias_idx': prendas_obligatorias_idx, 'estacion_colorimetria': estacion_usuario, 'colores_favoritos': colores_favoritos_usuario}
+                ag = EcoClosetAG(catalogo_df=catalogo_completo, user_inputs=user_inputs)
+                if st.session_state.trabajo is not None:
+                    st.session_state.trabajo.cancelar() # Solo una optimización por sesión: la anterior se detiene.
+                # El AG se ejecuta en segundo plano (si ya se optimizó este mismo catálogo con este mismo
+                # perfil, el resultado sale de la caché); la página muestra su progreso mientras tanto.
+                st.session_state.trabajo = lanzar_optimizacion(ag)
+                st.session_state.resultados = None
+                st.session_state.historial_fitness = None
+
+# --- OPTIMIZACIÓN EN CURSO ---
+if st.session_state.trabajo is not None:
+    trabajo = st.session_state.trabajo
+    estado_trabajo = trabajo.instantanea()
+    if estado_trabajo['estado'] == EN_CURSO:
+        st.header("⏳ Optimizando tu Armario")
+        st.progress(estado_trabajo['progreso'], text=estado_trabajo['mensaje'])
+        if estado_trabajo['mejor_individuo'] is not None:
+            st.metric("Mejor Fitness hasta ahora", f"{estado_trabajo['mejor_fitness']:.4f}")
+            st.line_chart(estado_trabajo['historial'])
+            with st.expander("Ver el mejor armario hasta ahora"):
+                st.dataframe(st.session_state.catalogo_completo.iloc[estado_trabajo['mejor_individuo']][['Nombre', 'Tipo', 'Color', 'Estilo', 'Temporada']])
+        if st.button("⏹️ Detener y quedarme con lo mejor encontrado"):
+            trabajo.cancelar()
+        time.sleep(INTERVALO_REFRESCO)
+        st.rerun()
+    else:
+        st.session_state.trabajo = None
+        if estado_trabajo['estado'] == FALLIDO:
+            st.error(f"La optimización falló: {estado_trabajo['error']}")
         else:
-            st.success("¡Catálogo cargado con éxito!")
-            
-            st.header("2. Tus Preferencias de Estilo")
-            tam_armario = st.slider("Tamaño del armario cápsula:", 5, 50, 20, help="Define el número total de prendas que deseas.")
-            st.markdown("**¿Cuáles son tus 5 estilos principales?**")
-            estilos_preferidos = st.multiselect("Selecciona hasta 5 estilos que te representen:", options=ESTILOS_ROPA, max_selections=5, default=['Casual', 'Clásico', 'Minimalista'])
-            preferencias_usuario = {}
-            if estilos_preferidos:
-                st.markdown("**Del 1 al 10, ¿qué tanto usas cada estilo?**")
-                for estilo in estilos_preferidos:
-                    puntuacion = st.slider(f"Puntuación para '{estilo}':", 1, 10, 5)
-                    preferencias_usuario[estilo] = puntuacion
-
-            st.header("3. Tus Imprescindibles")
-            prendas_obligatorias_nombres = st.multiselect("Prendas que DEBEN estar en el armario:", options=catalogo_completo['Nombre'].tolist())
-            prendas_obligatorias_idx = catalogo_completo[catalogo_completo['Nombre'].isin(prendas_obligatorias_nombres)].index.tolist()
-
-            st.header("4. Tu Perfil de Colorimetría")
-            col1, col2 = st.columns([0.8, 0.2])
-            with col1: tono_piel = st.selectbox("Tu tono de piel:", TONOS_DE_PIEL)
-            with col2: st.markdown(color_swatch_html(tono_piel), unsafe_allow_html=True)
-            col1, col2 = st.columns([0.8, 0.2])
-            with col1: color_ojos = st.selectbox("Tu color de ojos:", COLORES_DE_OJOS)
-            with col2: st.markdown(color_swatch_html(color_ojos), unsafe_allow_html=True)
-            col1, col2 = st.columns([0.8, 0.2])
-            with col1: color_pelo = st.selectbox("Tu color de pelo:", COLORES_DE_CABELLO)
-            with col2: st.markdown(color_swatch_html(color_pelo), unsafe_allow_html=True)
-            todos_los_colores = sorted(list(set(catalogo_completo['Color'].unique())))
-            colores_favoritos_usuario = st.multiselect("Tus colores favoritos:", todos_los_colores)
-            if colores_favoritos_usuario:
-                swatches_html = " ".join([color_swatch_html(c) for c in colores_favoritos_usuario])
-                st.markdown(swatches_html, unsafe_allow_html=True)
-
-            estacion_usuario = determinar_estacion_colorimetria(tono_piel, color_ojos, color_pelo)
-            with st.container(border=True):
-                st.subheader(f"Estación sugerida: {estacion_usuario}")
-                st.markdown(DESCRIPCIONES_ESTACIONES.get(estacion_usuario, ""))
-                st.markdown("**Paleta de colores clave:**")
-                colores_estacion = PALETAS_POR_ESTACION.get(estacion_usuario, [])
-                cols = st.columns(5)
-                for i, color in enumerate(colores_estacion[:10]):
-                    with cols[i % 5]:
-                        st.markdown(f"{color_swatch_html(color)} {color}", unsafe_allow_html=True)
-            
-            if st.button("✨ ¡Optimizar mi Armario!", type="primary", use_container_width=True):
-                if len(prendas_obligatorias_idx) > tam_armario:
-                    st.error("Error: Has seleccionado más prendas imprescindibles que el tamaño total del armario.")
-                else:
-                    with st.spinner('El algoritmo genético está buscando...'):
-                        progress_bar = st.progress(0, text="Iniciando optimización...")
-                        user_inputs = {'tam_armario': tam_armario, 'preferencias_estilo': preferencias_usuario, 'prendas_obligatorias_idx': prendas_obligatorias_idx, 'estacion_colorimetria': estacion_usuario, 'colores_favoritos': colores_favoritos_usuario}
-                        ag = EcoClosetAG(catalogo_df=catalogo_completo, user_inputs=user_inputs)
-                        mejores_armarios, historial_fitness = ag.ejecutar(streamlit_callback=lambda p, m: progress_bar.progress(p, text=m))
-                        st.session_state.resultados = mejores_armarios
-                        st.session_state.historial_fitness = historial_fitness
-                    st.success("¡Optimización completada!")
+            st.session_state.resultados, st.session_state.historial_fitness = trabajo.resultado()
+            if estado_trabajo['estado'] == CANCELADO:
+                st.warning("Optimización detenida: se muestran los mejores armarios encontrados hasta ese momento.")
+            else:
+                st.success("¡Optimización completada!")
 
 st.header("🏆 Tus 3 Mejores Armarios Cápsula")
 if st.session_state.resultados is None:
@@ -126,8 +167,8 @@ else:
             st.subheader(f"Armario Propuesto #{i+1}")
             individuo_ids = armario_data['individuo']
             armario_df = catalogo_completo.iloc[individuo_ids]
-            moodboard_path = f'moodboards_temp/armario_{i+1}.png'
-            crear_mood_board(armario_df, moodboard_path, img_folder='imagenes')
+            # Se reutiliza si ya existe el de este mismo armario (p. ej. al pulsar "Siguiente" en el explorador).
+            moodboard_path = mood_board_en_cache(armario_df, img_folder='imagenes')
             st.image(moodboard_path, caption=f"Mood board del Armario #{i+1}")
 
             st.metric("Puntuación Fitness", f"{armario_data['fitness']:.4f}")
@@ -141,7 +182,7 @@ else:
         fig = graficar_evolucion_fitness(st.session_state.historial_fitness)
         st.pyplot(fig)
 
-    if st.session_state.resultados and 'combinaciones_lista' in st.session_state.resultados[0]:
+    if st.session_state.resultados and 'num_combinaciones' in st.session_state.resultados[0]:
         st.divider()
         # --- SECCIÓN DE ANÁLISIS PROFUNDO CORREGIDA ---
         st.header("🔍 Análisis Profundo del Mejor Armario")
@@ -150,10 +191,9 @@ else:
         mejor_armario_data = st.session_state.resultados[0]
         mejor_armario_ids = mejor_armario_data['individuo']
         mejor_armario_df = st.session_state.catalogo_completo.iloc[mejor_armario_ids]
-        lista_atuendos_validos = mejor_armario_data.get('combinaciones_lista', [])
         
-        # Llamar a la nueva función de análisis con la lista de atuendos
-        analisis_mvp = analizar_prenda_mvp(mejor_armario_df, lista_atuendos_validos)
+        # Participación de cada prenda en los atuendos válidos, calculada sin generar los atuendos
+        analisis_mvp = analizar_prenda_mvp(mejor_armario_df)
         
         if analisis_mvp:
             st.subheader("🏆 Prenda Más Valiosa (MVP)")
@@ -185,9 +225,8 @@ else:
                 st.session_state.outfit_index = 0
 
             prenda_seleccionada_id = mejor_armario_df[mejor_armario_df['Nombre'] == prenda_seleccionada_nombre].index[0]
-            atuendos_filtrados = [outfit for outfit in lista_atuendos_validos if prenda_seleccionada_id in outfit]
-            
-            num_atuendos = len(atuendos_filtrados)
+            # Solo se cuentan los atuendos de la prenda; después se genera únicamente el que se muestra.
+            num_atuendos = contar_atuendos_validos(mejor_armario_df, contiene=prenda_seleccionada_id)
             st.info(f"Se encontraron **{num_atuendos}** combinaciones para **{prenda_seleccionada_nombre}**.")
 
             if num_atuendos > 0:
@@ -202,12 +241,19 @@ else:
                 with col2:
                     with st.container(border=True):
                         st.markdown(f"<p style='text-align: center; font-weight: bold;'>Atuendo {st.session_state.outfit_index + 1} / {num_atuendos}</p>", unsafe_allow_html=True)
-                        outfit_actual_ids = atuendos_filtrados[st.session_state.outfit_index]
+                        def atuendo_en(posicion):
+                            return next(iterar_atuendos_validos(mejor_armario_df, contiene=prenda_seleccionada_id, offset=posicion, limit=1))
+                        outfit_actual_ids = atuendo_en(st.session_state.outfit_index)
+                        # Vecinos del atuendo actual (los de "Anterior" y "Siguiente") y los primeros de la prenda.
+                        vecinos = [atuendo_en((st.session_state.outfit_index + paso) % num_atuendos) for paso in (1, -1)]
+                        primeros = iterar_atuendos_validos(mejor_armario_df, contiene=prenda_seleccionada_id, limit=ATUENDOS_A_PRECARGAR)
                         outfit_actual_df = st.session_state.catalogo_completo.loc[list(outfit_actual_ids)]
-                        outfit_filename = f"outfit_{st.session_state.outfit_index}_{prenda_seleccionada_id}.png"
-                        
+
+                        # Las imágenes se renderizan en segundo plano; normalmente la del atuendo actual ya está lista.
+                        precargador = obtener_precargador()
+                        precargador.precargar(st.session_state.catalogo_completo, [outfit_actual_ids] + vecinos + list(primeros))
                         with st.spinner("Creando visualización del atuendo..."):
-                            imagen_atuendo_path = create_outfit_image(outfit_actual_df, outfit_filename)
+                            imagen_atuendo_path = precargador.obtener(st.session_state.catalogo_completo, outfit_actual_ids)
                         
                         if imagen_atuendo_path:
                             st.image(imagen_atuendo_path, use_container_width=True)
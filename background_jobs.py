@@ -0,0 +1,96 @@
+# background_jobs.py
+import threading
+
+from result_cache import ejecutar_con_cache
+
+# Estados de un trabajo de optimización.
+EN_CURSO = 'en_curso'
+TERMINADO = 'terminado'
+CANCELADO = 'cancelado'
+FALLIDO = 'fallido'
+
+
+class TrabajoOptimizacion:
+    """
+    Optimización del AG que se ejecuta en un hilo en segundo plano. Mientras avanza, publica el
+    progreso, el mejor armario encontrado hasta el momento y el historial de fitness, que se
+    pueden consultar en cualquier momento con `instantanea()` sin bloquear al que lo llama.
+    `cancelar()` pide al AG que se detenga al terminar la generación en curso; el resultado es
+    entonces el de los mejores armarios encontrados hasta ese momento.
+    """
+
+    def __init__(self, ag, cache=None):
+        self.ag = ag
+        self._cache = cache
+        self._cancelacion = threading.Event()
+        self._cerrojo = threading.Lock()
+        self._estado = EN_CURSO
+        self._progreso = 0.0
+        self._mensaje = "Iniciando optimización..."
+        self._mejor_individuo = None
+        self._mejor_fitness = None
+        self._historial = []
+        self._resultado = None # (mejores_armarios, historial) al terminar.
+        self._error = None
+        self._hilo = threading.Thread(target=self._ejecutar, name='optimizacion_ag', daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def _ejecutar(self):
+        try:
+            resultado = ejecutar_con_cache(
+                self.ag, cache=self._cache, streamlit_callback=self._al_progresar,
+                callback_mejor=self._al_mejorar, cancelacion=self._cancelacion,
+            )
+        except Exception as e:
+            with self._cerrojo:
+                self._estado, self._error = FALLIDO, e
+            return
+        with self._cerrojo:
+            self._resultado = resultado
+            self._historial = list(resultado[1])
+            self._estado = CANCELADO if self.ag.estadisticas.get('motivo_parada') == 'cancelado' else TERMINADO
+
+    def _al_progresar(self, progreso, mensaje):
+        with self._cerrojo:
+            self._progreso, self._mensaje = progreso, mensaje
+
+    def _al_mejorar(self, individuo, fitness, historial):
+        with self._cerrojo:
+            self._mejor_individuo, self._mejor_fitness, self._historial = individuo, fitness, historial
+
+    def cancelar(self):
+        """Pide que la optimización se detenga en cuanto termine la generación en curso."""
+        self._cancelacion.set()
+
+    def terminado(self):
+        with self._cerrojo:
+            return self._estado != EN_CURSO
+
+    def esperar(self, timeout=None):
+        """Espera a que el trabajo termine (como mucho `timeout` segundos). Devuelve si ha terminado."""
+        self._hilo.join(timeout)
+        return self.terminado()
+
+    def instantanea(self):
+        """Copia coherente del estado actual: estado, progreso, mensaje, mejor armario, fitness e historial."""
+        with self._cerrojo:
+            return {
+                'estado': self._estado, 'progreso': self._progreso, 'mensaje': self._mensaje,
+                'mejor_individuo': self._mejor_individuo, 'mejor_fitness': self._mejor_fitness,
+                'historial': list(self._historial), 'error': self._error,
+            }
+
+    def resultado(self):
+        """Devuelve `(mejores_armarios, historial)` si el trabajo terminó; relanza el error si falló."""
+        with self._cerrojo:
+            if self._error is not None:
+                raise self._error
+            return self._resultado
+
+
+def lanzar_optimizacion(ag, cache=None):
+    """Inicia `ag` en segundo plano (con la caché de resultados) y devuelve su `TrabajoOptimizacion`."""
+    return TrabajoOptimizacion(ag, cache=cache).iniciar()
@@ -0,0 +1,259 @@
+# batch_recommendations.py
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from colorimetry import determinar_estacion_colorimetria
+from compatibility import MatrizCompatibilidad
+from database import CatalogIndex, cargar_catalogo_columnar
+from genetic_algorithm import EcoClosetAG
+from parallel_evaluation import adjuntar_arrays, liberar_segmentos, publicar_arrays
+from utils import crear_mood_board
+
+# Estado de cada proceso trabajador: el catálogo (memory-mapped) y sus estructuras, construidas una sola vez.
+_contexto_trabajador = None
+_segmentos_trabajador = []
+
+TAREAS_POR_PROCESO = 4 # Perfiles encolados por proceso: mantiene a todos ocupados sin leer el fichero entero.
+
+
+class ContextoLote:
+    """
+    Todo lo que necesita un lote de optimizaciones y es común a todos los perfiles: el catálogo,
+    su índice, el núcleo de compatibilidad y las opciones del lote. Se construye una vez (o se
+    reconstruye en cada proceso sobre memoria compartida) y cada perfil solo crea su propio AG.
+    """
+
+    def __init__(self, catalogo_df, indice, matriz, hiperparametros=None, carpeta_mood_boards=None, img_folder='imagenes'):
+        self.catalogo = catalogo_df
+        self.indice = indice
+        self.matriz = matriz
+        self.hiperparametros = hiperparametros or {} # Atributos del AG que se sobrescriben (p. ej. num_generaciones).
+        self.carpeta_mood_boards = carpeta_mood_boards # None: no se generan mood boards.
+        self.img_folder = img_folder
+
+    @classmethod
+    def desde_catalogo(cls, catalogo_df, **opciones):
+        indice = CatalogIndex(catalogo_df)
+        return cls(catalogo_df, indice, MatrizCompatibilidad(indice), **opciones)
+
+
+def entradas_desde_perfil(perfil, catalogo_df):
+    """
+    Traduce un perfil del fichero de entrada a los `user_inputs` de `EcoClosetAG`.
+    Las prendas obligatorias se pueden dar por nombre (`prendas_obligatorias`) o por ID
+    (`prendas_obligatorias_idx`), y la estación de colorimetría directamente o a partir de
+    `tono_piel`, `color_ojos` y `color_pelo`. Lanza ValueError si el perfil no es válido.
+    """
+    if 'tam_armario' not in perfil:
+        raise ValueError("El perfil no indica 'tam_armario'.")
+    tam_armario = _entero(perfil['tam_armario'], 'tam_armario')
+    if tam_armario < 1:
+        raise ValueError("'tam_armario' debe ser un entero positivo.")
+    obligatorias_idx = perfil.get('prendas_obligatorias_idx', [])
+    if not isinstance(obligatorias_idx, list):
+        raise ValueError("'prendas_obligatorias_idx' debe ser una lista de IDs de prendas.")
+    obligatorias = []
+    for idx in obligatorias_idx:
+        idx = _entero(idx, 'prendas_obligatorias_idx')
+        if idx not in catalogo_df.index:
+            raise ValueError(f"La prenda obligatoria {idx} no está en el catálogo.")
+        if idx not in obligatorias:
+            obligatorias.append(idx)
+    nombres = perfil.get('prendas_obligatorias', [])
+    if not isinstance(nombres, list) or not all(isinstance(nombre, str) for nombre in nombres):
+        raise ValueError("'prendas_obligatorias' debe ser una lista de nombres de prendas.")
+    if nombres:
+        por_nombre = catalogo_df.index[catalogo_df['Nombre'].isin(nombres)].tolist()
+        faltan = set(nombres) - set(catalogo_df.loc[por_nombre, 'Nombre'])
+        if faltan:
+            raise ValueError(f"Prendas obligatorias que no están en el catálogo: {', '.join(sorted(faltan))}")
+        obligatorias += [idx for idx in por_nombre if idx not in obligatorias]
+    if len(obligatorias) > tam_armario:
+        raise ValueError("Hay más prendas obligatorias que el tamaño total del armario.")
+
+    estacion = perfil.get('estacion_colorimetria')
+    if estacion is None and all(perfil.get(rasgo) for rasgo in ('tono_piel', 'color_ojos', 'color_pelo')):
+        estacion = determinar_estacion_colorimetria(perfil['tono_piel'], perfil['color_ojos'], perfil['color_pelo'])
+    return {
+        'tam_armario': tam_armario,
+        'preferencias_estilo': perfil.get('preferencias_estilo', {}),
+        'prendas_obligatorias_idx': obligatorias,
+        'estacion_colorimetria': estacion,
+        'colores_favoritos': perfil.get('colores_favoritos', []),
+    }
+
+
+def _entero(valor, campo):
+    # Acepta enteros y textos con un entero ("10"), pero no booleanos ni números con decimales.
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        raise ValueError(f"'{campo}' solo admite números enteros.")
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValueError(f"'{campo}' solo admite números enteros.") from None
+
+
+def optimizar_perfil(contexto, numero, perfil):
+    """
+    Optimiza un perfil y devuelve su fila de resultados (serializable como JSON). Los perfiles
+    inválidos o que fallan devuelven una fila con 'error' en lugar de detener el lote.
+    """
+    if '_error_lectura' in perfil: # Línea ilegible del fichero de entrada (ver `leer_perfiles`).
+        return {'id': perfil['id'], 'linea': perfil.get('linea'), 'error': perfil['_error_lectura'], 'segundos': 0.0}
+    fila = {'id': perfil.get('id', numero)}
+    inicio = time.perf_counter()
+    try:
+        user_inputs = entradas_desde_perfil(perfil, contexto.catalogo)
+        ag = EcoClosetAG(contexto.catalogo, user_inputs, indice_catalogo=contexto.indice, matriz_compatibilidad=contexto.matriz)
+        for nombre, valor in contexto.hiperparametros.items():
+            setattr(ag, nombre, valor)
+        if perfil.get('semilla') is not None:
+            ag.semilla = perfil['semilla']
+        mejores_armarios, historial = ag.ejecutar()
+
+        armarios = []
+        for posicion, armario_data in enumerate(mejores_armarios):
+            armario_df = contexto.catalogo.iloc[armario_data['individuo']]
+            armario = {
+                'prendas': [_a_python(idx) for idx in armario_df.index],
+                'nombres': armario_df['Nombre'].tolist(),
+                'fitness': float(armario_data['fitness']),
+                'atuendos': float(armario_data['atuendos']),
+                'sostenibilidad_score': float(armario_data['sostenibilidad_score']),
+            }
+            if 'num_combinaciones' in armario_data:
+                armario['num_combinaciones'] = int(armario_data['num_combinaciones'])
+            if contexto.carpeta_mood_boards:
+                armario['mood_board'] = os.path.join(contexto.carpeta_mood_boards, f'perfil_{numero:06d}_armario_{posicion + 1}.png')
+                crear_mood_board(armario_df, armario['mood_board'], img_folder=contexto.img_folder)
+            armarios.append(armario)
+        fila.update({
+            'estacion_colorimetria': user_inputs['estacion_colorimetria'],
+            'armarios': armarios,
+            'historial_fitness': [float(f) for f in historial],
+            'generaciones_usadas': ag.estadisticas['generaciones_usadas'],
+            'motivo_parada': ag.estadisticas['motivo_parada'],
+        })
+    except Exception as e:
+        fila['error'] = f'{type(e).__name__}: {e}'
+    fila['segundos'] = round(time.perf_counter() - inicio, 4)
+    return fila
+
+
+def _a_python(valor):
+    # Las etiquetas del índice pueden ser tipos de NumPy, que JSON no sabe escribir.
+    return valor.item() if hasattr(valor, 'item') else valor
+
+
+def _inicializar_trabajador(carpeta_catalogo, descriptores_indice, categorias, descriptores_matriz, perfiles, opciones):
+    # Se ejecuta una vez por proceso: abre el catálogo columnar y se adjunta a las estructuras compartidas.
+    global _contexto_trabajador, _segmentos_trabajador
+    catalogo_df = cargar_catalogo_columnar(carpeta_catalogo)
+    arrays_indice, segmentos_indice = adjuntar_arrays(descriptores_indice)
+    arrays_matriz, segmentos_matriz = adjuntar_arrays(descriptores_matriz)
+    indice = CatalogIndex.desde_arrays(arrays_indice, categorias, catalogo_df.index)
+    matriz = MatrizCompatibilidad.desde_arrays(arrays_matriz, perfiles, catalogo_df.index)
+    _contexto_trabajador = ContextoLote(catalogo_df, indice, matriz, **opciones)
+    _segmentos_trabajador = segmentos_indice + segmentos_matriz
+
+
+def _optimizar_en_trabajador(numero, perfil):
+    return optimizar_perfil(_contexto_trabajador, numero, perfil)
+
+
+class PoolOptimizacion:
+    """
+    Pool de procesos que optimizan perfiles sobre un mismo catálogo columnar. El índice del
+    catálogo y el núcleo de compatibilidad se construyen una sola vez y se comparten con los
+    procesos en memoria compartida; el catálogo lo abre cada proceso con memory-mapping.
+    `opciones` se pasan a `ContextoLote`.
+    """
+
+    def __init__(self, carpeta_catalogo, num_procesos=None, **opciones):
+        self.contexto = ContextoLote.desde_catalogo(cargar_catalogo_columnar(carpeta_catalogo), **opciones)
+        self.num_procesos = num_procesos or os.cpu_count() or 1
+        self._segmentos = []
+        try:
+            segmentos_indice, descriptores_indice = publicar_arrays(self.contexto.indice.arrays())
+            self._segmentos += segmentos_indice
+            segmentos_matriz, descriptores_matriz = publicar_arrays(self.contexto.matriz.arrays())
+            self._segmentos += segmentos_matriz
+            argumentos = (carpeta_catalogo, descriptores_indice, self.contexto.indice.categorias,
+                          descriptores_matriz, self.contexto.matriz.perfiles, opciones)
+            self._pool = ProcessPoolExecutor(max_workers=self.num_procesos, initializer=_inicializar_trabajador, initargs=argumentos)
+        except Exception:
+            liberar_segmentos(self._segmentos)
+            raise
+
+    def enviar(self, numero, perfil):
+        """Encola la optimización de un perfil y devuelve su Future (con la fila de resultados)."""
+        return self._pool.submit(_optimizar_en_trabajador, numero, perfil)
+
+    def cerrar(self):
+        """Detiene los procesos y libera la memoria compartida."""
+        self._pool.shutdown(cancel_futures=True)
+        liberar_segmentos(self._segmentos)
+        self._segmentos = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cerrar()
+
+
+def optimizar_lote(carpeta_catalogo, perfiles, num_procesos=None, callback=None, **opciones):
+    """
+    Optimiza una secuencia de perfiles sobre el catálogo columnar de `carpeta_catalogo` y va
+    devolviendo sus filas de resultados en el mismo orden que los perfiles, a medida que terminan.
+    Los perfiles se leen a medida que hay procesos libres (ver `PoolOptimizacion`), así que el
+    lote puede ser mucho mayor que la memoria. `callback(num_terminados)` se llama tras cada perfil.
+    """
+    num_procesos = num_procesos or os.cpu_count() or 1
+    if num_procesos == 1: # Sin procesos extra no compensa compartir nada: se optimiza aquí mismo.
+        contexto = ContextoLote.desde_catalogo(cargar_catalogo_columnar(carpeta_catalogo), **opciones)
+        for numero, perfil in enumerate(perfiles):
+            yield optimizar_perfil(contexto, numero, perfil)
+            if callback:
+                callback(numero + 1)
+        return
+
+    with PoolOptimizacion(carpeta_catalogo, num_procesos, **opciones) as pool:
+        pendientes = deque() # Futuros en orden de entrada; se escriben en ese mismo orden.
+        terminados = 0
+        for numero, perfil in enumerate(perfiles):
+            pendientes.append(pool.enviar(numero, perfil))
+            while len(pendientes) >= num_procesos * TAREAS_POR_PROCESO:
+                yield pendientes.popleft().result()
+                terminados += 1
+                if callback:
+                    callback(terminados)
+        while pendientes:
+            yield pendientes.popleft().result()
+            terminados += 1
+            if callback:
+                callback(terminados)
+
+
+def leer_perfiles(ruta):
+    """
+    Lee un fichero JSONL de perfiles, uno por línea (las líneas vacías se ignoran). Una línea
+    que no es un objeto JSON no detiene el lote: se devuelve en su lugar un marcador que
+    `optimizar_perfil` convierte en una fila con 'error' y el número de línea.
+    """
+    with open(ruta, encoding='utf-8') as f:
+        for num_linea, linea in enumerate(f, start=1):
+            if not linea.strip():
+                continue
+            try:
+                perfil = json.loads(linea)
+            except json.JSONDecodeError as e:
+                yield {'id': f'linea_{num_linea}', 'linea': num_linea, '_error_lectura': f'JSONDecodeError: {e.msg} (columna {e.colno})'}
+                continue
+            if not isinstance(perfil, dict):
+                yield {'id': f'linea_{num_linea}', 'linea': num_linea, '_error_lectura': "La línea no es un objeto JSON con un perfil."}
+                continue
+            yield perfil
@@ -0,0 +1,3 @@
+# benchmarks/__init__.py
+# Pruebas de rendimiento de EcoCloset AG. Se ejecutan desde la raíz del repositorio, p. ej.:
+#   python -m benchmarks.bench_ga
@@ -0,0 +1,166 @@
+# benchmarks/bench_ga.py
+"""
+Benchmark reproducible de EcoClosetAG sobre catálogos sintéticos.
+
+Para cada tamaño de catálogo y de armario ejecuta `ejecutar` con una semilla fija y anota
+tiempo de reloj, evaluaciones por segundo, pico de memoria y fitness final en JSON.
+Si se indica una línea base, marca como regresión lo que empeore más de la tolerancia.
+
+    python -m benchmarks.bench_ga --salida resultados.json
+    python -m benchmarks.bench_ga --linea-base benchmarks/linea_base_ga.json
+    python -m benchmarks.bench_ga --guardar-linea-base benchmarks/linea_base_ga.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.synthetic_catalog import generar_catalogo_sintetico
+from compatibility import MatrizCompatibilidad
+from database import CatalogIndex
+from genetic_algorithm import EcoClosetAG
+
+TAMANOS_CATALOGO = (100, 10_000, 100_000)
+TAMANOS_ARMARIO = (10, 15, 25)
+
+# Preferencias fijas del usuario de referencia para que todos los casos sean comparables.
+USUARIO_REFERENCIA = {
+    'preferencias_estilo': {'Casual': 5, 'Clásico': 8, 'Minimalista': 3},
+    'prendas_obligatorias_idx': [0, 5],
+    'estacion_colorimetria': 'Invierno',
+    'colores_favoritos': ['Azul'],
+}
+
+
+def _clave_caso(num_prendas, tam_armario):
+    return f'prendas={num_prendas},armario={tam_armario}'
+
+
+def _ejecutar_ag(catalogo, indice, matriz, tam_armario, args):
+    # Construye y ejecuta un AG nuevo (con la caché vacía) sobre un índice y un núcleo ya construidos.
+    ag = EcoClosetAG(catalogo, dict(USUARIO_REFERENCIA, tam_armario=tam_armario),
+                     indice_catalogo=indice, matriz_compatibilidad=matriz)
+    ag.semilla = args.semilla
+    ag.tam_poblacion = args.poblacion
+    ag.num_generaciones = args.generaciones
+    inicio = time.perf_counter()
+    resultados, historial = ag.ejecutar()
+    return time.perf_counter() - inicio, ag, resultados, historial
+
+
+def medir_caso(catalogo, indice, matriz, tam_armario, args):
+    """Mide un caso (catálogo, tamaño de armario) y devuelve sus métricas como diccionario."""
+    tiempos = []
+    for _ in range(args.repeticiones): # Se toma el mínimo de varias repeticiones: es la medida menos ruidosa.
+        tiempo, ag, resultados, historial = _ejecutar_ag(catalogo, indice, matriz, tam_armario, args)
+        tiempos.append(tiempo)
+    tiempo = min(tiempos)
+
+    # El pico de memoria se mide en una ejecución aparte: tracemalloc ralentiza y falsearía los tiempos.
+    tracemalloc.start()
+    _ejecutar_ag(catalogo, indice, matriz, tam_armario, args)
+    _, pico_memoria = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    evaluaciones = ag.estadisticas['cache_fallos'] # Fitness calculados de verdad (los aciertos de caché no cuentan).
+    return {
+        'num_prendas': indice.num_prendas,
+        'tam_armario': tam_armario,
+        'tiempo_s': tiempo,
+        'tiempos_s': tiempos,
+        'evaluaciones': evaluaciones,
+        'evaluaciones_por_s': evaluaciones / tiempo if tiempo > 0 else None,
+        'pico_memoria_bytes': pico_memoria,
+        'fitness_final': float(resultados[0]['fitness']) if resultados else None,
+        'mejor_fitness_historial': float(historial[-1]) if historial else None,
+        'generaciones_usadas': ag.estadisticas['generaciones_usadas'],
+    }
+
+
+def buscar_regresiones(resultados, linea_base, tolerancia, tolerancia_fitness):
+    """
+    Compara cada caso con el mismo caso de la línea base. Es regresión que el tiempo o la memoria
+    crezcan más de `tolerancia` (fracción) o que el fitness final baje más de `tolerancia_fitness`.
+    """
+    regresiones = []
+    for clave, actual in resultados.items():
+        base = linea_base.get(clave)
+        if base is None:
+            continue
+        for metrica in ('tiempo_s', 'pico_memoria_bytes'):
+            if base[metrica] and actual[metrica] > base[metrica] * (1 + tolerancia):
+                regresiones.append(f'{clave}: {metrica} {base[metrica]:.4g} -> {actual[metrica]:.4g}')
+        if base['fitness_final'] is not None and actual['fitness_final'] is not None:
+            if actual['fitness_final'] < base['fitness_final'] - abs(base['fitness_final']) * tolerancia_fitness:
+                regresiones.append(f"{clave}: fitness_final {base['fitness_final']:.6f} -> {actual['fitness_final']:.6f}")
+    return regresiones
+
+
+def _argumentos(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prendas', type=int, nargs='+', default=list(TAMANOS_CATALOGO), help='Tamaños de catálogo sintético.')
+    parser.add_argument('--armarios', type=int, nargs='+', default=list(TAMANOS_ARMARIO), help='Valores de tam_armario.')
+    parser.add_argument('--semilla', type=int, default=0, help='Semilla del catálogo sintético y del AG.')
+    parser.add_argument('--poblacion', type=int, default=50)
+    parser.add_argument('--generaciones', type=int, default=100)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--salida', help='Fichero JSON donde escribir los resultados (por defecto, la salida estándar).')
+    parser.add_argument('--linea-base', help='JSON de resultados anterior con el que comparar.')
+    parser.add_argument('--guardar-linea-base', help='Guarda los resultados como nueva línea base en esta ruta.')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='Empeoramiento relativo tolerado en tiempo y memoria.')
+    parser.add_argument('--tolerancia-fitness', type=float, default=0.01, help='Caída relativa tolerada del fitness final.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _argumentos(argv)
+    casos = {}
+    for num_prendas in args.prendas:
+        catalogo = generar_catalogo_sintetico(num_prendas, semilla=args.semilla)
+        inicio = time.perf_counter()
+        # El índice y el núcleo de compatibilidad se construyen una vez por catálogo y se comparten entre tamaños de armario.
+        indice = CatalogIndex(catalogo)
+        matriz = MatrizCompatibilidad(indice)
+        tiempo_indice = time.perf_counter() - inicio
+        for tam_armario in args.armarios:
+            caso = medir_caso(catalogo, indice, matriz, tam_armario, args)
+            caso['tiempo_indice_s'] = tiempo_indice
+            casos[_clave_caso(num_prendas, tam_armario)] = caso
+            print(f"{_clave_caso(num_prendas, tam_armario)}: {caso['tiempo_s']:.3f} s, "
+                  f"{caso['evaluaciones_por_s']:.0f} eval/s, fitness {caso['fitness_final']:.4f}", file=sys.stderr)
+
+    informe = {
+        'entorno': {'python': platform.python_version(), 'numpy': np.__version__, 'plataforma': platform.platform()},
+        'parametros': {'semilla': args.semilla, 'poblacion': args.poblacion, 'generaciones': args.generaciones,
+                       'repeticiones': args.repeticiones},
+        'casos': casos,
+    }
+    if args.linea_base:
+        with open(args.linea_base, encoding='utf-8') as f:
+            linea_base = json.load(f)
+        parametros_base = linea_base.get('parametros', {})
+        if any(parametros_base.get(p) != informe['parametros'][p] for p in ('semilla', 'poblacion', 'generaciones')):
+            print('AVISO: la línea base se midió con otros parámetros; la comparación puede no ser válida.', file=sys.stderr)
+        linea_base = linea_base['casos']
+        informe['regresiones'] = buscar_regresiones(casos, linea_base, args.tolerancia, args.tolerancia_fitness)
+        for regresion in informe['regresiones']:
+            print(f'REGRESIÓN {regresion}', file=sys.stderr)
+
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+    if args.guardar_linea_base:
+        with open(args.guardar_linea_base, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    return 1 if informe.get('regresiones') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
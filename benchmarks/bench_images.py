@@ -0,0 +1,220 @@
+# benchmarks/bench_images.py
+"""
+Benchmark del pipeline de imágenes: quitar fondo, decodificar, reescalar, componer y codificar.
+
+Cada etapa se mide por separado sobre las imágenes de `imagenes/` (decodificación agrupada por
+formato) y se informa de la latencia p50/p95 y de los bytes asignados, en JSON. Los bytes se
+dan de dos formas: el pico de memoria de Python (tracemalloc, en una pasada aparte para no
+falsear tiempos) y el tamaño de los píxeles producidos, porque Pillow reserva sus búferes
+fuera del alcance de tracemalloc.
+
+Con `--rembg stub` (o `auto` sin rembg instalado) se usa `benchmarks/rembg_stub.py`, así que el
+benchmark funciona sin conexión y solo con CPU. Todo lo que se escribe va a un directorio temporal.
+
+    python -m benchmarks.bench_images --salida imagenes.json
+"""
+import argparse
+import importlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORMATOS = {'.webp': 'webp', '.avif': 'avif', '.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png'}
+
+
+def _cargar_rembg(modo):
+    # Decide qué rembg se usa: el real, el sustituto local o (auto) el real si está instalado.
+    if modo != 'stub':
+        try:
+            importlib.import_module('rembg')
+            return 'real'
+        except ImportError:
+            if modo == 'real':
+                raise
+    from benchmarks import rembg_stub
+    rembg_stub.instalar()
+    return 'stub'
+
+
+def _bytes_pixeles(imagen):
+    return imagen.width * imagen.height * len(imagen.getbands())
+
+
+def _percentiles(muestras):
+    return {
+        'n': len(muestras),
+        'p50_ms': float(np.percentile(muestras, 50) * 1000),
+        'p95_ms': float(np.percentile(muestras, 95) * 1000),
+        'media_ms': float(np.mean(muestras) * 1000),
+    }
+
+
+class Medidor:
+    """Acumula muestras de tiempo y bytes por etapa y calcula el resumen final."""
+
+    def __init__(self, repeticiones):
+        self.repeticiones = repeticiones
+        self.etapas = {}
+
+    def medir(self, etapa, funcion, preparar=None):
+        """
+        Ejecuta `funcion` `repeticiones` veces (llamando antes a `preparar`, fuera del tiempo medido)
+        y una vez más bajo tracemalloc. `funcion` devuelve una imagen de PIL (o None).
+        """
+        datos = self.etapas.setdefault(etapa, {'tiempos': [], 'bytes_python': [], 'bytes_pixeles': []})
+        for _ in range(self.repeticiones):
+            if preparar:
+                preparar()
+            inicio = time.perf_counter()
+            resultado = funcion()
+            datos['tiempos'].append(time.perf_counter() - inicio)
+        if preparar:
+            preparar()
+        tracemalloc.start()
+        resultado = funcion()
+        datos['bytes_python'].append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        if resultado is not None:
+            datos['bytes_pixeles'].append(_bytes_pixeles(resultado))
+        return resultado
+
+    def resumen(self):
+        return {
+            etapa: dict(_percentiles(datos['tiempos']),
+                        bytes_python_p50=int(np.median(datos['bytes_python'])),
+                        bytes_python_max=int(max(datos['bytes_python'])),
+                        bytes_pixeles_p50=int(np.median(datos['bytes_pixeles'])) if datos['bytes_pixeles'] else 0)
+            for etapa, datos in self.etapas.items()
+        }
+
+
+def _abrir(ruta):
+    from PIL import Image
+    imagen = Image.open(ruta)
+    imagen.load() # Image.open es perezoso: load() fuerza la decodificación completa.
+    return imagen
+
+
+def _reescalar(imagen, tam_maximo=(800, 800)):
+    # Solo el thumbnail de reescale_image_if_needed, sin abrir ni guardar el fichero.
+    imagen = imagen.copy()
+    imagen.thumbnail(tam_maximo)
+    return imagen
+
+
+def _componer_atuendo(imagenes, ancho=350, alto_slot=200):
+    # Misma disposición que outfit_visualizer.create_outfit_image, sin el texto ni la codificación.
+    from PIL import Image
+    lienzo = Image.new('RGBA', (ancho, len(imagenes) * alto_slot), (240, 242, 246, 255))
+    for i, imagen in enumerate(imagenes):
+        imagen = imagen.copy()
+        imagen.thumbnail((ancho - 50, alto_slot - 60))
+        x = ancho // 2 - imagen.width // 2
+        y = i * alto_slot + alto_slot // 2 - imagen.height // 2 - 10
+        lienzo.paste(imagen, (x, y), imagen)
+    return lienzo
+
+
+def _codificar_png(imagen):
+    imagen.save(io.BytesIO(), 'PNG')
+    return imagen
+
+
+def ejecutar_benchmark(args):
+    modo_rembg = _cargar_rembg(args.rembg)
+    carpeta_imagenes = os.path.join(RAIZ, 'imagenes')
+    catalogo = pd.read_csv(os.path.join(RAIZ, 'data', 'prendas.csv'))
+    trabajo = tempfile.mkdtemp(prefix='bench_imagenes_')
+    directorio_original = os.getcwd()
+    os.chdir(trabajo) # utils y outfit_visualizer escriben en carpetas relativas: que lo hagan aquí.
+    try:
+        import utils
+        import outfit_visualizer
+        outfit_visualizer.IMG_FOLDER = carpeta_imagenes
+        medidor = Medidor(args.repeticiones)
+        nombres = sorted(n for n in os.listdir(carpeta_imagenes) if os.path.splitext(n)[1].lower() in FORMATOS)
+        if args.limite:
+            nombres = nombres[:args.limite]
+
+        decodificadas, transparentes = {}, {}
+        for nombre in nombres:
+            ruta = os.path.join(carpeta_imagenes, nombre)
+            formato = FORMATOS[os.path.splitext(nombre)[1].lower()]
+            decodificadas[nombre] = medidor.medir(f'decodificar_{formato}', lambda: _abrir(ruta))
+            medidor.medir('reescalar', lambda: _reescalar(decodificadas[nombre]))
+            # Caché de miniaturas: en frío (sin nada guardado, en memoria ni en disco) y en caliente.
+            salida_reescalado = os.path.join(trabajo, 'reescaladas')
+            cache_reescalado = utils.obtener_cache_miniaturas(os.path.join(salida_reescalado, 'miniaturas'))
+            medidor.medir('reescale_image_if_needed', lambda: _abrir(utils.reescale_image_if_needed(ruta, output_folder=salida_reescalado)),
+                          preparar=lambda: cache_reescalado.vaciar(disco=True))
+            medidor.medir('miniatura_en_cache', lambda: cache_reescalado.obtener(ruta, 800))
+            ruta_transparente = os.path.join(outfit_visualizer.TRANSPARENT_FOLDER, nombre)
+            transparentes[nombre] = medidor.medir(
+                'quitar_fondo', lambda: _abrir(outfit_visualizer.remove_background(nombre)),
+                preparar=lambda: os.path.exists(ruta_transparente) and os.remove(ruta_transparente))
+
+        # Un atuendo de cuatro capas (exterior, top, abajo, calzado) con las imágenes disponibles.
+        capas = []
+        for tipo in ('Exterior', 'Top', 'Pantalón', 'Calzado'):
+            filas = catalogo[(catalogo['Tipo'] == tipo) & catalogo['Imagen'].isin(transparentes)]
+            if not filas.empty:
+                capas.append(filas.iloc[0])
+        atuendo = pd.DataFrame(capas)
+        imagenes_atuendo = [transparentes[nombre] for nombre in atuendo['Imagen']]
+        if imagenes_atuendo:
+            lienzo = medidor.medir('componer_atuendo', lambda: _componer_atuendo(imagenes_atuendo))
+            medidor.medir('codificar_png', lambda: _codificar_png(lienzo))
+            # Extremo a extremo con los fondos ya quitados (quitar_fondo se mide aparte).
+            medidor.medir('create_outfit_image', lambda: _abrir(outfit_visualizer.create_outfit_image(atuendo, 'bench.png')))
+
+        armario = catalogo[catalogo['Imagen'].isin(nombres)]
+        ruta_mood_board = os.path.join(trabajo, 'mood_board.png')
+        crear_mood_board = lambda: (utils.crear_mood_board(armario, ruta_mood_board, img_folder=carpeta_imagenes), _abrir(ruta_mood_board))[1]
+        medidor.medir('crear_mood_board', crear_mood_board, preparar=lambda: utils.obtener_cache_miniaturas().vaciar(disco=True))
+        medidor.medir('crear_mood_board_en_cache', crear_mood_board)
+    finally:
+        os.chdir(directorio_original)
+        shutil.rmtree(trabajo, ignore_errors=True)
+
+    from PIL import __version__ as version_pillow
+    return {
+        'entorno': {'python': platform.python_version(), 'pillow': version_pillow, 'rembg': modo_rembg,
+                    'plataforma': platform.platform()},
+        'parametros': {'repeticiones': args.repeticiones, 'imagenes': len(nombres)},
+        'etapas': medidor.resumen(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones por imagen y etapa.')
+    parser.add_argument('--rembg', choices=('auto', 'real', 'stub'), default='auto', help='Qué implementación de rembg usar.')
+    parser.add_argument('--limite', type=int, help='Usa solo las primeras N imágenes.')
+    parser.add_argument('--salida', help='Fichero JSON donde escribir los resultados (por defecto, la salida estándar).')
+    args = parser.parse_args(argv)
+
+    informe = ejecutar_benchmark(args)
+    for etapa, datos in informe['etapas'].items():
+        print(f"{etapa}: p50 {datos['p50_ms']:.1f} ms, p95 {datos['p95_ms']:.1f} ms, "
+              f"{datos['bytes_pixeles_p50'] / 1e6:.2f} MB de píxeles", file=sys.stderr)
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
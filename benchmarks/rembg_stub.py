@@ -0,0 +1,37 @@
+# benchmarks/rembg_stub.py
+"""
+Sustituto local de `rembg` para medir el pipeline de imágenes sin red ni modelos.
+Imita la interfaz que usa el proyecto (`remove` y `new_session`): devuelve un PNG RGBA en el
+que los píxeles casi blancos pasan a ser transparentes. No pretende recortar bien, solo
+hacer un trabajo de CPU comparable (decodificar, crear la máscara y codificar en PNG).
+"""
+import io
+import sys
+
+from PIL import Image
+
+UMBRAL_BLANCO = 235 # Píxeles con una luminancia por encima de este valor se consideran fondo.
+
+
+def new_session(model_name='u2net', *args, **kwargs):
+    # El sustituto no carga ningún modelo: la sesión es solo el nombre.
+    return model_name
+
+
+def remove(data, session=None, **kwargs):
+    """Quita el fondo (aproximado) de una imagen. Acepta bytes o una imagen de PIL, como rembg."""
+    imagen = data if isinstance(data, Image.Image) else Image.open(io.BytesIO(data))
+    imagen = imagen.convert('RGBA')
+    r, g, b, _ = imagen.split()
+    fondo = Image.merge('RGB', (r, g, b)).convert('L').point(lambda v: 0 if v > UMBRAL_BLANCO else 255)
+    imagen.putalpha(fondo)
+    if isinstance(data, Image.Image):
+        return imagen
+    salida = io.BytesIO()
+    imagen.save(salida, 'PNG')
+    return salida.getvalue()
+
+
+def instalar():
+    """Registra este módulo como `rembg` para que `import rembg` lo use en lugar del paquete real."""
+    sys.modules['rembg'] = sys.modules[__name__]
@@ -0,0 +1,57 @@
+# benchmarks/synthetic_catalog.py
+import numpy as np
+import pandas as pd
+
+from Conocimientos import COLOR_PALETTES, ESTILOS_ROPA, PALETAS_POR_ESTACION, REGLAS_COMBINACION_MATERIAL
+
+# Proporción de cada tipo de prenda en un catálogo sintético (parecida a la de data/prendas.csv).
+# 'Top / Exterior' no tiene papel en los atuendos, como ocurre en el catálogo real.
+PROPORCION_TIPOS = {
+    'Top': 0.34, 'Pantalón': 0.16, 'Falda': 0.06, 'Calzado': 0.16,
+    'Vestido': 0.10, 'Exterior': 0.15, 'Top / Exterior': 0.03,
+}
+TEMPORADAS = ['Todo el año', 'Verano', 'Invierno', 'Otoño', 'Primavera']
+PROB_TODO_EL_ANIO = 0.5
+PROB_ESTILO_COMPUESTO = 0.1 # Estilos como "Streetwear / Casual", que no están en las reglas de combinación.
+
+
+def _vocabulario_colores():
+    # Colores básicos (con categoría Neutro/Cálido/Frío) más los de las paletas estacionales, sin repetir.
+    colores = [color for paleta in COLOR_PALETTES.values() for color in paleta]
+    colores += [color for paleta in PALETAS_POR_ESTACION.values() for color in paleta]
+    return list(dict.fromkeys(colores + ['Multicolor']))
+
+
+def generar_catalogo_sintetico(num_prendas, semilla=0):
+    """
+    Genera un catálogo de `num_prendas` prendas con las mismas columnas que data/prendas.csv,
+    usando los vocabularios de Conocimientos.py. Con la misma semilla se obtiene el mismo catálogo.
+    """
+    rng = np.random.default_rng(semilla)
+    tipos = rng.choice(list(PROPORCION_TIPOS), size=num_prendas, p=list(PROPORCION_TIPOS.values()))
+
+    estilos = np.array(ESTILOS_ROPA, dtype=object)[rng.integers(len(ESTILOS_ROPA), size=num_prendas)]
+    compuestos = rng.random(num_prendas) < PROB_ESTILO_COMPUESTO
+    segundos = np.array(ESTILOS_ROPA, dtype=object)[rng.integers(len(ESTILOS_ROPA), size=compuestos.sum())]
+    estilos[compuestos] = estilos[compuestos] + ' / ' + segundos
+
+    materiales = list(REGLAS_COMBINACION_MATERIAL)
+    colores = _vocabulario_colores()
+    temporadas = np.where(
+        rng.random(num_prendas) < PROB_TODO_EL_ANIO,
+        TEMPORADAS[0],
+        np.array(TEMPORADAS[1:], dtype=object)[rng.integers(len(TEMPORADAS) - 1, size=num_prendas)],
+    )
+
+    ids = np.arange(1, num_prendas + 1)
+    return pd.DataFrame({
+        'ID': ids,
+        'Nombre': [f'Prenda sintética {i}' for i in ids],
+        'Tipo': tipos,
+        'Color': np.array(colores, dtype=object)[rng.integers(len(colores), size=num_prendas)],
+        'Estilo': estilos,
+        'Temporada': temporadas,
+        'Imagen': [f'prenda_{i}.png' for i in ids],
+        'Sostenibilidad': rng.integers(1, 6, size=num_prendas),
+        'Material': np.array(materiales, dtype=object)[rng.integers(len(materiales), size=num_prendas)],
+    })
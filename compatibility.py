@@ -1,8 +1,22 @@
 # compatibility.py
+import heapq
+import numpy as np
 import pandas as pd
-from itertools import product
 from Conocimientos import ESTILOS_ROPA, REGLAS_COMBINACION_ESTILO, REGLAS_COMBINACION_MATERIAL
 
+# Pesos de cada criterio en la puntuación de un par de prendas.
+PESO_ESTILO = 0.70
+PESO_MATERIAL = 0.30
+# Por debajo (o igual) de este valor los estilos se consideran incompatibles y vetan el atuendo.
+UMBRAL_VETO_ESTILO = 0.1
+# Puntos enteros por unidad de puntuación de un atuendo (ver `puntos_atuendos_basicos`).
+ESCALA_PUNTOS = 2 ** 32
+# Papel de cada tipo de prenda al formar atuendos. Los tipos que no aparecen no forman parte de ninguno.
+GRUPOS_ATUENDO = ('top', 'abajo', 'calzado', 'vestido', 'exterior')
+GRUPO_POR_TIPO = {'Top': 'top', 'Pantalón': 'abajo', 'Falda': 'abajo', 'Calzado': 'calzado', 'Vestido': 'vestido', 'Exterior': 'exterior'}
+# Grupos con los que cada grupo forma un atuendo base (Top + Abajo + Calzado o Vestido + Calzado).
+_COMPANEROS_ATUENDO = {'top': ('abajo', 'calzado'), 'abajo': ('top', 'calzado'), 'calzado': ('top', 'abajo', 'vestido'), 'vestido': ('calzado',)}
+
 
 def _get_compatibility_score(reglas, item1, item2):
     """
@@ -13,18 +27,113 @@ def _get_compatibility_score(reglas, item1, item2):
     score2 = reglas.get(item2, {}).get(item1, 0.0)
     return max(score1, score2)
 
-def calcular_puntuacion_atuendo(atuendo_df):
+
+class MatrizCompatibilidad:
+    """
+    Núcleo de puntuación precompilado para un catálogo de prendas.
+
+    Cada prenda se reduce a su perfil (par Estilo/Material) y se precalcula una matriz
+    simétrica perfil x perfil con la puntuación de cada par de prendas
+    (estilo * 0.70 + material * 0.30) y otra con el veto de estilos incompatibles.
+    Puntuar un atuendo queda reducido a búsquedas por índice entero, con los mismos
+    resultados que `calcular_puntuacion_atuendo`.
+    """
+
+    def __init__(self, catalogo):
+        # `catalogo` puede ser el DataFrame del catálogo o un `CatalogIndex` ya construido.
+        if isinstance(catalogo, pd.DataFrame):
+            codigos_estilo, estilos = pd.factorize(catalogo['Estilo'])
+            codigos_material, materiales = pd.factorize(catalogo['Material'])
+            etiquetas = catalogo.index
+        else:
+            codigos_estilo, estilos = catalogo.estilo, catalogo.categorias['Estilo']
+            codigos_material, materiales = catalogo.material, catalogo.categorias['Material']
+            etiquetas = catalogo.etiquetas
+
+        # Perfiles únicos: el catálogo puede ser enorme, pero las combinaciones estilo/material son pocas.
+        # Los valores ausentes (código -1) se tratan como None: no aparecen en las reglas y puntúan 0, igual que NaN.
+        pares = np.stack([np.asarray(codigos_estilo, dtype=np.int64), np.asarray(codigos_material, dtype=np.int64)], axis=1)
+        combinaciones, perfil_por_prenda = np.unique(pares, axis=0, return_inverse=True)
+        self.perfiles = [(estilos[e] if e >= 0 else None, materiales[m] if m >= 0 else None) for e, m in combinaciones.tolist()]
+        self.perfil_por_prenda = np.ascontiguousarray(perfil_por_prenda.reshape(-1), dtype=np.intp)
+
+        num_perfiles = len(self.perfiles)
+        self.puntuacion = np.zeros((num_perfiles, num_perfiles), dtype=np.float64)
+        self.veto = np.zeros((num_perfiles, num_perfiles), dtype=bool)
+        for a, (estilo_a, material_a) in enumerate(self.perfiles):
+            for b, (estilo_b, material_b) in enumerate(self.perfiles):
+                score_estilo = _get_compatibility_score(REGLAS_COMBINACION_ESTILO, estilo_a, estilo_b)
+                score_material = _get_compatibility_score(REGLAS_COMBINACION_MATERIAL, material_a, material_b)
+                self.veto[a, b] = score_estilo <= UMBRAL_VETO_ESTILO
+                self.puntuacion[a, b] = (score_estilo * PESO_ESTILO) + (score_material * PESO_MATERIAL)
+
+        # Traducción de las etiquetas del índice del catálogo a posiciones en el núcleo.
+        self._etiquetas = pd.Index(etiquetas)
+
+    def arrays(self):
+        """Devuelve las tablas del núcleo por nombre (p. ej. para copiarlas a memoria compartida)."""
+        return {'perfil_por_prenda': self.perfil_por_prenda, 'puntuacion': self.puntuacion, 'veto': self.veto}
+
+    @classmethod
+    def desde_arrays(cls, arrays, perfiles, etiquetas):
+        """Reconstruye el núcleo a partir de sus tablas (sin copiarlas), perfiles y etiquetas."""
+        matriz = cls.__new__(cls)
+        matriz.perfil_por_prenda = arrays['perfil_por_prenda']
+        matriz.puntuacion = arrays['puntuacion']
+        matriz.veto = arrays['veto']
+        matriz.perfiles = perfiles
+        matriz._etiquetas = pd.Index(etiquetas)
+        return matriz
+
+    def posiciones(self, etiquetas):
+        """Convierte etiquetas del índice del catálogo en posiciones enteras."""
+        return self._etiquetas.get_indexer(etiquetas)
+
+    def bloque(self, posiciones_filas, posiciones_columnas):
+        """
+        Devuelve el bloque de puntuaciones y el de vetos entre dos grupos de prendas,
+        dados por sus posiciones en el catálogo.
+        """
+        celdas = np.ix_(self.perfil_por_prenda[posiciones_filas], self.perfil_por_prenda[posiciones_columnas])
+        return self.puntuacion[celdas], self.veto[celdas]
+
+    def puntuar_atuendo(self, posiciones):
+        """
+        Puntúa un atuendo dado por las posiciones de sus prendas en el catálogo.
+        Devuelve 0 si algún par de estilos es incompatible.
+        """
+        perfiles = self.perfil_por_prenda[list(posiciones)]
+        if len(perfiles) < 2:
+            return 0.0
+
+        total_score = 0
+        num_comparaciones = 0
+        for i in range(len(perfiles)):
+            for j in range(i + 1, len(perfiles)):
+                if self.veto[perfiles[i], perfiles[j]]:
+                    return 0.0
+                total_score += self.puntuacion[perfiles[i], perfiles[j]]
+                num_comparaciones += 1
+
+        return float(total_score / num_comparaciones)
+
+
+def calcular_puntuacion_atuendo(atuendo_df, matriz=None):
     """
     Calcula la puntuación de compatibilidad de un atuendo (conjunto de prendas).
     Considera tanto el estilo como el material de las prendas.
     Penaliza severamente si los estilos son incompatibles.
+    Si se pasa una `MatrizCompatibilidad` del catálogo, usa sus tablas precalculadas.
     """
+    if matriz is not None:
+        return matriz.puntuar_atuendo(matriz.posiciones(atuendo_df.index))
+
     prendas = [row for _, row in atuendo_df.iterrows()]
     if len(prendas) < 2:
         return 0.0
 
-    peso_estilo = 0.70
-    peso_material = 0.30
+    peso_estilo = PESO_ESTILO
+    peso_material = PESO_MATERIAL
     total_score = 0
     num_comparaciones = 0
 
@@ -37,7 +146,7 @@ def calcular_puntuacion_atuendo(atuendo_df):
             score_material = _get_compatibility_score(REGLAS_COMBINACION_MATERIAL, prenda1['Material'], prenda2['Material'])
             
             # Penalización severa si los estilos son incompatibles.
-            if score_estilo <= 0.1:
+            if score_estilo <= UMBRAL_VETO_ESTILO:
                 return 0.0
             
             puntuacion_par = (score_estilo * peso_estilo) + (score_material * peso_material)
@@ -47,11 +156,71 @@ def calcular_puntuacion_atuendo(atuendo_df):
     return total_score / num_comparaciones if num_comparaciones > 0 else 0.0
 
 
-def calcular_atuendos_ponderados(armario_df: pd.DataFrame) -> float:
+def _puntuaciones_basicos(matriz, pos_tops, pos_abajo, pos_calzados):
+    # Los bloques de pares top x abajo, top x calzado y abajo x calzado se expanden a un
+    # tensor top x abajo x calzado con la puntuación media de cada atuendo (0 si está vetado).
+    punt_ta, veto_ta = matriz.bloque(pos_tops, pos_abajo)
+    punt_tc, veto_tc = matriz.bloque(pos_tops, pos_calzados)
+    punt_ac, veto_ac = matriz.bloque(pos_abajo, pos_calzados)
+    puntuaciones = (punt_ta[:, :, None] + punt_tc[:, None, :] + punt_ac[None, :, :]) / 3
+    vetados = veto_ta[:, :, None] | veto_tc[:, None, :] | veto_ac[None, :, :]
+    return np.where(vetados, 0.0, puntuaciones)
+
+
+def _puntuaciones_vestido(matriz, pos_vestidos, pos_calzados):
+    punt_vc, veto_vc = matriz.bloque(pos_vestidos, pos_calzados)
+    return np.where(veto_vc, 0.0, punt_vc)
+
+
+def sumar_atuendos_basicos(matriz, pos_tops, pos_abajo, pos_calzados):
+    """
+    Suma la puntuación de todos los atuendos Top + Parte de abajo + Calzado formados con
+    las prendas dadas (posiciones en el catálogo). Los atuendos vetados suman 0.
+    """
+    if len(pos_tops) == 0 or len(pos_abajo) == 0 or len(pos_calzados) == 0:
+        return 0.0
+    return float(_puntuaciones_basicos(matriz, pos_tops, pos_abajo, pos_calzados).sum())
+
+
+def sumar_atuendos_vestido(matriz, pos_vestidos, pos_calzados):
+    """
+    Suma la puntuación de todos los atuendos Vestido + Calzado formados con las prendas
+    dadas (posiciones en el catálogo). Los atuendos vetados suman 0.
+    """
+    if len(pos_vestidos) == 0 or len(pos_calzados) == 0:
+        return 0.0
+    return float(_puntuaciones_vestido(matriz, pos_vestidos, pos_calzados).sum())
+
+
+def puntos_atuendos_basicos(matriz, pos_tops, pos_abajo, pos_calzados):
+    """
+    Como `sumar_atuendos_basicos`, pero en puntos enteros (la puntuación de cada atuendo
+    redondeada a múltiplos de 1 / ESCALA_PUNTOS). La suma es exacta: no depende del orden
+    de las prendas y se puede actualizar sumando y restando atuendos sin errores de redondeo.
+    """
+    if len(pos_tops) == 0 or len(pos_abajo) == 0 or len(pos_calzados) == 0:
+        return 0
+    return int(_a_puntos(_puntuaciones_basicos(matriz, pos_tops, pos_abajo, pos_calzados)).sum())
+
+
+def puntos_atuendos_vestido(matriz, pos_vestidos, pos_calzados):
+    """Como `sumar_atuendos_vestido`, pero en puntos enteros (ver `puntos_atuendos_basicos`)."""
+    if len(pos_vestidos) == 0 or len(pos_calzados) == 0:
+        return 0
+    return int(_a_puntos(_puntuaciones_vestido(matriz, pos_vestidos, pos_calzados)).sum())
+
+
+def _a_puntos(puntuaciones):
+    return np.rint(puntuaciones * ESCALA_PUNTOS).astype(np.int64)
+
+
+def calcular_atuendos_ponderados(armario_df: pd.DataFrame, matriz=None) -> float:
     """
     Calcula la puntuación total de calidad de atuendos para un armario.
     Suma las puntuaciones de compatibilidad de cada atuendo válido.
     Considera bonus por variedad de exteriores.
+    Todas las combinaciones se puntúan a la vez con NumPy a partir de los bloques de
+    pares de la `MatrizCompatibilidad` (la del catálogo si se pasa, si no una del armario).
     """
     if armario_df.empty:
         return 0.0
@@ -62,23 +231,19 @@ def calcular_atuendos_ponderados(armario_df: pd.DataFrame) -> float:
     vestidos = armario_df[armario_df['Tipo'] == 'Vestido']
     exteriores = armario_df[armario_df['Tipo'] == 'Exterior']
 
-    puntuacion_total = 0.0
+    # Sin núcleo del catálogo, se compila uno para este armario (sus perfiles son pocos).
+    if matriz is None:
+        matriz = MatrizCompatibilidad(armario_df)
+    pos_tops = matriz.posiciones(tops.index)
+    pos_abajo = matriz.posiciones(partes_de_abajo.index)
+    pos_calzados = matriz.posiciones(calzados.index)
+    pos_vestidos = matriz.posiciones(vestidos.index)
 
+    puntuacion_total = 0.0
     # 1. Evaluar atuendos básicos (Top + Parte de abajo + Calzado)
-    if not (tops.empty or partes_de_abajo.empty or calzados.empty):
-        combinaciones_basicas = list(product(tops.iterrows(), partes_de_abajo.iterrows(), calzados.iterrows()))
-        for (idx_t, top), (idx_p, p_abajo), (idx_c, calzado) in combinaciones_basicas:
-            atuendo_actual_df = pd.DataFrame([top, p_abajo, calzado])
-            puntuacion = calcular_puntuacion_atuendo(atuendo_actual_df)
-            puntuacion_total += puntuacion
-
+    puntuacion_total += sumar_atuendos_basicos(matriz, pos_tops, pos_abajo, pos_calzados)
     # 2. Evaluar atuendos de vestido (Vestido + Calzado)
-    if not (vestidos.empty or calzados.empty):
-        combinaciones_vestido = list(product(vestidos.iterrows(), calzados.iterrows()))
-        for (idx_v, vestido), (idx_c, calzado) in combinaciones_vestido:
-            atuendo_actual_df = pd.DataFrame([vestido, calzado])
-            puntuacion = calcular_puntuacion_atuendo(atuendo_actual_df)
-            puntuacion_total += puntuacion
+    puntuacion_total += sumar_atuendos_vestido(matriz, pos_vestidos, pos_calzados)
     
     # 3. Factor de prendas exteriores (tercera pieza)
     # Una buena selección de exteriores aumenta exponencialmente el valor del armario.
@@ -89,46 +254,221 @@ def calcular_atuendos_ponderados(armario_df: pd.DataFrame) -> float:
     
     return puntuacion_total
 
-def encontrar_atuendos_validos(armario_df: pd.DataFrame, umbral_puntuacion=0.6):
+def _grupos_atuendo(armario_df, contiene):
     """
-    Genera todas las combinaciones de atuendos válidas que superen un umbral de compatibilidad.
-    Incluye combinaciones con y sin prendas exteriores.
+    Devuelve las etiquetas de top, abajo, calzado y vestido del armario (listas) con las que
+    se forman los atuendos base. Si `contiene` es una prenda de atuendo base, se restringen
+    a los atuendos que la incluyen.
     """
-    if armario_df.empty:
-        return []
+    tipos = armario_df['Tipo'].map(GRUPO_POR_TIPO)
+    grupos = {grupo: armario_df.index[(tipos == grupo).to_numpy()] for grupo in GRUPOS_ATUENDO}
+    if contiene is not None:
+        grupo_fijo = GRUPO_POR_TIPO.get(armario_df.at[contiene, 'Tipo'])
+        if grupo_fijo != 'exterior': # Un exterior no restringe los atuendos base, solo sus variantes.
+            companeros = _COMPANEROS_ATUENDO.get(grupo_fijo, ())
+            for grupo in GRUPOS_ATUENDO:
+                if grupo == grupo_fijo:
+                    grupos[grupo] = pd.Index([contiene])
+                elif grupo not in companeros:
+                    grupos[grupo] = grupos[grupo][:0]
+    return tuple(grupos[g].tolist() for g in ('top', 'abajo', 'calzado', 'vestido'))
 
-    tops = armario_df[armario_df['Tipo'] == 'Top']
-    partes_de_abajo = armario_df[armario_df['Tipo'].isin(['Pantalón', 'Falda'])]
-    calzados = armario_df[armario_df['Tipo'] == 'Calzado']
-    vestidos = armario_df[armario_df['Tipo'] == 'Vestido']
-    exteriores = armario_df[armario_df['Tipo'] == 'Exterior']
 
-    atuendos_finales = []
+def _bloques_atuendos_validos(armario_df, umbral_puntuacion, matriz, contiene):
+    """
+    Recorre los atuendos base (sin exterior) válidos por bloques, en el orden de `product`:
+    primero Top x Abajo x Calzado (un bloque por top) y después Vestido x Calzado.
+    Cada bloque es (prefijo, filas, columnas, validos): el atuendo (i, j) es
+    prefijo + (filas[i], columnas[j]) y `validos[i, j]` dice si supera el umbral.
+    Si `contiene` es una prenda de atuendo base, solo se recorren los atuendos que la incluyen.
+    """
+    tops, abajo, calzados, vestidos = _grupos_atuendo(armario_df, contiene)
+    pos_tops, pos_abajo, pos_calzados, pos_vestidos = (matriz.posiciones(g) for g in (tops, abajo, calzados, vestidos))
 
-    # 1. Atuendos básicos
-    if not (tops.empty or partes_de_abajo.empty or calzados.empty):
-        for (idx_t, top), (idx_p, p_abajo), (idx_c, calzado) in product(tops.iterrows(), partes_de_abajo.iterrows(), calzados.iterrows()):
-            atuendo_df = pd.DataFrame([top, p_abajo, calzado])
-            if calcular_puntuacion_atuendo(atuendo_df) >= umbral_puntuacion:
-                atuendos_finales.append((idx_t, idx_p, idx_c))
+    # 1. Atuendos básicos: se evalúa un top cada vez, así solo se calcula hasta donde se lea.
+    if tops and abajo and calzados:
+        punt_ta, veto_ta = matriz.bloque(pos_tops, pos_abajo)
+        punt_tc, veto_tc = matriz.bloque(pos_tops, pos_calzados)
+        punt_ac, veto_ac = matriz.bloque(pos_abajo, pos_calzados)
+        for t, top in enumerate(tops):
+            # Mismo orden de sumas que `puntuar_atuendo`, para obtener exactamente la misma puntuación.
+            puntuaciones = (punt_ta[t][:, None] + punt_tc[t][None, :] + punt_ac) / 3
+            vetados = veto_ta[t][:, None] | veto_tc[t][None, :] | veto_ac
+            yield (top,), abajo, calzados, np.where(vetados, 0.0, puntuaciones) >= umbral_puntuacion
 
     # 2. Atuendos de vestido
-    if not (vestidos.empty or calzados.empty):
-        for (idx_v, vestido), (idx_c, calzado) in product(vestidos.iterrows(), calzados.iterrows()):
-            atuendo_df = pd.DataFrame([vestido, calzado])
-            if calcular_puntuacion_atuendo(atuendo_df) >= umbral_puntuacion:
-                atuendos_finales.append((idx_v, idx_c))
-    
-    # 3. Añadir exteriores a los atuendos existentes
-    if not exteriores.empty and atuendos_finales:
-        atuendos_con_exterior = []
-        for atuendo_base in atuendos_finales:
-            # Añadir una versión del atuendo base sin exterior
-            atuendos_con_exterior.append(atuendo_base)
-            # Y luego, crear nuevas combinaciones con cada prenda exterior
-            for idx_e, exterior in exteriores.iterrows():
-                atuendo_completo_ids = atuendo_base + (idx_e,)
-                atuendos_con_exterior.append(atuendo_completo_ids)
-        return atuendos_con_exterior
+    if vestidos and calzados:
+        punt_vc, veto_vc = matriz.bloque(pos_vestidos, pos_calzados)
+        yield (), vestidos, calzados, np.where(veto_vc, 0.0, punt_vc) >= umbral_puntuacion
+
+
+def _preparar_atuendos(armario_df, matriz, contiene):
+    # Devuelve el núcleo a usar y los sufijos de exterior que se añaden a cada atuendo base.
+    if matriz is None:
+        matriz = MatrizCompatibilidad(armario_df)
+    exteriores = armario_df.index[(armario_df['Tipo'] == 'Exterior').to_numpy()].tolist()
+    if contiene is not None and contiene in exteriores:
+        sufijos = [(contiene,)] # Solo las variantes con ese exterior.
     else:
-        return atuendos_finales
\ No newline at end of file
+        sufijos = [()] + [(exterior,) for exterior in exteriores]
+    return matriz, sufijos
+
+
+def contar_atuendos_validos(armario_df: pd.DataFrame, umbral_puntuacion=0.6, matriz=None, contiene=None):
+    """
+    Cuenta los atuendos que devolvería `encontrar_atuendos_validos` (solo los que incluyen la
+    prenda `contiene`, si se indica) sin construir ninguno.
+    """
+    if armario_df.empty or (contiene is not None and contiene not in armario_df.index):
+        return 0
+    matriz, sufijos = _preparar_atuendos(armario_df, matriz, contiene)
+    bloques = _bloques_atuendos_validos(armario_df, umbral_puntuacion, matriz, contiene)
+    return sum(int(np.count_nonzero(validos)) for _, _, _, validos in bloques) * len(sufijos)
+
+
+def contar_atuendos_posiciones(matriz, grupos, umbral_puntuacion=0.6):
+    """
+    Igual que `contar_atuendos_validos` sin `contiene`, pero a partir de las posiciones de las
+    prendas por papel (`grupos`: grupo de GRUPOS_ATUENDO -> posiciones en el catálogo), así que
+    basta con el núcleo de compatibilidad: no hace falta el DataFrame del armario.
+    """
+    tops, abajo, calzados, vestidos = (grupos.get(g, []) for g in ('top', 'abajo', 'calzado', 'vestido'))
+    num_validos = 0
+    if len(tops) and len(abajo) and len(calzados):
+        num_validos += int(np.count_nonzero(_puntuaciones_basicos(matriz, tops, abajo, calzados) >= umbral_puntuacion))
+    if len(vestidos) and len(calzados):
+        num_validos += int(np.count_nonzero(_puntuaciones_vestido(matriz, vestidos, calzados) >= umbral_puntuacion))
+    return num_validos * (1 + len(grupos.get('exterior', []))) # Cada atuendo base, solo y con cada exterior.
+
+
+def iterar_atuendos_validos(armario_df: pd.DataFrame, umbral_puntuacion=0.6, matriz=None, contiene=None, offset=0, limit=None):
+    """
+    Genera, uno a uno, los atuendos de `encontrar_atuendos_validos` en el mismo orden, empezando
+    en la posición `offset` y devolviendo como mucho `limit`. Con `contiene` solo se generan los
+    atuendos que incluyen esa prenda (etiqueta del índice del armario).
+    Los bloques anteriores a `offset` solo se cuentan, y las variantes con exterior se calculan
+    a partir del atuendo base, así que pedir una página no construye la lista completa.
+    """
+    if armario_df.empty or (contiene is not None and contiene not in armario_df.index) or limit == 0:
+        return
+    matriz, sufijos = _preparar_atuendos(armario_df, matriz, contiene)
+    por_base = len(sufijos)
+    saltar, restantes = offset, limit
+    for prefijo, filas, columnas, validos in _bloques_atuendos_validos(armario_df, umbral_puntuacion, matriz, contiene):
+        num_atuendos = int(np.count_nonzero(validos)) * por_base
+        if saltar >= num_atuendos:
+            saltar -= num_atuendos
+            continue
+        inicio_base, inicio_sufijo = divmod(saltar, por_base)
+        saltar = 0
+        for i, j in np.argwhere(validos)[inicio_base:].tolist(): # argwhere recorre en el orden de `product`.
+            atuendo_base = prefijo + (filas[i], columnas[j])
+            for sufijo in sufijos[inicio_sufijo:]:
+                yield atuendo_base + sufijo
+                if restantes is not None:
+                    restantes -= 1
+                    if restantes == 0:
+                        return
+            inicio_sufijo = 0
+
+
+def contar_participacion_prendas(armario_df: pd.DataFrame, umbral_puntuacion=0.6, matriz=None):
+    """
+    Cuenta en cuántos atuendos de `encontrar_atuendos_validos` participa cada prenda, sin
+    generarlos. Las sumas por ejes de cada bloque de validez dan los atuendos base de cada
+    prenda; cada atuendo base aparece (1 + nº de exteriores) veces y cada exterior una vez
+    por atuendo base. Devuelve una Serie con el índice del armario.
+    """
+    conteos = np.zeros(len(armario_df), dtype=np.int64)
+    if armario_df.empty:
+        return pd.Series(conteos, index=armario_df.index)
+    matriz, sufijos = _preparar_atuendos(armario_df, matriz, None)
+    num_atuendos_base = 0
+    for prefijo, filas, columnas, validos in _bloques_atuendos_validos(armario_df, umbral_puntuacion, matriz, None):
+        conteos[armario_df.index.get_indexer(list(prefijo))] += int(np.count_nonzero(validos))
+        conteos[armario_df.index.get_indexer(filas)] += np.count_nonzero(validos, axis=1)
+        conteos[armario_df.index.get_indexer(columnas)] += np.count_nonzero(validos, axis=0)
+        num_atuendos_base += int(np.count_nonzero(validos))
+
+    conteos *= len(sufijos)
+    exteriores = [sufijo[0] for sufijo in sufijos if sufijo]
+    conteos[armario_df.index.get_indexer(exteriores)] = num_atuendos_base
+    return pd.Series(conteos, index=armario_df.index)
+
+
+def mejores_atuendos(armario_df: pd.DataFrame, k=5, umbral_puntuacion=0.6, matriz=None, contiene=None):
+    """
+    Devuelve los `k` atuendos base de mayor puntuación del armario (o de los que incluyen la prenda
+    `contiene`) como una lista de (atuendo, puntuación), de mejor a peor. Solo cuentan los que
+    superan `umbral_puntuacion`; a igual puntuación va primero el que antes aparece en
+    `encontrar_atuendos_validos`. Si `contiene` es un exterior, se añade a cada atuendo.
+
+    Es una búsqueda de ramificación y poda: tops y partes de abajo se exploran de mayor a menor
+    cota superior (la suma de los mejores pares posibles) y se descartan las ramas cuya cota no
+    alcanza el umbral ni la k-ésima mejor puntuación encontrada.
+    """
+    if armario_df.empty or k <= 0 or (contiene is not None and contiene not in armario_df.index):
+        return []
+    if matriz is None:
+        matriz = MatrizCompatibilidad(armario_df)
+    tops, abajo, calzados, vestidos = _grupos_atuendo(armario_df, contiene)
+    sufijo = (contiene,) if contiene is not None and armario_df.at[contiene, 'Tipo'] == 'Exterior' else ()
+    mejores = [] # Montículo de mínimos con los k mejores: (puntuación, -orden, atuendo).
+
+    def limite():
+        # Puntuación que debe alcanzar una rama para poder entrar entre los k mejores.
+        return max(umbral_puntuacion, mejores[0][0]) if len(mejores) == k else umbral_puntuacion
+
+    def considerar(puntuaciones, orden_base, atuendo):
+        # Añade al montículo las hojas (un vector de calzados) que pueden entrar entre los k mejores.
+        for c in np.flatnonzero(puntuaciones >= limite()).tolist():
+            candidato = (float(puntuaciones[c]), -(orden_base + c), atuendo(c))
+            if len(mejores) < k:
+                heapq.heappush(mejores, candidato)
+            elif candidato[:2] > mejores[0][:2]:
+                heapq.heapreplace(mejores, candidato)
+
+    # 1. Atuendos básicos (Top + Parte de abajo + Calzado)
+    if tops and abajo and calzados:
+        pos_tops, pos_abajo, pos_calzados = (matriz.posiciones(g) for g in (tops, abajo, calzados))
+        punt_ta, veto_ta = matriz.bloque(pos_tops, pos_abajo)
+        punt_tc, veto_tc = matriz.bloque(pos_tops, pos_calzados)
+        punt_ac, veto_ac = matriz.bloque(pos_abajo, pos_calzados)
+        max_tc = punt_tc.max(axis=1) # Mejor calzado posible para cada top...
+        max_ac = punt_ac.max(axis=1) # ...y para cada parte de abajo.
+        cotas_top = (punt_ta.max(axis=1) + max_tc + max_ac.max()) / 3
+        for t in np.argsort(-cotas_top, kind='stable').tolist():
+            if cotas_top[t] < limite():
+                break # Las cotas están ordenadas: ningún top restante puede mejorar.
+            cotas_abajo = np.where(veto_ta[t], 0.0, (punt_ta[t] + max_tc[t] + max_ac) / 3)
+            for a in np.argsort(-cotas_abajo, kind='stable').tolist():
+                if cotas_abajo[a] < limite():
+                    break
+                # Mismo orden de sumas que `puntuar_atuendo`, para obtener exactamente la misma puntuación.
+                puntuaciones = (punt_ta[t, a] + punt_tc[t] + punt_ac[a]) / 3
+                vetados = veto_ta[t, a] | veto_tc[t] | veto_ac[a]
+                considerar(np.where(vetados, 0.0, puntuaciones), (t * len(abajo) + a) * len(calzados),
+                           lambda c: (tops[t], abajo[a], calzados[c]) + sufijo)
+
+    # 2. Atuendos de vestido (Vestido + Calzado)
+    if vestidos and calzados:
+        punt_vc, veto_vc = matriz.bloque(matriz.posiciones(vestidos), matriz.posiciones(calzados))
+        punt_vc = np.where(veto_vc, 0.0, punt_vc)
+        cotas_vestido = punt_vc.max(axis=1)
+        num_basicos = len(tops) * len(abajo) * len(calzados)
+        for v in np.argsort(-cotas_vestido, kind='stable').tolist():
+            if cotas_vestido[v] < limite():
+                break
+            considerar(punt_vc[v], num_basicos + v * len(calzados), lambda c: (vestidos[v], calzados[c]) + sufijo)
+
+    return [(atuendo, puntuacion) for puntuacion, _, atuendo in sorted(mejores, reverse=True)]
+
+
+def encontrar_atuendos_validos(armario_df: pd.DataFrame, umbral_puntuacion=0.6, matriz=None):
+    """
+    Genera todas las combinaciones de atuendos válidas que superen un umbral de compatibilidad.
+    Incluye combinaciones con y sin prendas exteriores: cada atuendo base aparece solo y
+    después con cada exterior. Para recorrerlas por páginas sin construir la lista, usar
+    `iterar_atuendos_validos`.
+    """
+    return list(iterar_atuendos_validos(armario_df, umbral_puntuacion, matriz=matriz))
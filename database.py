@@ -1,18 +1,212 @@
 # database.py
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import numpy as np
 import pandas as pd
+from compatibility import GRUPOS_ATUENDO, GRUPO_POR_TIPO
+from utils import get_color_category
+
+# Columnas que debe tener todo catálogo y las que se guardan como categóricas.
+COLUMNAS_OBLIGATORIAS = ['Nombre', 'Tipo', 'Color', 'Estilo', 'Temporada', 'Imagen', 'Sostenibilidad', 'Material']
+COLUMNAS_CATEGORICAS = ['Tipo', 'Estilo', 'Material', 'Color', 'Temporada']
+CARPETA_CATALOGOS = 'catalogos_columnares'
+VERSION_FORMATO_COLUMNAR = 1
+
 
 def cargar_catalogo(filepath='data/prendas.csv'):
     """
-    Carga el catálogo de prendas desde un archivo CSV.
+    Carga el catálogo de prendas desde un archivo CSV o desde una carpeta con el
+    formato columnar de `guardar_catalogo_columnar`.
     """
     try:
-        df = pd.read_csv(filepath)
+        if os.path.isdir(filepath):
+            df = cargar_catalogo_columnar(filepath)
+        else:
+            df = pd.read_csv(filepath)
         print("Catálogo de prendas cargado exitosamente.")
         return df
     except FileNotFoundError:
         print(f"Error: No se encontró el archivo en la ruta '{filepath}'")
         return None
 
+
+def validar_catalogo(catalogo_df):
+    """
+    Comprueba que el catálogo tiene las columnas obligatorias (lanza ValueError si falta alguna) y
+    devuelve una copia con tipos normalizados: Tipo/Estilo/Material/Color/Temporada como
+    categóricas y Sostenibilidad numérica (NaN si no lo es).
+    """
+    faltan = [columna for columna in COLUMNAS_OBLIGATORIAS if columna not in catalogo_df.columns]
+    if faltan:
+        raise ValueError(f"El CSV debe contener las columnas: {', '.join(COLUMNAS_OBLIGATORIAS)} (faltan: {', '.join(faltan)})")
+    catalogo_df = catalogo_df.copy()
+    for columna in COLUMNAS_CATEGORICAS:
+        catalogo_df[columna] = catalogo_df[columna].astype('category')
+    catalogo_df['Sostenibilidad'] = pd.to_numeric(catalogo_df['Sostenibilidad'], errors='coerce')
+    return catalogo_df
+
+
+def guardar_catalogo_columnar(catalogo_df, carpeta):
+    """
+    Guarda un catálogo validado en formato columnar: un fichero .npy por columna y un
+    `esquema.json` con el tipo de cada columna y sus categorías. Las columnas de texto se
+    guardan como códigos int32 (-1 = ausente) y las numéricas con su propio dtype, así que
+    todas se pueden abrir con memory-mapping. La carpeta se escribe aparte y se renombra al
+    final: quien la lea ve el catálogo completo o no lo ve.
+    """
+    temporal = f'{carpeta}.tmp-{os.getpid()}-{threading.get_ident()}'
+    os.makedirs(temporal)
+    try:
+        columnas = []
+        for posicion, columna in enumerate(catalogo_df.columns):
+            serie = catalogo_df[columna]
+            fichero = f'columna_{posicion}.npy'
+            if isinstance(serie.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(serie.dtype):
+                codigos, categorias = pd.factorize(serie, sort=isinstance(serie.dtype, pd.CategoricalDtype))
+                if isinstance(serie.dtype, pd.CategoricalDtype): # Se conservan las categorías declaradas, aunque no se usen.
+                    categorias = serie.cat.categories
+                    codigos = serie.cat.codes.to_numpy()
+                tipo = 'categoria' if isinstance(serie.dtype, pd.CategoricalDtype) else 'texto'
+                np.save(os.path.join(temporal, fichero), np.ascontiguousarray(codigos, dtype=np.int32))
+                columnas.append({'nombre': columna, 'tipo': tipo, 'fichero': fichero, 'categorias': [str(c) for c in categorias]})
+            else:
+                np.save(os.path.join(temporal, fichero), np.ascontiguousarray(serie.to_numpy()))
+                columnas.append({'nombre': columna, 'tipo': 'numero', 'fichero': fichero})
+        esquema = {'version': VERSION_FORMATO_COLUMNAR, 'num_filas': len(catalogo_df), 'columnas': columnas}
+        if isinstance(catalogo_df.index, pd.RangeIndex) and catalogo_df.index.start == 0 and catalogo_df.index.step == 1:
+            esquema['indice'] = None
+        else:
+            np.save(os.path.join(temporal, 'indice.npy'), catalogo_df.index.to_numpy())
+            esquema['indice'] = 'indice.npy'
+        with open(os.path.join(temporal, 'esquema.json'), 'w', encoding='utf-8') as f:
+            json.dump(esquema, f, ensure_ascii=False)
+        try:
+            os.rename(temporal, carpeta)
+        except OSError: # Otro proceso ya guardó este mismo catálogo.
+            if not os.path.isdir(carpeta):
+                raise
+            shutil.rmtree(temporal, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
+
+
+def leer_esquema_columnar(carpeta):
+    with open(os.path.join(carpeta, 'esquema.json'), encoding='utf-8') as f:
+        esquema = json.load(f)
+    if esquema.get('version') != VERSION_FORMATO_COLUMNAR:
+        raise ValueError(f"Versión de catálogo columnar no soportada: {esquema.get('version')}")
+    return esquema
+
+
+def cargar_catalogo_columnar(carpeta):
+    """
+    Carga un catálogo guardado con `guardar_catalogo_columnar`. Los arrays se abren con
+    memory-mapping y las columnas categóricas se reconstruyen a partir de sus códigos, sin
+    volver a interpretar texto.
+    """
+    esquema = leer_esquema_columnar(carpeta)
+    datos = {}
+    for columna in esquema['columnas']:
+        array = np.load(os.path.join(carpeta, columna['fichero']), mmap_mode='r')
+        if columna['tipo'] == 'numero':
+            datos[columna['nombre']] = np.asarray(array)
+            continue
+        valores = pd.Categorical.from_codes(np.asarray(array), categories=columna['categorias'])
+        datos[columna['nombre']] = valores if columna['tipo'] == 'categoria' else np.asarray(valores, dtype=object)
+    indice = np.load(os.path.join(carpeta, esquema['indice'])) if esquema['indice'] else pd.RangeIndex(esquema['num_filas'])
+    return pd.DataFrame(datos, index=indice)
+
+
+def convertir_catalogo_csv(datos_csv, carpeta_base=CARPETA_CATALOGOS):
+    """
+    Convierte un CSV de catálogo (bytes) al formato columnar, solo si no se convirtió ya, y
+    devuelve la carpeta resultante. La carpeta se nombra con el hash del CSV, así que cualquier
+    sesión o proceso que use el mismo fichero lo carga sin volver a interpretarlo ni a validarlo.
+    Lanza ValueError si al catálogo le faltan columnas obligatorias.
+    """
+    # La versión del formato forma parte del nombre: al cambiarla, los CSV ya convertidos se vuelven a convertir.
+    carpeta = os.path.join(carpeta_base, f'v{VERSION_FORMATO_COLUMNAR}_{hashlib.sha256(datos_csv).hexdigest()}')
+    if not os.path.isdir(carpeta):
+        catalogo_df = validar_catalogo(pd.read_csv(io.BytesIO(datos_csv)))
+        os.makedirs(carpeta_base, exist_ok=True)
+        guardar_catalogo_columnar(catalogo_df, carpeta)
+    return carpeta
+
+
+def ingerir_catalogo_csv(datos_csv, carpeta_base=CARPETA_CATALOGOS):
+    """Como `convertir_catalogo_csv`, pero devuelve directamente el catálogo cargado."""
+    return cargar_catalogo_columnar(convertir_catalogo_csv(datos_csv, carpeta_base))
+
+
+class CatalogIndex:
+    """
+    Índice compacto del catálogo, construido una sola vez a partir de `cargar_catalogo`.
+
+    Cada columna categórica se guarda como un array contiguo de códigos enteros (int32,
+    -1 para valores ausentes) junto a la lista de sus categorías, y la sostenibilidad como
+    float32 (NaN si falta). El algoritmo genético y el núcleo de compatibilidad trabajan
+    sobre estos arrays por posición de prenda en lugar de filtrar DataFrames.
+    """
+    COLUMNAS_CATEGORICAS = {'Tipo': 'tipo', 'Estilo': 'estilo', 'Material': 'material', 'Temporada': 'temporada', 'Color': 'color'}
+    CATEGORIAS_COLOR = ('Neutro', 'Cálido', 'Frío', 'Otro')
+    ARRAYS = ('tipo', 'estilo', 'material', 'temporada', 'color', 'grupo', 'categoria_color', 'sostenibilidad')
+
+    def __init__(self, catalogo_df):
+        self.num_prendas = len(catalogo_df)
+        self.etiquetas = pd.Index(catalogo_df.index) # Etiqueta del DataFrame para cada posición.
+        self.categorias = {}
+        for columna, atributo in self.COLUMNAS_CATEGORICAS.items():
+            codigos, categorias = pd.factorize(catalogo_df[columna])
+            setattr(self, atributo, np.ascontiguousarray(codigos, dtype=np.int32))
+            self.categorias[columna] = list(categorias)
+
+        # Papel de cada prenda en los atuendos (índice en GRUPOS_ATUENDO, -1 si no participa).
+        grupo_por_codigo = np.array(
+            [GRUPOS_ATUENDO.index(GRUPO_POR_TIPO[tipo]) if tipo in GRUPO_POR_TIPO else -1 for tipo in self.categorias['Tipo']] + [-1],
+            dtype=np.int8,
+        )
+        self.grupo = grupo_por_codigo[self.tipo] # El código -1 (tipo ausente) cae en el -1 final.
+
+        # Categoría de cada color (Neutro, Cálido, Frío u Otro), para la regla de colores neutros.
+        categoria_por_codigo = np.array(
+            [self.CATEGORIAS_COLOR.index(get_color_category(color)) for color in self.categorias['Color']] + [self.CATEGORIAS_COLOR.index('Otro')],
+            dtype=np.int8,
+        )
+        self.categoria_color = categoria_por_codigo[self.color]
+
+        self.sostenibilidad = np.ascontiguousarray(pd.to_numeric(catalogo_df['Sostenibilidad'], errors='coerce'), dtype=np.float32)
+
+    def arrays(self):
+        """Devuelve los arrays del índice por nombre (p. ej. para copiarlos a memoria compartida)."""
+        return {nombre: getattr(self, nombre) for nombre in self.ARRAYS}
+
+    @classmethod
+    def desde_arrays(cls, arrays, categorias, etiquetas):
+        """Reconstruye un índice a partir de sus arrays (sin copiarlos), categorías y etiquetas."""
+        indice = cls.__new__(cls)
+        for nombre in cls.ARRAYS:
+            setattr(indice, nombre, arrays[nombre])
+        indice.categorias = categorias
+        indice.etiquetas = pd.Index(etiquetas)
+        indice.num_prendas = len(indice.etiquetas)
+        return indice
+
+    def codigo(self, columna, valor):
+        """Devuelve el código entero de `valor` en `columna`, o None si no aparece en el catálogo."""
+        categorias = self.categorias[columna]
+        return categorias.index(valor) if valor in categorias else None
+
+    def pertenencia_paleta(self, paleta):
+        """Devuelve un array booleano que indica qué prendas tienen un color de la paleta."""
+        en_paleta = np.array([color in paleta for color in self.categorias['Color']] + [False], dtype=bool)
+        return en_paleta[self.color]
+
+
 if __name__ == '__main__':
     # Pequeña prueba para ver si funciona
     catalogo = cargar_catalogo()
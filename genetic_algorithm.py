@@ -1,18 +1,71 @@
 # Importaciones necesarias para el funcionamiento del algoritmo
 import numpy as np  # Para operaciones numéricas, especialmente en la función de fitness.
 import random       # Para todas las operaciones aleatorias: selección, cruce, mutación.
-from compatibility import calcular_atuendos_ponderados, encontrar_atuendos_validos # Importa las funciones "inteligentes" de estilismo.
+import time         # Para espaciar las notificaciones de progreso.
+from collections import Counter, OrderedDict # Para los conteos del estado de fitness y la caché LRU de fitness.
+from compatibility import (  # Importa las funciones "inteligentes" de estilismo.
+    ESCALA_PUNTOS,
+    GRUPOS_ATUENDO,
+    MatrizCompatibilidad,
+    contar_atuendos_posiciones,
+    puntos_atuendos_basicos,
+    puntos_atuendos_vestido,
+)
 from colorimetry import obtener_paleta_recomendada # Para obtener la paleta de colores personalizada del usuario.
-from utils import get_color_category # Utilidad para clasificar colores.
+from database import CatalogIndex # Índice compacto (códigos enteros) del catálogo.
+
+TAM_TORNEO = 5 # Individuos que compiten en cada torneo de selección.
+VERSION_FITNESS = 2 # Cambia con el cálculo del fitness: los resultados guardados con otra versión no se reutilizan.
+
+
+class EstadoFitness:
+    """
+    Estado acumulado del fitness de un armario: prendas por papel en los atuendos, suma de
+    puntuaciones de atuendos, conteos de estilos y temporadas, coincidencias de color y
+    sostenibilidad. Permite recalcular el fitness tras intercambiar una sola prenda
+    tocando únicamente los atuendos en los que participan las dos prendas.
+    """
+
+    def __init__(self):
+        self.grupos = {grupo: [] for grupo in GRUPOS_ATUENDO} # Posiciones de las prendas por papel (top, abajo, calzado...).
+        self.suma_basicos = 0                # Puntos (enteros, ver `puntos_atuendos_basicos`) de los atuendos Top + Parte de abajo + Calzado.
+        self.suma_vestidos = 0               # Puntos (enteros) de los atuendos Vestido + Calzado.
+        self.conteo_estilos = Counter()      # Códigos de estilo (no ausentes) de todas las prendas.
+        self.estilos_exteriores = Counter()  # Códigos de estilo (no ausentes) de las prendas exteriores.
+        self.conteo_temporadas = Counter()   # Códigos de temporada de todas las prendas (-1 si falta el dato).
+        self.coincidencias_color = 0         # Prendas cuyo color encaja con la paleta del usuario.
+        self.suma_sostenibilidad = 0.0       # Suma de sostenibilidad de las prendas con el dato.
+        self.num_sostenibilidad = 0          # Número de prendas con dato de sostenibilidad.
+        self.num_prendas = 0
+
+    def copiar(self):
+        # Copia independiente para derivar el estado de un hijo sin tocar el del padre.
+        copia = EstadoFitness()
+        copia.grupos = {grupo: list(posiciones) for grupo, posiciones in self.grupos.items()}
+        copia.suma_basicos = self.suma_basicos
+        copia.suma_vestidos = self.suma_vestidos
+        copia.conteo_estilos = Counter(self.conteo_estilos)
+        copia.estilos_exteriores = Counter(self.estilos_exteriores)
+        copia.conteo_temporadas = Counter(self.conteo_temporadas)
+        copia.coincidencias_color = self.coincidencias_color
+        copia.suma_sostenibilidad = self.suma_sostenibilidad
+        copia.num_sostenibilidad = self.num_sostenibilidad
+        copia.num_prendas = self.num_prendas
+        return copia
+
 
 class EcoClosetAG:
     # --- 1. Inicialización (`__init__`) ---
     # Esta sección se ejecuta una sola vez, cuando creas una instancia de la clase.
     # Su propósito es configurar el algoritmo con todos los parámetros y datos necesarios.
-    def __init__(self, catalogo_df, user_inputs):
+    def __init__(self, catalogo_df, user_inputs, indice_catalogo=None, matriz_compatibilidad=None):
         # --- Almacenamiento de Datos ---
+        # `catalogo_df` puede ser None si se pasa un índice ya construido y solo se va a evaluar (p. ej. en un proceso de evaluación).
         self.catalogo = catalogo_df  # Guarda el DataFrame completo de prendas para poder consultarlo.
-        self.todos_los_indices = list(range(len(catalogo_df))) # Crea una lista con todos los IDs posibles de prendas (ej. [0, 1, 2, ..., 19]). Esencial para la mutación y creación.
+        self.indice = indice_catalogo if indice_catalogo is not None else CatalogIndex(catalogo_df) # Columnas del catálogo como arrays de códigos; se puede reutilizar uno ya construido.
+        self.todos_los_indices = range(self.indice.num_prendas) # Todos los IDs posibles de prendas (ej. 0, 1, 2, ..., 19), como rango: no ocupa memoria aunque el catálogo sea enorme.
+        # Núcleo precompilado de puntuación por pares de prendas, construido una sola vez por catálogo (o reutilizado si se pasa).
+        self.matriz_compatibilidad = matriz_compatibilidad if matriz_compatibilidad is not None else MatrizCompatibilidad(self.indice)
 
         # --- Hiperparámetros del Algoritmo Genético ---
         # Estos valores definen el comportamiento del algoritmo.
@@ -20,12 +73,27 @@ class EcoClosetAG:
         self.num_generaciones = 100   # Define cuántas veces el ciclo de evolución (selección, cruce, mutación) se repetirá.
         self.prob_cruce = 0.85        # La probabilidad (85%) de que dos padres seleccionados se crucen para crear hijos.
         self.prob_mutacion = 0.10     # La probabilidad (10%) de que un individuo sufra un cambio aleatorio (mutación).
+        self.tam_cache_fitness = 10000 # Máximo de armarios cuyo fitness se memoriza (se descarta el menos usado recientemente). 0 desactiva la caché.
+        self.semilla = None           # Semilla del generador aleatorio para ejecuciones reproducibles. None usa el módulo `random` global.
+        self.num_procesos = None      # Procesos para evaluar el fitness en paralelo. None o 1 evalúa en serie (opcional, útil con armarios grandes).
+        self.tam_bloque_procesos = 8  # Armarios que se envían juntos a cada proceso en el modo paralelo.
+        self.intervalo_callback = 0.1 # Segundos mínimos entre dos notificaciones de progreso (la última generación siempre se notifica).
+
+        # --- Criterios de Parada Anticipada (None desactiva cada uno) ---
+        self.paciencia_estancamiento = None # Se detiene si el mejor fitness no mejora más de `epsilon_mejora` en estas generaciones.
+        self.epsilon_mejora = 1e-6          # Mejora mínima que cuenta como progreso para el criterio de estancamiento.
+        self.fitness_objetivo = None        # Se detiene en cuanto algún armario alcanza este fitness.
+        self.diversidad_minima = None       # Se detiene si la fracción de armarios distintos en la población cae por debajo de este valor.
 
         # --- Restricciones y Preferencias del Usuario ---
         # Estos valores vienen de la interfaz de Streamlit.
         self.tam_armario_deseado = user_inputs['tam_armario'] # El tamaño fijo que debe tener cada armario.
         self.preferencias_estilo = user_inputs.get('preferencias_estilo', {}) # El diccionario con los estilos y puntuaciones del usuario.
         self.prendas_obligatorias_idx = user_inputs.get('prendas_obligatorias_idx', []) # Lista de IDs de prendas que DEBEN estar en la solución.
+        # Las prendas obligatorias, precalculadas como conjunto (consultas O(1) en los operadores) y como máscara sobre el catálogo.
+        self._obligatorias = frozenset(self.prendas_obligatorias_idx)
+        self._mascara_obligatorias = np.zeros(self.indice.num_prendas, dtype=bool)
+        self._mascara_obligatorias[list(self._obligatorias)] = True
         self.estacion_usuario = user_inputs.get('estacion_colorimetria', None) # La estación de colorimetría del usuario (ej. 'Verano').
         self.colores_favoritos = user_inputs.get('colores_favoritos', []) # Lista de colores favoritos del usuario.
         
@@ -36,6 +104,30 @@ class EcoClosetAG:
             self.colores_favoritos
         )
 
+        # --- Pre-cálculo por Prenda sobre el Índice del Catálogo ---
+        if self.paleta_recomendada: # Si hay paleta, una prenda coincide si su color está en ella...
+            self._coincide_color = self.indice.pertenencia_paleta(self.paleta_recomendada)
+        else: # ...si no, se premian los colores neutros.
+            self._coincide_color = self.indice.categoria_color == CatalogIndex.CATEGORIAS_COLOR.index('Neutro')
+        self._codigo_todo_el_anio = self.indice.codigo('Temporada', 'Todo el año') # None si ninguna prenda es de todo el año.
+        self._exterior = GRUPOS_ATUENDO.index('exterior')
+        # Preferencias de estilo normalizadas como vector por código de estilo del catálogo. Los estilos
+        # preferidos que no existen en el catálogo nunca aparecen en un armario: aportan su cuadrado al error.
+        total_preferencias = sum(self.preferencias_estilo.values()) if self.preferencias_estilo else 0
+        nombres_estilo = self.indice.categorias['Estilo']
+        self._preferencias_por_codigo = np.array([self.preferencias_estilo.get(e, 0) / total_preferencias if total_preferencias else 0.0 for e in nombres_estilo], dtype=np.float64)
+        self._error_estilos_fuera_catalogo = sum((p / total_preferencias) ** 2 for e, p in self.preferencias_estilo.items() if e not in nombres_estilo) if total_preferencias else 0.0
+
+        # --- Caché de Fitness ---
+        # Un mismo armario (mismas prendas, en cualquier orden) siempre tiene el mismo fitness,
+        # así que se memoriza para no recalcularlo cuando reaparece (clones, población convergida).
+        self._cache_fitness = OrderedDict()
+        self._reiniciar_estadisticas() # Contadores y resumen de la última ejecución, en `self.estadisticas`.
+        self._rng = random # Generador aleatorio; `ejecutar` crea uno propio si hay semilla.
+        self._evaluador_paralelo = None # Pool de procesos activo durante una ejecución en modo paralelo.
+        self._derivaciones = {} # Hijos mutados a partir de un clon: clave del hijo -> (estado del padre, prenda que sale, prenda que entra).
+        self._perfilador = None # `PerfiladorAG` activo durante una ejecución perfilada (ver `ejecutar`).
+
     # --- 2. Creación de Individuos y Población Inicial ---
     def _crear_individuo(self):
         # Crea un único armario (cromosoma) que cumple con las restricciones básicas.
@@ -46,19 +138,34 @@ class EcoClosetAG:
         if num_prendas_a_elegir < 0:
             return individuo[:self.tam_armario_deseado]
 
-        # Crea un "pool" de candidatos: todos los IDs de prendas que no son obligatorios.
-        pool_candidatos = [idx for idx in self.todos_los_indices if idx not in individuo]
-        
-        # Otra salvaguarda: si no hay suficientes candidatos para llenar el armario, se ajusta el número a elegir.
-        if len(pool_candidatos) < num_prendas_a_elegir:
-            num_prendas_a_elegir = len(pool_candidatos)
-
-        # Selecciona al azar las prendas restantes del pool de candidatos.
-        prendas_aleatorias = random.sample(pool_candidatos, num_prendas_a_elegir)
+        # Selecciona al azar las prendas restantes entre las no obligatorias (si no hay suficientes, se eligen las que haya).
+        prendas_aleatorias = self._muestrear_fuera(self._obligatorias, num_prendas_a_elegir)
         individuo.extend(prendas_aleatorias) # Añade las prendas aleatorias al armario.
-        random.shuffle(individuo) # Baraja el armario para que las prendas obligatorias no estén siempre al principio.
+        self._rng.shuffle(individuo) # Baraja el armario para que las prendas obligatorias no estén siempre al principio.
         return individuo
 
+    def _muestrear_fuera(self, excluidos, cantidad):
+        # Elige al azar hasta `cantidad` prendas distintas del catálogo que no estén en el conjunto `excluidos`.
+        # Con un catálogo mucho mayor que el armario se usa muestreo por rechazo, sin recorrer el catálogo.
+        num_prendas = self.indice.num_prendas
+        disponibles = num_prendas - len(excluidos)
+        cantidad = min(cantidad, disponibles)
+        if cantidad <= 0:
+            return []
+        if (disponibles - cantidad) * 4 < num_prendas: # Casi todo está excluido: el rechazo sería lento, se filtra con una máscara.
+            if excluidos is self._obligatorias:
+                mascara = ~self._mascara_obligatorias
+            else:
+                mascara = np.ones(num_prendas, dtype=bool)
+                mascara[list(excluidos)] = False
+            return self._rng.sample(np.flatnonzero(mascara).tolist(), cantidad)
+        elegidas = set()
+        while len(elegidas) < cantidad:
+            candidata = self._rng.randrange(num_prendas)
+            if candidata not in excluidos:
+                elegidas.add(candidata)
+        return list(elegidas)
+
     def _crear_poblacion_inicial(self):
         # Crea la primera generación de armarios llamando a _crear_individuo repetidamente.
         return [self._crear_individuo() for _ in range(self.tam_poblacion)]
@@ -66,46 +173,138 @@ class EcoClosetAG:
     # --- 3. Función de Aptitud (`_calcular_fitness`) ---
     # El cerebro del algoritmo. Evalúa qué tan "bueno" es un armario y le asigna una puntuación.
     def _calcular_fitness(self, individuo):
-        armario_df = self.catalogo.iloc[individuo] # Obtiene el DataFrame con los datos de las prendas del armario actual.
-        if armario_df.empty: # Si por alguna razón el armario está vacío, su calidad es cero.
+        if len(individuo) == 0: # Si por alguna razón el armario está vacío, su calidad es cero.
+            return 0, {}
+        return self._fitness_desde_estado(self._construir_estado(individuo))
+
+    def _construir_estado(self, individuo):
+        # Calcula desde cero el estado de fitness de un armario, con operaciones sobre los arrays del índice.
+        estado = EstadoFitness()
+        posiciones = np.asarray(individuo, dtype=np.intp)
+        grupos = self.indice.grupo[posiciones]
+        for codigo, grupo in enumerate(GRUPOS_ATUENDO):
+            estado.grupos[grupo] = posiciones[grupos == codigo].tolist()
+        estilos = self.indice.estilo[posiciones]
+        estado.conteo_estilos = Counter(estilos[estilos >= 0].tolist())
+        estado.estilos_exteriores = Counter(estilos[(estilos >= 0) & (grupos == self._exterior)].tolist())
+        estado.conteo_temporadas = Counter(self.indice.temporada[posiciones].tolist())
+        estado.coincidencias_color = int(self._coincide_color[posiciones].sum())
+        sostenibilidad = self.indice.sostenibilidad[posiciones].astype(np.float64)
+        con_dato = ~np.isnan(sostenibilidad)
+        estado.suma_sostenibilidad = float(sostenibilidad[con_dato].sum())
+        estado.num_sostenibilidad = int(con_dato.sum())
+        estado.num_prendas = len(posiciones)
+
+        estado.suma_basicos = puntos_atuendos_basicos(self.matriz_compatibilidad, estado.grupos['top'], estado.grupos['abajo'], estado.grupos['calzado'])
+        estado.suma_vestidos = puntos_atuendos_vestido(self.matriz_compatibilidad, estado.grupos['vestido'], estado.grupos['calzado'])
+        return estado
+
+    def _sumar_prenda_a_conteos(self, estado, posicion, signo):
+        # Añade (signo=1) o quita (signo=-1) una prenda de los conteos que no dependen de los atuendos.
+        estilo = int(self.indice.estilo[posicion])
+        if estilo >= 0:
+            estado.conteo_estilos[estilo] += signo
+            if self.indice.grupo[posicion] == self._exterior:
+                estado.estilos_exteriores[estilo] += signo
+        estado.conteo_temporadas[int(self.indice.temporada[posicion])] += signo
+        estado.coincidencias_color += signo * int(self._coincide_color[posicion])
+        sostenibilidad = float(self.indice.sostenibilidad[posicion])
+        if not np.isnan(sostenibilidad):
+            estado.suma_sostenibilidad += signo * sostenibilidad
+            estado.num_sostenibilidad += signo
+        estado.num_prendas += signo
+        # Los conteos a cero se eliminan para que el estado no dependa del historial de intercambios.
+        for conteo in (estado.conteo_estilos, estado.estilos_exteriores, estado.conteo_temporadas):
+            for clave in [clave for clave, n in conteo.items() if n == 0]:
+                del conteo[clave]
+
+    def _estado_tras_intercambio(self, estado_padre, saliente, entrante):
+        # Deriva el estado de un armario en el que `saliente` se cambia por `entrante`.
+        # Solo se recalculan los atuendos en los que participan esas dos prendas: O(armario²) en vez de O(armario³).
+        # Las sumas de atuendos son enteras, así que el resultado es exactamente el de `_construir_estado`.
+        estado = estado_padre.copiar()
+        grupos = estado.grupos
+        matriz = self.matriz_compatibilidad
+        for posicion, signo in ((saliente, -1), (entrante, 1)):
+            codigo_grupo = self.indice.grupo[posicion]
+            grupo = GRUPOS_ATUENDO[codigo_grupo] if codigo_grupo >= 0 else None
+            if signo < 0 and grupo is not None:
+                grupos[grupo].remove(posicion)
+            # Atuendos que contienen la prenda, formados con el resto del armario.
+            if grupo == 'top':
+                estado.suma_basicos += signo * puntos_atuendos_basicos(matriz, [posicion], grupos['abajo'], grupos['calzado'])
+            elif grupo == 'abajo':
+                estado.suma_basicos += signo * puntos_atuendos_basicos(matriz, grupos['top'], [posicion], grupos['calzado'])
+            elif grupo == 'calzado':
+                estado.suma_basicos += signo * puntos_atuendos_basicos(matriz, grupos['top'], grupos['abajo'], [posicion])
+                estado.suma_vestidos += signo * puntos_atuendos_vestido(matriz, grupos['vestido'], [posicion])
+            elif grupo == 'vestido':
+                estado.suma_vestidos += signo * puntos_atuendos_vestido(matriz, [posicion], grupos['calzado'])
+            if signo > 0 and grupo is not None:
+                grupos[grupo].append(posicion)
+            self._sumar_prenda_a_conteos(estado, posicion, signo)
+        return estado
+
+    def _fitness_desde_estado(self, estado):
+        # Combina las métricas del estado en la puntuación final del armario (con `_combinar_componentes`).
+        if estado.num_prendas == 0:
             return 0, {}
+        conteos_estilos = np.zeros((1, len(self.indice.categorias['Estilo'])), dtype=np.int64)
+        for codigo, n in estado.conteo_estilos.items():
+            conteos_estilos[0, codigo] = n
+        temporadas_presentes = np.zeros((1, len(self.indice.categorias['Temporada']) + 1), dtype=bool)
+        temporadas_presentes[0, [codigo + 1 for codigo in estado.conteo_temporadas]] = True
+        r = self._combinar_componentes(
+            np.array([estado.suma_basicos + estado.suma_vestidos], dtype=np.int64),
+            np.array([len(estado.grupos['exterior'])]), np.array([len(estado.estilos_exteriores)]),
+            conteos_estilos, temporadas_presentes,
+            np.array([estado.coincidencias_color]), np.array([estado.num_prendas]),
+            np.array([estado.suma_sostenibilidad]), np.array([estado.num_sostenibilidad]),
+        )
+        metricas = {'atuendos': float(r['atuendos'][0]), 'sostenibilidad_score': float(r['sostenibilidad_score'][0])}
+        return float(r['fitness'][0]), metricas
+
+    def _combinar_componentes(self, puntos_atuendos, num_exteriores, num_estilos_exteriores, conteos_estilos,
+                              temporadas_presentes, coincidencias_color, num_prendas, suma_sostenibilidad, num_sostenibilidad):
+        """
+        Calcula el fitness de uno o varios armarios a partir de sus componentes (un elemento o una
+        fila por armario). Es el único sitio donde se combinan, así que la evaluación por lotes y
+        la incremental dan exactamente el mismo fitness para un mismo armario.
+        `conteos_estilos` tiene una columna por código de estilo y `temporadas_presentes` una por
+        código de temporada más uno (la columna 0 es la temporada ausente).
+        """
+        num_individuos = len(puntos_atuendos)
 
         # --- Métrica 1: Calidad de Atuendos ---
-        puntuacion_total_atuendos = calcular_atuendos_ponderados(armario_df) # Llama a la función experta que calcula la calidad de las combinaciones.
-        fitness_atuendos = np.log1p(puntuacion_total_atuendos) # Aplica una transformación logarítmica para suavizar la puntuación.
+        atuendos = puntos_atuendos / ESCALA_PUNTOS # Suma de las puntuaciones de las combinaciones.
+        # Una buena selección de exteriores aumenta el valor del armario, más si hay variedad.
+        factor_exterior = 1 + (num_exteriores * 0.20) + (num_estilos_exteriores * 0.10)
+        atuendos = np.where(num_exteriores > 0, atuendos * factor_exterior, atuendos)
+        fitness_atuendos = np.log1p(atuendos) # Aplica una transformación logarítmica para suavizar la puntuación.
 
         # --- Métrica 2: Versatilidad (Alineación con el Estilo del Usuario) ---
-        if self.preferencias_estilo: # Solo si el usuario definió sus estilos...
-            total_puntuacion_usuario = sum(self.preferencias_estilo.values()) # Suma las puntuaciones del usuario (ej. 5+8+3=16).
-            preferencias_normalizadas = {estilo: punt / total_puntuacion_usuario for estilo, punt in self.preferencias_estilo.items()} # Convierte las puntuaciones a porcentajes (ej. 5/16, 8/16, 3/16).
-            distribucion_actual = armario_df['Estilo'].value_counts(normalize=True).to_dict() # Calcula la distribución de estilos en el armario actual.
-            error_estilo = sum((preferencias_normalizadas.get(estilo, 0) - distribucion_actual.get(estilo, 0))**2 for estilo in set(preferencias_normalizadas) | set(distribucion_actual)) # Calcula el error cuadrático entre la distribución deseada y la real.
-            fitness_versatilidad_estilo = 1 / (1 + np.sqrt(error_estilo)) # Convierte el error en una puntuación de similitud (más cercano a 1 es mejor).
+        if self.preferencias_estilo: # Error cuadrático entre la distribución de estilos deseada y la real.
+            total_estilos = conteos_estilos.sum(axis=1, keepdims=True)
+            distribucion = np.divide(conteos_estilos, total_estilos, out=np.zeros(conteos_estilos.shape), where=total_estilos > 0)
+            error_estilo = ((self._preferencias_por_codigo - distribucion) ** 2).sum(axis=1) + self._error_estilos_fuera_catalogo
+            fitness_versatilidad_estilo = 1 / (1 + np.sqrt(error_estilo)) # Más cercano a 1 es mejor.
         else: # Si el usuario no eligió estilos, se le da una puntuación neutral.
-            fitness_versatilidad_estilo = 0.5
+            fitness_versatilidad_estilo = np.full(num_individuos, 0.5)
 
         # --- Sub-métrica de Versatilidad: Cobertura de Temporadas ---
-        temporadas_cubiertas = armario_df['Temporada'].unique() # Obtiene las temporadas cubiertas por el armario.
-        score_temporada = 0
-        if 'Todo el año' in temporadas_cubiertas: score_temporada += 0.5 # Premia si hay prendas para todo el año.
-        if len([t for t in temporadas_cubiertas if t != 'Todo el año']) > 1: score_temporada += 0.5 # Premia si cubre más de una estación específica.
-        
-        # Combina las dos sub-métricas de versatilidad.
+        # Premia si hay prendas para todo el año y si cubre más de una estación específica.
+        todo_el_anio = temporadas_presentes[:, self._codigo_todo_el_anio + 1] if self._codigo_todo_el_anio is not None else np.zeros(num_individuos, dtype=bool)
+        otras_temporadas = temporadas_presentes.sum(axis=1) - todo_el_anio
+        score_temporada = 0.5 * todo_el_anio + 0.5 * (otras_temporadas > 1)
         fitness_versatilidad_total = (fitness_versatilidad_estilo * 0.7) + (score_temporada * 0.3)
 
         # --- Métrica 3: Armonía de Color ---
-        colores_armario = armario_df['Color'].tolist() # Obtiene la lista de colores del armario.
-        if self.paleta_recomendada: # Si se generó una paleta para el usuario...
-            prendas_compatibles = sum(1 for color in colores_armario if color in self.paleta_recomendada) # Cuenta cuántas prendas coinciden con la paleta.
-            fitness_colores = prendas_compatibles / len(colores_armario) if len(colores_armario) > 0 else 0 # Calcula el porcentaje de coincidencia.
-        else: # Si no, se recurre a una regla general: premiar los colores neutros.
-            categorias_color = [get_color_category(c) for c in colores_armario]
-            num_neutros = categorias_color.count('Neutro')
-            fitness_colores = num_neutros / len(colores_armario) if len(colores_armario) > 0 else 0
+        # Porcentaje de prendas que encajan con la paleta del usuario (o que son neutras si no hay paleta).
+        fitness_colores = np.divide(coincidencias_color, num_prendas, out=np.zeros(num_individuos), where=num_prendas > 0)
 
         # --- Métrica 4: Sostenibilidad ---
-        puntuacion_sostenibilidad = armario_df['Sostenibilidad'].mean() # Calcula la sostenibilidad promedio del armario.
-        fitness_sostenibilidad = (puntuacion_sostenibilidad - 1) / 4 if not np.isnan(puntuacion_sostenibilidad) else 0 # Normaliza el valor a un rango de 0 a 1.
+        puntuacion_sostenibilidad = np.divide(suma_sostenibilidad, num_sostenibilidad, out=np.full(num_individuos, np.nan), where=num_sostenibilidad > 0)
+        fitness_sostenibilidad = np.where(num_sostenibilidad > 0, (puntuacion_sostenibilidad - 1) / 4, 0.0) # Normaliza el valor a un rango de 0 a 1.
 
         # --- Combinación Final de Fitness ---
         # Define la importancia de cada métrica.
@@ -114,19 +313,148 @@ class EcoClosetAG:
         peso_colores = 0.10
         peso_sostenibilidad = 0.10
         # Calcula la puntuación final como una suma ponderada.
-        fitness_total = (peso_atuendos * fitness_atuendos +
-                         peso_versatilidad * fitness_versatilidad_total +
-                         peso_colores * fitness_colores +
-                         peso_sostenibilidad * fitness_sostenibilidad)
-        
-        # Prepara un diccionario con las métricas para mostrar en la interfaz.
-        metricas = {'atuendos': puntuacion_total_atuendos, 'sostenibilidad_score': puntuacion_sostenibilidad}
-        return fitness_total, metricas # Devuelve la puntuación final y las métricas.
+        fitness = (peso_atuendos * fitness_atuendos +
+                   peso_versatilidad * fitness_versatilidad_total +
+                   peso_colores * fitness_colores +
+                   peso_sostenibilidad * fitness_sostenibilidad)
+        fitness = np.where(num_prendas > 0, fitness, 0.0) # Un armario vacío no tiene calidad.
+        return {
+            'fitness': fitness,
+            'atuendos': atuendos,
+            'versatilidad_estilo': fitness_versatilidad_estilo,
+            'temporadas': score_temporada,
+            'colores': fitness_colores,
+            'sostenibilidad_score': puntuacion_sostenibilidad,
+        }
+
+    def _reiniciar_estadisticas(self):
+        # Contadores de la caché, motivo de parada y generaciones realmente ejecutadas.
+        self.estadisticas = {'cache_aciertos': 0, 'cache_fallos': 0, 'evaluaciones_incrementales': 0,
+                             'motivo_parada': 'generaciones_completadas', 'generaciones_usadas': 0}
+
+    def _evaluar(self, individuo):
+        # Devuelve el fitness de un armario pasando por la caché LRU.
+        clave = tuple(sorted(individuo)) # Forma canónica: el orden de las prendas no importa.
+        if clave in self._cache_fitness:
+            self._cache_fitness.move_to_end(clave) # Marca el armario como usado recientemente.
+            self.estadisticas['cache_aciertos'] += 1
+            fitness, metricas, _ = self._cache_fitness[clave]
+        else:
+            self.estadisticas['cache_fallos'] += 1
+            if clave in self._derivaciones: # Hijo mutado de un padre conocido: se actualiza el estado del padre.
+                estado = self._estado_tras_intercambio(*self._derivaciones[clave])
+                self.estadisticas['evaluaciones_incrementales'] += 1
+            else:
+                estado = self._construir_estado(individuo)
+            fitness, metricas = self._fitness_desde_estado(estado)
+            self._guardar_en_cache(clave, fitness, metricas, estado)
+        return fitness, dict(metricas) # Copia de las métricas: quien llama puede modificarlas.
+
+    def evaluar_poblacion(self, poblacion, con_estados=False):
+        """
+        Evalúa una población completa a la vez. `poblacion` es un array (o lista de listas)
+        de forma (tam_poblacion, tam_armario) con posiciones del catálogo.
+        Devuelve un diccionario de vectores, uno por componente del fitness y uno por armario.
+        Con `con_estados=True` incluye además la lista 'estados' con el `EstadoFitness` de
+        cada armario, para poder derivar de ellos evaluaciones incrementales.
+        """
+        posiciones = np.asarray(poblacion, dtype=np.intp).reshape(len(poblacion), -1)
+        num_individuos, tam = posiciones.shape
+        filas = np.arange(num_individuos)[:, None]
+
+        # --- Atuendos: puntos de cada armario, con los bloques del núcleo ---
+        grupos = self.indice.grupo[posiciones]
+        puntos_atuendos = np.zeros(num_individuos, dtype=np.int64)
+        estados = []
+        for i in range(num_individuos):
+            if con_estados:
+                estado = self._construir_estado(posiciones[i])
+                estados.append(estado)
+                puntos_atuendos[i] = estado.suma_basicos + estado.suma_vestidos
+            else:
+                fila, grupos_fila = posiciones[i], grupos[i]
+                tops, abajo, calzados, vestidos = (fila[grupos_fila == GRUPOS_ATUENDO.index(g)] for g in ('top', 'abajo', 'calzado', 'vestido'))
+                puntos_atuendos[i] = puntos_atuendos_basicos(self.matriz_compatibilidad, tops, abajo, calzados) + puntos_atuendos_vestido(self.matriz_compatibilidad, vestidos, calzados)
+        # Exteriores: número de exteriores y de estilos distintos entre ellos (conteo por filas).
+        estilos = self.indice.estilo[posiciones]
+        num_estilos = len(self.indice.categorias['Estilo'])
+        es_exterior = grupos == self._exterior
+        estilos_exteriores = np.zeros((num_individuos, num_estilos + 1), dtype=bool)
+        estilos_exteriores[np.broadcast_to(filas, posiciones.shape)[es_exterior], estilos[es_exterior]] = True # El código -1 cae en la última columna, que se ignora.
+
+        # --- Estilos (bincount por filas) y temporadas presentes ---
+        validos = estilos >= 0
+        conteos_estilos = np.bincount((estilos + filas * num_estilos)[validos], minlength=num_individuos * num_estilos).reshape(num_individuos, num_estilos)
+        num_temporadas = len(self.indice.categorias['Temporada'])
+        temporadas_presentes = np.zeros((num_individuos, num_temporadas + 1), dtype=bool)
+        temporadas_presentes[filas, self.indice.temporada[posiciones] + 1] = True # Columna 0: temporada ausente, que cuenta como otra estación.
+
+        # --- Color y sostenibilidad ---
+        sostenibilidad = self.indice.sostenibilidad[posiciones].astype(np.float64)
+        con_dato = ~np.isnan(sostenibilidad)
+
+        resultado = self._combinar_componentes(
+            puntos_atuendos, es_exterior.sum(axis=1), estilos_exteriores[:, :num_estilos].sum(axis=1),
+            conteos_estilos, temporadas_presentes,
+            self._coincide_color[posiciones].sum(axis=1), np.full(num_individuos, tam),
+            np.where(con_dato, sostenibilidad, 0.0).sum(axis=1), con_dato.sum(axis=1),
+        )
+        if con_estados:
+            resultado['estados'] = estados
+        return resultado
+
+    def _evaluar_generacion(self, poblacion):
+        # Fitness de toda la población: primero la caché, luego las derivaciones incrementales,
+        # y el resto de armarios nuevos se evalúan juntos con `evaluar_poblacion`.
+        resultados = [None] * len(poblacion)
+        pendientes = {} # Clave canónica -> posiciones en la población de los armarios aún sin evaluar.
+        for i, individuo in enumerate(poblacion):
+            clave = tuple(sorted(individuo))
+            if clave in pendientes:
+                pendientes[clave].append(i)
+            elif clave in self._cache_fitness or clave in self._derivaciones:
+                resultados[i] = self._evaluar(individuo)
+            else:
+                pendientes[clave] = [i]
+
+        if pendientes:
+            evaluador = self._evaluador_paralelo if self._evaluador_paralelo is not None else self
+            # Sin estados: la evaluación por lotes queda vectorizada (y en paralelo no viajan estados entre procesos).
+            # El estado de un armario solo se construye si luego se deriva de él un hijo (ver `_registrar_derivacion`).
+            lote = evaluador.evaluar_poblacion([poblacion[indices[0]] for indices in pendientes.values()])
+            for j, (clave, indices) in enumerate(pendientes.items()):
+                fitness = lote['fitness'][j]
+                metricas = {'atuendos': float(lote['atuendos'][j]), 'sostenibilidad_score': float(lote['sostenibilidad_score'][j])}
+                self.estadisticas['cache_fallos'] += 1
+                self.estadisticas['cache_aciertos'] += len(indices) - 1 # Los repetidos en la misma generación se evalúan una sola vez.
+                self._guardar_en_cache(clave, fitness, metricas, None)
+                for i in indices:
+                    resultados[i] = (fitness, dict(metricas))
+        return resultados
+
+    def _guardar_en_cache(self, clave, fitness, metricas, estado):
+        # Inserta un resultado en la caché LRU junto con su estado de fitness (si se tiene).
+        if self.tam_cache_fitness > 0:
+            self._cache_fitness[clave] = (fitness, metricas, estado)
+            if len(self._cache_fitness) > self.tam_cache_fitness:
+                self._cache_fitness.popitem(last=False) # Descarta el menos usado recientemente.
+
+    def _registrar_derivacion(self, padre, hijo, saliente, entrante):
+        # Anota que `hijo` es `padre` con una prenda cambiada, para evaluarlo de forma incremental.
+        # Solo es posible si el padre sigue en la caché; su estado se construye aquí la primera vez que hace falta.
+        clave_padre = tuple(sorted(padre))
+        entrada_padre = self._cache_fitness.get(clave_padre)
+        if entrada_padre is None:
+            return
+        fitness, metricas, estado = entrada_padre
+        if estado is None:
+            estado = self._construir_estado(padre)
+            self._cache_fitness[clave_padre] = (fitness, metricas, estado)
+        self._derivaciones[tuple(sorted(hijo))] = (estado, saliente, entrante)
 
     # --- 4. Operadores Genéticos (Selección, Cruce, Mutación) ---
     def _seleccion_torneo(self, poblacion, fitness_scores):
-        torneo_size = 5 # Elige 5 individuos al azar de la población.
-        indices_torneo = random.sample(range(len(poblacion)), torneo_size)
+        indices_torneo = self._rng.sample(range(len(poblacion)), TAM_TORNEO) # Elige 5 individuos al azar de la población.
         # De esos 5, encuentra el que tiene la mejor puntuación de fitness.
         mejor_individuo_idx = max(indices_torneo, key=lambda idx: fitness_scores[idx][0])
         return poblacion[mejor_individuo_idx] # Devuelve al ganador del torneo para ser un "padre".
@@ -138,83 +466,281 @@ class EcoClosetAG:
         hijo1 = list(self.prendas_obligatorias_idx)
         hijo2 = list(self.prendas_obligatorias_idx)
         # Genes disponibles para elegir (los del pool que no son obligatorios).
-        genes_disponibles = [gen for gen in pool_genes if gen not in self.prendas_obligatorias_idx]
+        genes_disponibles = [gen for gen in pool_genes if gen not in self._obligatorias]
         
         # Función interna para rellenar un hijo hasta el tamaño deseado.
         def completar_hijo(hijo):
             necesarios = self.tam_armario_deseado - len(hijo)
             if necesarios <= 0: return hijo[:self.tam_armario_deseado]
             # Primero, intenta rellenar con genes del pool de los padres.
-            genes_a_anadir = random.sample(genes_disponibles, min(len(genes_disponibles), necesarios))
+            genes_a_anadir = self._rng.sample(genes_disponibles, min(len(genes_disponibles), necesarios))
             hijo.extend(genes_a_anadir)
             # Si aún faltan, rellena con genes aleatorios del catálogo global.
             if len(hijo) < self.tam_armario_deseado:
-                pool_global = [i for i in self.todos_los_indices if i not in hijo]
-                hijo.extend(random.sample(pool_global, self.tam_armario_deseado - len(hijo)))
+                hijo.extend(self._muestrear_fuera(set(hijo), self.tam_armario_deseado - len(hijo)))
             return hijo
         
         return completar_hijo(hijo1), completar_hijo(hijo2) # Devuelve los dos nuevos hijos.
 
-    def _mutacion_intercambio(self, individuo):
-        if random.random() < self.prob_mutacion: # Solo muta si se cumple la probabilidad.
+    def _mutacion_intercambio(self, individuo, padre=None):
+        # `padre` se indica cuando el individuo es un clon: así el hijo mutado se evalúa de forma incremental.
+        if self._rng.random() < self.prob_mutacion: # Solo muta si se cumple la probabilidad.
             # Encuentra las POSICIONES en el individuo que se pueden cambiar (no obligatorias).
-            posiciones_mutables = [i for i, gen_id in enumerate(individuo) if gen_id not in self.prendas_obligatorias_idx]
+            posiciones_mutables = [i for i, gen_id in enumerate(individuo) if gen_id not in self._obligatorias]
             if not posiciones_mutables: return individuo # Si no hay nada que mutar, se detiene.
             # Elige una de esas posiciones al azar.
-            posicion_a_reemplazar = random.choice(posiciones_mutables)
+            posicion_a_reemplazar = self._rng.choice(posiciones_mutables)
             # Encuentra una nueva prenda que no esté ya en el armario.
-            pool_reemplazo = [gen_id for gen_id in self.todos_los_indices if gen_id not in individuo]
-            if not pool_reemplazo: return individuo # Si no hay prendas fuera, se detiene.
-            gen_nuevo = random.choice(pool_reemplazo)
+            reemplazo = self._muestrear_fuera(set(individuo), 1)
+            if not reemplazo: return individuo # Si no hay prendas fuera, se detiene.
+            gen_nuevo = reemplazo[0]
             # Realiza el intercambio.
+            gen_saliente = individuo[posicion_a_reemplazar]
             individuo[posicion_a_reemplazar] = gen_nuevo
+            if padre is not None:
+                self._registrar_derivacion(padre, individuo, gen_saliente, gen_nuevo)
         return individuo
 
     # --- 5. Ciclo de Ejecución Principal (`ejecutar`) ---
-    def ejecutar(self, streamlit_callback=None):
-        poblacion = self._crear_poblacion_inicial() # Crea la primera generación.
+    def entradas_usuario(self):
+        # Las entradas del usuario con las que se construyó el AG, con las mismas claves que `user_inputs`.
+        return {
+            'tam_armario': self.tam_armario_deseado,
+            'preferencias_estilo': self.preferencias_estilo,
+            'prendas_obligatorias_idx': self.prendas_obligatorias_idx,
+            'estacion_colorimetria': self.estacion_usuario,
+            'colores_favoritos': self.colores_favoritos,
+        }
+
+    def hiperparametros(self):
+        # Hiperparámetros que influyen en el resultado. Los de rendimiento (la caché de fitness o los procesos)
+        # no cuentan: la evaluación incremental, la por lotes y la paralela dan el mismo fitness bit a bit.
+        return {
+            'version_fitness': VERSION_FITNESS,
+            'tam_poblacion': self.tam_poblacion, 'num_generaciones': self.num_generaciones,
+            'prob_cruce': self.prob_cruce, 'prob_mutacion': self.prob_mutacion,
+            'paciencia_estancamiento': self.paciencia_estancamiento, 'epsilon_mejora': self.epsilon_mejora,
+            'fitness_objetivo': self.fitness_objetivo, 'diversidad_minima': self.diversidad_minima,
+        }
+
+    # Métodos que se instrumentan en una ejecución perfilada: nombre en la traza y si cada llamada es un intervalo.
+    FASES_PERFILADAS = {
+        '_crear_poblacion_inicial': ('poblacion_inicial', True),
+        '_evaluar_generacion': ('evaluacion', True),
+        '_nueva_generacion': ('nueva_generacion', True),
+        '_seleccionar_mejores': ('seleccion_final', True),
+        '_contar_combinaciones': ('contar_combinaciones', True),
+        '_seleccion_torneo': ('seleccion', False),
+        '_cruce_pool_genes': ('cruce', False),
+        '_mutacion_intercambio': ('mutacion', False),
+        '_estado_tras_intercambio': ('fitness_incremental', False),
+    }
+
+    def desglose_fitness(self, individuo):
+        # Contribución de cada componente (ya ponderado) al fitness de un armario; suman el fitness total.
+        r = {clave: float(valor[0]) for clave, valor in self.evaluar_poblacion([individuo]).items()}
+        return { # Mismos pesos que `_combinar_componentes`.
+            'atuendos': 0.45 * float(np.log1p(r['atuendos'])),
+            'versatilidad_estilo': 0.35 * 0.7 * r['versatilidad_estilo'],
+            'temporadas': 0.35 * 0.3 * r['temporadas'],
+            'colores': 0.10 * r['colores'],
+            'sostenibilidad': 0.10 * ((r['sostenibilidad_score'] - 1) / 4 if not np.isnan(r['sostenibilidad_score']) else 0.0),
+        }
+
+    def _activar_perfilador(self, perfilador):
+        # Sustituye los métodos de `FASES_PERFILADAS` por versiones medidas solo en esta instancia.
+        self._perfilador = perfilador
+        for metodo, (nombre, intervalo) in self.FASES_PERFILADAS.items():
+            setattr(self, metodo, perfilador.envolver(nombre, getattr(self, metodo), intervalo=intervalo))
+
+    def _desactivar_perfilador(self):
+        for metodo in self.FASES_PERFILADAS:
+            self.__dict__.pop(metodo, None) # Vuelve a los métodos de la clase, sin medición.
+        self._perfilador = None
+
+    def ejecutar(self, streamlit_callback=None, callback_mejor=None, cancelacion=None, profiler=None):
+        # `callback_mejor(individuo, fitness, historial)` recibe el mejor armario encontrado hasta el momento y una copia
+        # del historial de fitness a medida que avanza la evolución. `cancelacion` es un objeto con
+        # `is_set()` (p. ej. `threading.Event`): si se activa, la evolución se detiene al terminar la
+        # generación en curso y se devuelven los mejores armarios encontrados hasta ese momento.
+        # `profiler` (un `profiling.PerfiladorAG`) registra el tiempo de cada fase; sin él no se mide nada.
+        self._cache_fitness.clear() # Cada ejecución empieza con la caché vacía y los contadores a cero.
+        self._reiniciar_estadisticas()
+        self._rng = random.Random(self.semilla) if self.semilla is not None else random
         mejor_fitness_historial = [] # Para guardar el mejor fitness de cada generación y hacer la gráfica.
-        
-        for generacion in range(self.num_generaciones): # Bucle principal que se repite por cada generación.
-            poblacion = [ind for ind in poblacion if len(ind) == self.tam_armario_deseado] # Salvaguarda para asegurar que todos los individuos son válidos.
+
+        if self.num_procesos and self.num_procesos > 1: # Modo paralelo opcional: el catálogo se comparte una sola vez con los procesos.
+            from parallel_evaluation import EvaluadorParalelo # Solo se carga si se pide evaluación en paralelo.
+            self._evaluador_paralelo = EvaluadorParalelo(self, self.num_procesos, self.tam_bloque_procesos)
+        if profiler is not None:
+            self._activar_perfilador(profiler)
+        try:
+            poblacion = self._crear_poblacion_inicial() # Crea la primera generación.
+            poblacion = self._evolucionar(poblacion, self.num_generaciones, mejor_fitness_historial, streamlit_callback, callback_mejor, cancelacion)
+            self.estadisticas['generaciones_usadas'] = len(mejor_fitness_historial)
             if not poblacion: return [], [] # Si la población se vacía, detiene la ejecución.
+            mejores_individuos = self._seleccionar_mejores(poblacion)
+        finally:
+            if self._perfilador is not None:
+                self._desactivar_perfilador()
+            if self._evaluador_paralelo is not None:
+                self._evaluador_paralelo.cerrar() # Detiene los procesos y libera la memoria compartida.
+                self._evaluador_paralelo = None
+
+        # Los contadores de la caché, el motivo de parada y las generaciones usadas quedan en `self.estadisticas`.
+        return mejores_individuos, mejor_fitness_historial # Devuelve los resultados finales.
+
+    def ejecutar_islas(self, num_islas=4, intervalo_migracion=10, num_migrantes=2, streamlit_callback=None):
+        # Modelo de islas: `num_islas` subpoblaciones evolucionan en paralelo, una por proceso.
+        # Cada `intervalo_migracion` generaciones, los `num_migrantes` mejores de cada isla pasan a la
+        # siguiente (topología en anillo) sustituyendo a sus peores. Devuelve lo mismo que `ejecutar`.
+        # La población total sigue siendo `tam_poblacion`: cada isla tiene `tam_poblacion // num_islas` individuos
+        # (al menos TAM_TORNEO, para que quepa un torneo), así que las islas hacen tantas evaluaciones
+        # por generación como una única población.
+        from island_model import PoolIslas # Solo se carga si se usa el modelo de islas.
+        self._cache_fitness.clear()
+        self._reiniciar_estadisticas()
+        self._rng = random.Random(self.semilla) if self.semilla is not None else random
+        mejor_fitness_historial = [] # Mejor fitness de cada generación entre todas las islas.
 
-            fitness_scores = [self._calcular_fitness(ind) for ind in poblacion] # Calcula el fitness de toda la población actual.
-            mejor_fitness_actual = max(score[0] for score in fitness_scores) # Encuentra el mejor fitness de esta generación.
+        tam_isla = max(TAM_TORNEO, self.tam_poblacion // num_islas)
+        num_migrantes = min(num_migrantes, tam_isla - 1) # Cada isla conserva al menos a uno de los suyos.
+        poblaciones = [None] * num_islas # Cada isla crea su población inicial en su proceso.
+        with PoolIslas(self, num_islas) as pool:
+            generacion = 0
+            while generacion < self.num_generaciones:
+                generaciones_epoca = min(intervalo_migracion, self.num_generaciones - generacion)
+                semillas = [self._rng.getrandbits(64) for _ in range(num_islas)] # Una semilla distinta por isla y época.
+                resultados = pool.evolucionar(poblaciones, generaciones_epoca, semillas, tam_isla)
+                poblaciones = [poblacion for poblacion, _, _, _ in resultados]
+                for _, _, _, estadisticas_isla in resultados:
+                    for clave in ('cache_aciertos', 'cache_fallos', 'evaluaciones_incrementales'):
+                        self.estadisticas[clave] += estadisticas_isla[clave]
+                historiales = [historial for _, _, historial, _ in resultados if historial]
+                if not historiales: # Si todas las poblaciones se vacían, detiene la ejecución.
+                    self.estadisticas['motivo_parada'] = 'poblacion_vacia'
+                    return [], []
+                mejor_fitness_historial.extend(max(h[g] for h in historiales if g < len(h)) for g in range(max(map(len, historiales))))
+                generacion += generaciones_epoca
+                self.estadisticas['generaciones_usadas'] = len(mejor_fitness_historial)
+                if streamlit_callback:
+                    streamlit_callback(generacion / self.num_generaciones, f"Generación {generacion}/{self.num_generaciones} ({num_islas} islas) - Mejor Fitness: {mejor_fitness_historial[-1]:.4f}")
+
+                # Los criterios de parada se comprueban al final de cada época, sobre todas las islas juntas.
+                motivo = self._criterio_parada(mejor_fitness_historial, [ind for poblacion in poblaciones for ind in poblacion])
+                if motivo:
+                    self.estadisticas['motivo_parada'] = motivo
+                    break
+                if generacion < self.num_generaciones:
+                    self._migrar(poblaciones, [fitness for _, fitness, _, _ in resultados], num_migrantes)
+
+        # Los mejores armarios únicos se eligen entre las poblaciones finales de todas las islas.
+        mejores_individuos = self._seleccionar_mejores([ind for poblacion in poblaciones for ind in poblacion])
+        return mejores_individuos, mejor_fitness_historial
+
+    def _migrar(self, poblaciones, fitness_por_isla, num_migrantes):
+        # Migración en anillo: los mejores de la isla i sustituyen a los peores de la isla i+1.
+        orden_por_isla = [sorted(range(len(fitness)), key=lambda j: fitness[j], reverse=True) for fitness in fitness_por_isla]
+        migrantes = [[poblacion[j][:] for j in orden[:num_migrantes]] for poblacion, orden in zip(poblaciones, orden_por_isla)]
+        for origen, grupo in enumerate(migrantes):
+            destino = (origen + 1) % len(poblaciones)
+            peores = orden_por_isla[destino][::-1][:len(grupo)]
+            for posicion, migrante in zip(peores, grupo):
+                poblaciones[destino][posicion] = migrante
+
+    def _evolucionar(self, poblacion, num_generaciones, mejor_fitness_historial, streamlit_callback=None, callback_mejor=None, cancelacion=None):
+        # Hace evolucionar una población durante `num_generaciones` y devuelve la última generación.
+        ultima_notificacion = None # Momento de la última llamada a los callbacks, para no llamarlos en cada generación corta.
+        mejor_individuo, mejor_fitness = None, None # Mejor armario visto en toda la evolución, para `callback_mejor`.
+        for generacion in range(num_generaciones): # Bucle principal que se repite por cada generación.
+            if self._perfilador is not None:
+                self._perfilador.empezar_generacion()
+                contadores_previos = {clave: self.estadisticas[clave] for clave in ('cache_aciertos', 'cache_fallos', 'evaluaciones_incrementales')}
+            poblacion = [ind for ind in poblacion if len(ind) == self.tam_armario_deseado] # Salvaguarda para asegurar que todos los individuos son válidos.
+            if not poblacion: # Si la población se vacía, detiene la evolución.
+                self.estadisticas['motivo_parada'] = 'poblacion_vacia'
+                return []
+
+            fitness_scores = self._evaluar_generacion(poblacion) # Calcula el fitness de toda la población actual.
+            self._derivaciones.clear() # Las derivaciones solo sirven para la generación recién evaluada.
+            posicion_mejor = max(range(len(fitness_scores)), key=lambda j: fitness_scores[j][0]) # El mejor armario de esta generación.
+            mejor_fitness_actual = fitness_scores[posicion_mejor][0]
             mejor_fitness_historial.append(mejor_fitness_actual) # Lo guarda para la gráfica.
+            if self._perfilador is not None: # Conteos de evaluaciones de esta generación y desglose de su mejor armario.
+                evaluaciones = {clave: self.estadisticas[clave] - previo for clave, previo in contadores_previos.items()}
+                evaluaciones['armarios'] = len(poblacion)
+                desglose = self.desglose_fitness(poblacion[posicion_mejor])
+            if callback_mejor and (mejor_fitness is None or mejor_fitness_actual > mejor_fitness):
+                mejor_individuo, mejor_fitness = poblacion[posicion_mejor][:], mejor_fitness_actual # Copia: la población sigue cambiando.
+
+            motivo = 'cancelado' if cancelacion is not None and cancelacion.is_set() else self._criterio_parada(mejor_fitness_historial, poblacion)
+            ahora = time.monotonic()
+            if motivo or generacion + 1 == num_generaciones or ultima_notificacion is None or ahora - ultima_notificacion >= self.intervalo_callback:
+                ultima_notificacion = ahora
+                if streamlit_callback: # Si se está usando con Streamlit, actualiza la barra de progreso.
+                    progreso = (generacion + 1) / num_generaciones
+                    streamlit_callback(progreso, f"Generación {generacion + 1}/{num_generaciones} - Mejor Fitness: {mejor_fitness_actual:.4f}")
+                if callback_mejor: # Publica el mejor armario encontrado hasta ahora.
+                    callback_mejor(mejor_individuo[:], mejor_fitness, list(mejor_fitness_historial))
+
+            if not motivo:
+                poblacion = self._nueva_generacion(poblacion, fitness_scores) # Reemplaza la población antigua con la nueva.
+            if self._perfilador is not None: # La generación termina tras crear la siguiente (o al detenerse).
+                self._perfilador.terminar_generacion(generacion, evaluaciones, desglose)
+            if motivo: # Convergencia: se devuelve la generación recién evaluada sin crear otra.
+                self.estadisticas['motivo_parada'] = motivo
+                break
+        return poblacion
+
+    def _criterio_parada(self, mejor_fitness_historial, poblacion):
+        # Devuelve el motivo para detener la evolución, o None si debe continuar.
+        if self.fitness_objetivo is not None and mejor_fitness_historial[-1] >= self.fitness_objetivo:
+            return 'fitness_objetivo'
+        paciencia = self.paciencia_estancamiento
+        if paciencia and len(mejor_fitness_historial) > paciencia:
+            # Mejora de las últimas `paciencia` generaciones respecto al mejor fitness anterior a ellas.
+            mejora = max(mejor_fitness_historial[-paciencia:]) - max(mejor_fitness_historial[:-paciencia])
+            if mejora <= self.epsilon_mejora:
+                return 'estancamiento'
+        if self.diversidad_minima is not None:
+            diversidad = len({tuple(sorted(ind)) for ind in poblacion}) / len(poblacion)
+            if diversidad < self.diversidad_minima:
+                return 'diversidad'
+        return None
+
+    def _nueva_generacion(self, poblacion, fitness_scores):
+        # --- Ciclo de Creación de la Nueva Generación ---
+        nueva_poblacion = []
+        while len(nueva_poblacion) < self.tam_poblacion: # Repite hasta que la nueva generación esté completa.
+            padre1 = self._seleccion_torneo(poblacion, fitness_scores) # Selecciona al primer padre.
+            padre2 = self._seleccion_torneo(poblacion, fitness_scores) # Selecciona al segundo padre.
+            
+            if self._rng.random() < self.prob_cruce: # Si se cumple la probabilidad...
+                hijo1, hijo2 = self._cruce_pool_genes(padre1, padre2) # ...se cruzan para crear dos nuevos hijos.
+                origen1, origen2 = None, None
+            else: # Si no, los "hijos" son clones de los padres (elitismo).
+                hijo1, hijo2 = padre1[:], padre2[:]
+                origen1, origen2 = padre1, padre2 # Si un clon muta, su fitness se deriva del de su padre.
             
-            if streamlit_callback: # Si se está usando con Streamlit, actualiza la barra de progreso.
-                progreso = (generacion + 1) / self.num_generaciones
-                streamlit_callback(progreso, f"Generación {generacion + 1}/{self.num_generaciones} - Mejor Fitness: {mejor_fitness_actual:.4f}")
-
-            # --- Ciclo de Creación de la Nueva Generación ---
-            nueva_poblacion = []
-            while len(nueva_poblacion) < self.tam_poblacion: # Repite hasta que la nueva generación esté completa.
-                padre1 = self._seleccion_torneo(poblacion, fitness_scores) # Selecciona al primer padre.
-                padre2 = self._seleccion_torneo(poblacion, fitness_scores) # Selecciona al segundo padre.
-                
-                if random.random() < self.prob_cruce: # Si se cumple la probabilidad...
-                    hijo1, hijo2 = self._cruce_pool_genes(padre1, padre2) # ...se cruzan para crear dos nuevos hijos.
-                else: # Si no, los "hijos" son clones de los padres (elitismo).
-                    hijo1, hijo2 = padre1[:], padre2[:]
-                
-                # Aplica la mutación a los hijos.
-                hijo1 = self._mutacion_intercambio(hijo1)
-                nueva_poblacion.append(hijo1) # Añade al primer hijo a la nueva generación.
-                
-                if len(nueva_poblacion) < self.tam_poblacion:
-                    hijo2 = self._mutacion_intercambio(hijo2)
-                    nueva_poblacion.append(hijo2) # Añade al segundo hijo si aún hay espacio.
-            poblacion = nueva_poblacion # Reemplaza la población antigua con la nueva.
+            # Aplica la mutación a los hijos.
+            hijo1 = self._mutacion_intercambio(hijo1, padre=origen1)
+            nueva_poblacion.append(hijo1) # Añade al primer hijo a la nueva generación.
+            
+            if len(nueva_poblacion) < self.tam_poblacion:
+                hijo2 = self._mutacion_intercambio(hijo2, padre=origen2)
+                nueva_poblacion.append(hijo2) # Añade al segundo hijo si aún hay espacio.
+        return nueva_poblacion
 
+    def _seleccionar_mejores(self, poblacion):
         # --- Procesamiento Final de Resultados ---
+        poblacion = [ind for ind in poblacion if len(ind) == self.tam_armario_deseado] # Solo la última generación válida.
+        fitness_scores = self._evaluar_generacion(poblacion) # Fitness y métricas finales (muchos ya están en caché).
+        self._derivaciones.clear()
         poblacion_final_evaluada = []
-        for ind in poblacion: # Itera sobre la última y mejor generación.
-            if len(ind) == self.tam_armario_deseado:
-                fitness, metricas = self._calcular_fitness(ind) # Calcula el fitness y las métricas finales.
-                metricas['individuo'] = ind
-                metricas['fitness'] = fitness
-                poblacion_final_evaluada.append(metricas)
+        for ind, (fitness, metricas) in zip(poblacion, fitness_scores): # Itera sobre la última y mejor generación.
+            metricas['individuo'] = ind
+            metricas['fitness'] = fitness
+            poblacion_final_evaluada.append(metricas)
         
         poblacion_final_evaluada.sort(key=lambda x: x['fitness'], reverse=True) # Ordena a todos los individuos de mejor a peor.
 
@@ -229,10 +755,15 @@ class EcoClosetAG:
             if len(mejores_individuos) == 3: # Detiene la búsqueda cuando ya tenemos 3.
                 break
         
-        # Genera la lista de combinaciones de atuendos solo para el mejor resultado.
+        # Cuenta las combinaciones de atuendos del mejor resultado (sin generarlas; se pueden
+        # recorrer por páginas con `iterar_atuendos_validos`).
         if mejores_individuos:
-            mejor_armario_df = self.catalogo.iloc[mejores_individuos[0]['individuo']]
-            lista_de_atuendos = encontrar_atuendos_validos(mejor_armario_df)
-            mejores_individuos[0]['combinaciones_lista'] = lista_de_atuendos
-        
-        return mejores_individuos, mejor_fitness_historial # Devuelve los resultados finales.
\ No newline at end of file
+            mejores_individuos[0]['num_combinaciones'] = self._contar_combinaciones(mejores_individuos[0]['individuo'])
+        return mejores_individuos
+
+    def _contar_combinaciones(self, individuo):
+        # Número de atuendos válidos de un armario, sin generarlos. Solo usa el índice y el núcleo,
+        # así que también funciona en un AG sin DataFrame del catálogo (ver `parallel_evaluation.reconstruir_ag`).
+        posiciones = np.asarray(individuo, dtype=np.intp)
+        grupos = self.indice.grupo[posiciones]
+        return contar_atuendos_posiciones(self.matriz_compatibilidad, {grupo: posiciones[grupos == codigo] for codigo, grupo in enumerate(GRUPOS_ATUENDO)})
\ No newline at end of file
@@ -0,0 +1,70 @@
+# island_model.py
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from parallel_evaluation import liberar_segmentos, publicar_catalogo, reconstruir_ag
+
+# Estado de cada proceso: el AG de las islas, reconstruido sobre la memoria compartida.
+_ag_isla = None
+_segmentos_isla = []
+
+
+def _inicializar_isla(*argumentos):
+    global _ag_isla, _segmentos_isla
+    _ag_isla, _segmentos_isla = reconstruir_ag(*argumentos)
+
+
+def _evolucionar_isla(poblacion, num_generaciones, semilla, tam_isla):
+    # Hace evolucionar una isla de `tam_isla` individuos `num_generaciones` y devuelve su población con el fitness de cada individuo.
+    ag = _ag_isla
+    ag.tam_poblacion = tam_isla
+    ag._rng = random.Random(semilla)
+    # Las islas no tienen proceso fijo: se vacía la caché para que el resultado no dependa del reparto.
+    ag._cache_fitness.clear()
+    ag.estadisticas = {'cache_aciertos': 0, 'cache_fallos': 0, 'evaluaciones_incrementales': 0}
+    if poblacion is None: # Primera época: la isla crea su propia población inicial.
+        poblacion = ag._crear_poblacion_inicial()
+    historial = []
+    poblacion = ag._evolucionar(poblacion, num_generaciones, historial)
+    fitness = [f for f, _ in ag._evaluar_generacion(poblacion)] # Necesario para elegir a los migrantes.
+    ag._derivaciones.clear()
+    return poblacion, fitness, historial, ag.estadisticas
+
+
+class PoolIslas:
+    """
+    Pool de procesos para el modelo de islas: cada isla evoluciona en un proceso.
+
+    Como en `EvaluadorParalelo`, el catálogo y las tablas de compatibilidad se publican
+    una sola vez en memoria compartida. Entre épocas solo viajan las poblaciones.
+    """
+
+    def __init__(self, ag, num_islas):
+        self._segmentos, argumentos = publicar_catalogo(ag)
+        try:
+            self._pool = ProcessPoolExecutor(max_workers=num_islas, initializer=_inicializar_isla, initargs=argumentos)
+        except Exception:
+            liberar_segmentos(self._segmentos)
+            raise
+
+    def evolucionar(self, poblaciones, num_generaciones, semillas, tam_isla):
+        """
+        Hace evolucionar todas las islas (de `tam_isla` individuos cada una) en paralelo durante `num_generaciones`.
+        Una población None indica que la isla debe crear su población inicial.
+        Devuelve, por isla, (población, fitness, historial de mejor fitness, estadísticas).
+        """
+        futuros = [self._pool.submit(_evolucionar_isla, poblacion, num_generaciones, semilla, tam_isla)
+                   for poblacion, semilla in zip(poblaciones, semillas)]
+        return [futuro.result() for futuro in futuros]
+
+    def cerrar(self):
+        """Detiene los procesos y libera la memoria compartida."""
+        self._pool.shutdown()
+        liberar_segmentos(self._segmentos)
+        self._segmentos = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cerrar()
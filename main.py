@@ -1,69 +1,101 @@
 # main.py
+"""
+Recomendaciones por lotes de EcoCloset AG, sin interfaz: optimiza muchos perfiles de usuario
+(un JSON por línea) contra un mismo catálogo y escribe un resultado por perfil.
+
+    python main.py --perfiles perfiles.jsonl --salida resultados.jsonl
+    python main.py --catalogo data/prendas.csv --perfiles perfiles.jsonl --procesos 8 --mood-boards armarios
+
+Cada perfil admite las claves `id`, `tam_armario`, `preferencias_estilo`,
+`prendas_obligatorias` (nombres) o `prendas_obligatorias_idx` (IDs), `estacion_colorimetria`
+o bien `tono_piel`, `color_ojos` y `color_pelo`, `colores_favoritos` y `semilla`.
+Con salida .jsonl cada resultado se escribe en cuanto termina; con .parquet se escriben
+todos al final (requiere pyarrow).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
 import pandas as pd
-from database import cargar_catalogo
-from genetic_algorithm import EcoClosetAG
-from utils import crear_mood_board, graficar_evolucion_fitness
+
+from batch_recommendations import leer_perfiles, optimizar_lote
+from database import convertir_catalogo_csv
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Optimiza armarios cápsula para muchos perfiles de usuario.")
+    parser.add_argument('--catalogo', default='data/prendas.csv', help="CSV del catálogo o carpeta en formato columnar.")
+    parser.add_argument('--perfiles', required=True, help="Fichero JSONL con un perfil de usuario por línea.")
+    parser.add_argument('--salida', default='resultados.jsonl', help="Fichero de resultados (.jsonl o .parquet).")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos en paralelo (por defecto, uno por CPU).")
+    parser.add_argument('--mood-boards', default=None, metavar='CARPETA', help="Si se indica, guarda aquí el mood board de cada armario.")
+    parser.add_argument('--img-folder', default='imagenes', help="Carpeta con las imágenes del catálogo (para los mood boards).")
+    parser.add_argument('--semilla', type=int, default=None, help="Semilla para los perfiles que no traen la suya.")
+    parser.add_argument('--poblacion', type=int, default=None, help="Sobrescribe el tamaño de población del AG.")
+    parser.add_argument('--generaciones', type=int, default=None, help="Sobrescribe el número de generaciones del AG.")
+    return parser.parse_args()
+
 
 def main():
-    print("--- Iniciando EcoCloset AG ---")
-
-    # 1. Entradas del Sistema (definidas por el usuario)
-    user_inputs = {
-        'tam_armario': 15,  # Número deseado de prendas en el armario cápsula
-        'contextos': {      # Distribución de necesidades por contexto
-            'Oficina': 0.5,
-            'Casual': 0.4,
-            'Evento Social': 0.1
-        },
-        # 'prendas_obligatorias': [1, 6] # Futura mejora: prendas que deben estar sí o sí
-    }
-    
-    print("\nParámetros del usuario:")
-    print(f" - Tamaño del armario deseado: {user_inputs['tam_armario']}")
-    print(f" - Necesidades por contexto: {user_inputs['contextos']}")
-
-    # 2. Cargar la base de conocimiento
-    catalogo_completo = cargar_catalogo()
-    if catalogo_completo is None:
-        return # Termina la ejecución si no se carga el catálogo
-    
-    # 3. Inicializar y ejecutar el Algoritmo Genético
-    print("\nIniciando optimización con Algoritmo Genético...")
-    ag = EcoClosetAG(catalogo_df=catalogo_completo, user_inputs=user_inputs)
-    mejores_armarios, historial_fitness = ag.ejecutar()
-
-    # 4. Mostrar las salidas esperadas
-    print("\n--- Optimización Finalizada. Mostrando los 3 mejores armarios encontrados ---")
-    
-    if not mejores_armarios:
-        print("No se encontraron soluciones válidas.")
-        return
-
-    for i, armario_data in enumerate(mejores_armarios):
-        print("\n" + "="*50)
-        print(f"  MEJOR ARMARIO CÁPSULA #{i+1}")
-        print("="*50)
-        
-        individuo = armario_data['individuo']
-        armario_df = catalogo_completo[individuo == 1]
-        
-        # a) Tabla detallada de prendas
-        print("\n[+] Prendas seleccionadas:")
-        print(armario_df[['Nombre', 'Tipo', 'Color', 'Estilo']].to_string(index=False))
-
-        # b) Panel de resumen con métricas
-        print("\n[+] Resumen del armario:")
-        print(f"  - Número total de prendas: {len(armario_df)}")
-        print(f"  - Fitness de la solución: {armario_data['fitness']:.4f}")
-        print(f"  - Atuendos únicos estimados: {armario_data['atuendos']}")
-        
-        # c) Visualización gráfica (mood board)
-        print("\n[+] Generando visualización...")
-        output_moodboard_path = f'armario_propuesto_{i+1}.png'
-        crear_mood_board(armario_df, output_moodboard_path)
-
-    # 5. Graficar evolución del fitness
-    graficar_evolucion_fitness(historial_fitness)
+    args = _argumentos()
+    print("--- Iniciando EcoCloset AG (por lotes) ---", file=sys.stderr)
+
+    # 1. El catálogo se valida y se convierte a formato columnar una sola vez; los procesos lo abren con memory-mapping.
+    if os.path.isdir(args.catalogo):
+        carpeta_catalogo = args.catalogo
+    else:
+        try:
+            with open(args.catalogo, 'rb') as f:
+                carpeta_catalogo = convertir_catalogo_csv(f.read())
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Error con el catálogo '{args.catalogo}': {e}", file=sys.stderr)
+            return 1
+
+    if args.salida.endswith('.parquet'):
+        try:
+            import pyarrow # noqa: F401 (solo se comprueba que está, antes de optimizar nada)
+        except ImportError:
+            print("Error: la salida .parquet requiere pyarrow; usa una salida .jsonl o instálalo.", file=sys.stderr)
+            return 1
+
+    hiperparametros = {}
+    if args.poblacion is not None: hiperparametros['tam_poblacion'] = args.poblacion
+    if args.generaciones is not None: hiperparametros['num_generaciones'] = args.generaciones
+    if args.mood_boards: os.makedirs(args.mood_boards, exist_ok=True)
+
+    perfiles = leer_perfiles(args.perfiles)
+    if args.semilla is not None: # La semilla del lote solo se aplica a los perfiles sin semilla propia.
+        perfiles = (perfil if perfil.get('semilla') is not None else dict(perfil, semilla=args.semilla) for perfil in perfiles)
+
+    # 2. Optimización de todos los perfiles, con los resultados en el mismo orden que la entrada.
+    inicio = time.perf_counter()
+    filas = optimizar_lote(
+        carpeta_catalogo, perfiles, num_procesos=args.procesos,
+        callback=lambda n: print(f"  {n} perfiles optimizados ({time.perf_counter() - inicio:.1f} s)", file=sys.stderr) if n % 100 == 0 else None,
+        hiperparametros=hiperparametros, carpeta_mood_boards=args.mood_boards, img_folder=args.img_folder,
+    )
+
+    # 3. Escritura de los resultados.
+    num_perfiles, num_errores = 0, 0
+    if args.salida.endswith('.parquet'):
+        resultados = []
+        for fila in filas:
+            resultados.append(fila)
+            num_perfiles, num_errores = num_perfiles + 1, num_errores + ('error' in fila)
+        pd.DataFrame(resultados).to_parquet(args.salida, index=False)
+    else:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            for fila in filas:
+                f.write(json.dumps(fila, ensure_ascii=False) + '\n')
+                f.flush() # Cada resultado queda en disco en cuanto termina.
+                num_perfiles, num_errores = num_perfiles + 1, num_errores + ('error' in fila)
+
+    print(f"--- {num_perfiles} perfiles optimizados en {time.perf_counter() - inicio:.1f} s "
+          f"({num_errores} con errores). Resultados en '{args.salida}' ---", file=sys.stderr)
+    return 0
+
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,246 @@
+# optimization_service.py
+"""
+Servicio HTTP local de EcoCloset AG, independiente de Streamlit. El catálogo se prepara una sola
+vez al arrancar y las optimizaciones se reparten en un pool acotado de procesos que comparten
+su índice y sus tablas de compatibilidad.
+
+    python optimization_service.py --catalogo data/prendas.csv --puerto 8000 --procesos 4
+    python optimization_service.py --catalogo /datos/prendas.csv --img-folder /datos/imagenes
+
+Endpoints (JSON salvo la imagen):
+    POST /optimizaciones                     perfil como en main.py -> 202 {"id", "estado"}
+    GET  /optimizaciones/<id>                estado: en_cola, en_curso, terminado o fallido
+    GET  /optimizaciones/<id>/resultado      fila de resultados (409 si aún no ha terminado)
+    GET  /atuendos/<id1>,<id2>,....png       imagen del atuendo formado por esas prendas
+    GET  /salud                              procesos, trabajos pendientes y capacidad de la cola
+
+Si ya hay `procesos + max_en_cola` optimizaciones pendientes, las nuevas se rechazan con 503 y
+una cabecera Retry-After, en lugar de acumularse sin límite.
+"""
+import argparse
+import itertools
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from batch_recommendations import PoolOptimizacion, entradas_desde_perfil
+from database import convertir_catalogo_csv
+
+EN_COLA = 'en_cola'
+EN_CURSO = 'en_curso'
+TERMINADO = 'terminado'
+FALLIDO = 'fallido'
+
+MAX_TAM_PETICION = 64 * 1024 # Bytes máximos del cuerpo de un POST.
+SEGUNDOS_REINTENTO = 5       # Valor de Retry-After cuando el servicio está saturado.
+
+
+class ServicioSaturado(Exception):
+    """No caben más optimizaciones pendientes; el cliente debe reintentar más tarde."""
+
+
+class ServicioOptimizacion:
+    """
+    Cola de optimizaciones sobre un `PoolOptimizacion`. Acepta como mucho `num_procesos +
+    max_en_cola` optimizaciones pendientes a la vez y recuerda el resultado de las
+    `max_terminados` últimas terminadas (se olvidan primero las más antiguas).
+    """
+
+    def __init__(self, carpeta_catalogo, num_procesos=None, max_en_cola=32, max_terminados=1000, carpetas_imagenes=None):
+        self.pool = PoolOptimizacion(carpeta_catalogo, num_procesos)
+        self.catalogo = self.pool.contexto.catalogo
+        self.max_pendientes = self.pool.num_procesos + max_en_cola
+        self.max_terminados = max_terminados
+        self._trabajos = OrderedDict() # ID -> Future con la fila de resultados, en orden de llegada.
+        self._pendientes = 0
+        self._contador = itertools.count(1)
+        self._cerrojo = threading.Lock()
+        self.carpetas_imagenes = carpetas_imagenes or {} # Argumentos de `outfit_visualizer.configurar_carpetas`.
+        self._precargador = None
+        self._cerrojo_precargador = threading.Lock() # Aparte: importar rembg es lento y no debe bloquear la cola.
+
+    def precargador(self):
+        """Devuelve el precargador de atuendos, importando (con rembg) y configurando el visualizador la primera vez."""
+        with self._cerrojo_precargador:
+            if self._precargador is None:
+                import outfit_visualizer # Solo se carga si se piden imágenes.
+                outfit_visualizer.configurar_carpetas(**self.carpetas_imagenes)
+                self._precargador = outfit_visualizer.obtener_precargador()
+            return self._precargador
+
+    def enviar(self, perfil):
+        """
+        Valida el perfil (ValueError si no es válido), lo encola y devuelve el ID de la
+        optimización. Lanza ServicioSaturado si la cola está llena.
+        """
+        entradas_desde_perfil(perfil, self.catalogo) # Los errores del perfil se devuelven ya, sin ocupar la cola.
+        with self._cerrojo:
+            if self._pendientes >= self.max_pendientes:
+                raise ServicioSaturado()
+            numero = next(self._contador)
+            futuro = self.pool.enviar(numero, perfil)
+            self._pendientes += 1
+            self._trabajos[str(numero)] = futuro
+            self._olvidar_terminados()
+        futuro.add_done_callback(self._al_terminar)
+        return str(numero)
+
+    def _al_terminar(self, futuro):
+        with self._cerrojo:
+            self._pendientes -= 1
+
+    def _olvidar_terminados(self):
+        # Se llama con el cerrojo tomado. Los trabajos pendientes nunca se olvidan.
+        terminados = [clave for clave, futuro in self._trabajos.items() if futuro.done()]
+        for clave in terminados[:max(0, len(terminados) - self.max_terminados)]:
+            del self._trabajos[clave]
+
+    def estado(self, id_trabajo):
+        """Devuelve el estado de la optimización, o None si no existe (o ya se olvidó)."""
+        with self._cerrojo:
+            futuro = self._trabajos.get(id_trabajo)
+        if futuro is None:
+            return None
+        if not futuro.done():
+            return EN_CURSO if futuro.running() else EN_COLA
+        return FALLIDO if futuro.exception() is not None or 'error' in futuro.result() else TERMINADO
+
+    def resultado(self, id_trabajo):
+        """Devuelve la fila de resultados de una optimización terminada (None si no ha terminado)."""
+        with self._cerrojo:
+            futuro = self._trabajos.get(id_trabajo)
+        if futuro is None or not futuro.done():
+            return None
+        if futuro.exception() is not None:
+            return {'id': id_trabajo, 'error': f'{type(futuro.exception()).__name__}: {futuro.exception()}'}
+        return futuro.result()
+
+    def salud(self):
+        with self._cerrojo:
+            return {'procesos': self.pool.num_procesos, 'pendientes': self._pendientes,
+                    'max_pendientes': self.max_pendientes, 'trabajos_recordados': len(self._trabajos)}
+
+    def cerrar(self):
+        self.pool.cerrar()
+
+
+class ManejadorOptimizacion(BaseHTTPRequestHandler):
+    """Traduce las peticiones HTTP a llamadas a `self.server.servicio`."""
+
+    def _responder_json(self, codigo, datos, cabeceras=None):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/optimizaciones':
+            return self._responder_json(404, {'error': 'Ruta no encontrada.'})
+        longitud = int(self.headers.get('Content-Length') or 0)
+        if longitud > MAX_TAM_PETICION:
+            return self._responder_json(413, {'error': 'El perfil es demasiado grande.'})
+        try:
+            perfil = json.loads(self.rfile.read(longitud) or b'null')
+            if not isinstance(perfil, dict):
+                raise ValueError("El cuerpo debe ser un objeto JSON con el perfil.")
+            id_trabajo = self.server.servicio.enviar(perfil)
+        except ServicioSaturado:
+            return self._responder_json(503, {'error': 'Demasiadas optimizaciones pendientes; reintenta más tarde.'},
+                                        {'Retry-After': str(SEGUNDOS_REINTENTO)})
+        except ValueError as e: # Incluye el JSON mal formado.
+            return self._responder_json(400, {'error': str(e)})
+        except Exception as e: # Cualquier otro fallo se responde en lugar de cortar la conexión.
+            return self._responder_json(500, {'error': f'{type(e).__name__}: {e}'})
+        self._responder_json(202, {'id': id_trabajo, 'estado': EN_COLA}, {'Location': f'/optimizaciones/{id_trabajo}'})
+
+    def do_GET(self):
+        partes = [parte for parte in self.path.split('?')[0].split('/') if parte]
+        servicio = self.server.servicio
+        if partes == ['salud']:
+            return self._responder_json(200, servicio.salud())
+        if len(partes) in (2, 3) and partes[0] == 'optimizaciones':
+            estado = servicio.estado(partes[1])
+            if estado is None:
+                return self._responder_json(404, {'error': 'Optimización no encontrada.'})
+            if len(partes) == 2:
+                return self._responder_json(200, {'id': partes[1], 'estado': estado})
+            if partes[2] == 'resultado':
+                if estado in (EN_COLA, EN_CURSO):
+                    return self._responder_json(409, {'id': partes[1], 'estado': estado})
+                return self._responder_json(200, servicio.resultado(partes[1]))
+        if len(partes) == 2 and partes[0] == 'atuendos' and partes[1].endswith('.png'):
+            return self._responder_atuendo(partes[1][:-len('.png')])
+        self._responder_json(404, {'error': 'Ruta no encontrada.'})
+
+    def _responder_atuendo(self, ids_texto):
+        catalogo = self.server.servicio.catalogo
+        try:
+            ids = [int(i) for i in ids_texto.split(',')]
+        except ValueError:
+            return self._responder_json(400, {'error': 'Los IDs del atuendo deben ser enteros separados por comas.'})
+        if not ids or any(i not in catalogo.index for i in ids):
+            return self._responder_json(404, {'error': 'Alguna prenda del atuendo no está en el catálogo.'})
+        try:
+            ruta = self.server.servicio.precargador().obtener(catalogo, ids)
+            if ruta is None:
+                raise RuntimeError("El visualizador no devolvió ninguna imagen.")
+            with open(ruta, 'rb') as f:
+                imagen = f.read()
+        except Exception as e: # Incluye la falta de rembg o de las imágenes del catálogo.
+            return self._responder_json(500, {'error': f'No se pudo generar la imagen del atuendo: {type(e).__name__}: {e}'})
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(imagen)))
+        self.end_headers()
+        self.wfile.write(imagen)
+
+
+def crear_servidor(servicio, host='127.0.0.1', puerto=8000):
+    """Crea el servidor HTTP (un hilo por conexión) que atiende las peticiones con `servicio`."""
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorOptimizacion)
+    servidor.daemon_threads = True
+    servidor.servicio = servicio
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de optimización de armarios cápsula.")
+    parser.add_argument('--catalogo', default='data/prendas.csv', help="CSV del catálogo o carpeta en formato columnar.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8000)
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos de optimización (por defecto, uno por CPU).")
+    parser.add_argument('--max-en-cola', type=int, default=32, help="Optimizaciones que pueden esperar a un proceso libre.")
+    parser.add_argument('--img-folder', default='imagenes', help="Carpeta con las imágenes del catálogo.")
+    parser.add_argument('--transparent-folder', default='imagenes_transparentes', help="Carpeta para las imágenes sin fondo.")
+    parser.add_argument('--outfit-folder', default='outfits_generados', help="Carpeta para las imágenes de los atuendos.")
+    args = parser.parse_args()
+    # Rutas absolutas: las imágenes no dependen del directorio desde el que se lanzó el servicio.
+    carpetas_imagenes = {'img_folder': os.path.abspath(args.img_folder),
+                         'transparent_folder': os.path.abspath(args.transparent_folder),
+                         'outfit_folder': os.path.abspath(args.outfit_folder)}
+
+    if os.path.isdir(args.catalogo):
+        carpeta_catalogo = args.catalogo
+    else:
+        with open(args.catalogo, 'rb') as f:
+            carpeta_catalogo = convertir_catalogo_csv(f.read())
+    servicio = ServicioOptimizacion(carpeta_catalogo, args.procesos, args.max_en_cola, carpetas_imagenes=carpetas_imagenes)
+    servidor = crear_servidor(servicio, args.host, args.puerto)
+    print(f"Servicio de EcoCloset AG escuchando en http://{args.host}:{args.puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servicio.cerrar()
+
+
+if __name__ == '__main__':
+    main()
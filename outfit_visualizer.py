@@ -1,8 +1,12 @@
 # outfit_visualizer.py
+import hashlib
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from PIL import Image, ImageDraw, ImageFont
 import rembg
-from utils import reescale_image_if_needed
+from utils import escribir_atomico, guardar_imagen_atomica, obtener_cache_miniaturas
 
 # Definir carpetas para las imágenes procesadas
 IMG_FOLDER = 'imagenes'
@@ -13,10 +17,30 @@ OUTFIT_FOLDER = 'outfits_generados'
 os.makedirs(TRANSPARENT_FOLDER, exist_ok=True)
 os.makedirs(OUTFIT_FOLDER, exist_ok=True)
 
+def configurar_carpetas(img_folder=None, transparent_folder=None, outfit_folder=None):
+    """Cambia las carpetas de imágenes del proceso (las que no se indican se mantienen) y crea las de salida."""
+    global IMG_FOLDER, TRANSPARENT_FOLDER, OUTFIT_FOLDER
+    IMG_FOLDER = img_folder or IMG_FOLDER
+    TRANSPARENT_FOLDER = transparent_folder or TRANSPARENT_FOLDER
+    OUTFIT_FOLDER = outfit_folder or OUTFIT_FOLDER
+    os.makedirs(TRANSPARENT_FOLDER, exist_ok=True)
+    os.makedirs(OUTFIT_FOLDER, exist_ok=True)
+
+# Sesión de rembg del proceso: el modelo se carga una sola vez y se reutiliza en cada imagen.
+_sesion_rembg = None
+
+def obtener_sesion():
+    """Devuelve la sesión de rembg de este proceso, creándola (y cargando el modelo) la primera vez."""
+    global _sesion_rembg
+    if _sesion_rembg is None:
+        _sesion_rembg = rembg.new_session()
+    return _sesion_rembg
+
 def remove_background(image_name):
     """
     Quita el fondo de una imagen y la guarda en la carpeta de transparentes.
     Si ya existe, simplemente devuelve la ruta.
+    El resultado se escribe de forma atómica, así que nunca se lee un fichero a medio escribir.
     """
     original_path = os.path.join(IMG_FOLDER, image_name)
     transparent_path = os.path.join(TRANSPARENT_FOLDER, image_name)
@@ -29,14 +53,64 @@ def remove_background(image_name):
 
     try:
         with open(original_path, 'rb') as i:
-            with open(transparent_path, 'wb') as o:
-                input_data = i.read()
-                output_data = rembg.remove(input_data)
-                o.write(output_data)
+            input_data = i.read()
+        output_data = rembg.remove(input_data, session=obtener_sesion())
+        escribir_atomico(transparent_path, output_data)
         return transparent_path
     except Exception:
         return None
 
+def _inicializar_trabajador(img_folder, transparent_folder):
+    # Cada proceso usa las mismas carpetas que quien lo lanza y carga su sesión de rembg una sola vez.
+    # Con `fork` el proceso hereda la sesión del padre, que no se puede usar tras el fork: se descarta.
+    global IMG_FOLDER, TRANSPARENT_FOLDER, _sesion_rembg
+    IMG_FOLDER, TRANSPARENT_FOLDER = img_folder, transparent_folder
+    _sesion_rembg = None
+    obtener_sesion()
+
+def _procesar_lote(nombres_imagenes):
+    return [(nombre, remove_background(nombre)) for nombre in nombres_imagenes]
+
+def preprocesar_catalogo(nombres_imagenes, num_procesos=None, tam_lote=4, callback=None):
+    """
+    Quita el fondo de todas las imágenes indicadas (p. ej. la columna `Imagen` del catálogo)
+    en lotes repartidos entre varios procesos, cada uno con su propia sesión de rembg.
+    Las que ya están en la carpeta de transparentes no se vuelven a procesar.
+    `callback(progreso, mensaje)` recibe el avance (0 a 1) tras cada lote.
+    Devuelve un diccionario nombre -> ruta transparente (None si no se pudo procesar).
+    """
+    nombres = [nombre for nombre in dict.fromkeys(nombres_imagenes) if isinstance(nombre, str)]
+    resultados = {nombre: os.path.join(TRANSPARENT_FOLDER, nombre) for nombre in nombres
+                  if os.path.exists(os.path.join(TRANSPARENT_FOLDER, nombre))}
+    pendientes = [nombre for nombre in nombres if nombre not in resultados]
+    lotes = [pendientes[i:i + tam_lote] for i in range(0, len(pendientes), tam_lote)]
+    if num_procesos is None:
+        num_procesos = min(4, os.cpu_count() or 1)
+    num_procesos = max(1, min(num_procesos, len(lotes)))
+
+    def informar(procesadas):
+        if callback:
+            callback(procesadas / len(pendientes) if pendientes else 1.0, f"Quitando fondos: {procesadas}/{len(pendientes)} imágenes")
+
+    procesadas = 0
+    informar(procesadas)
+    if num_procesos == 1: # Sin lanzar procesos: se usa la sesión de este mismo proceso.
+        for lote in lotes:
+            resultados.update(_procesar_lote(lote))
+            procesadas += len(lote)
+            informar(procesadas)
+        return resultados
+
+    with ProcessPoolExecutor(max_workers=num_procesos, initializer=_inicializar_trabajador,
+                             initargs=(IMG_FOLDER, TRANSPARENT_FOLDER)) as executor:
+        futuros = [executor.submit(_procesar_lote, lote) for lote in lotes]
+        for futuro in as_completed(futuros):
+            lote_procesado = futuro.result()
+            resultados.update(lote_procesado)
+            procesadas += len(lote_procesado)
+            informar(procesadas)
+    return resultados
+
 def create_outfit_image(outfit_prendas, outfit_filename):
     """
     Crea una imagen compuesta de un atuendo, apilando las prendas verticalmente.
@@ -71,10 +145,9 @@ def create_outfit_image(outfit_prendas, outfit_filename):
         if not img_path:
             continue
 
-        # Reescalar la imagen si es muy grande
-        img_path = reescale_image_if_needed(img_path)
         try:
-            img = Image.open(img_path)
+            # Versión reescalada (máx. 800 px) desde la caché de miniaturas, ya decodificada.
+            img = obtener_cache_miniaturas().obtener(img_path, 800)
             
             # Redimensionar la imagen para que quepa en su "slot"
             img.thumbnail((canvas_width - 50, slot_height - 60))
@@ -105,5 +178,94 @@ def create_outfit_image(outfit_prendas, outfit_filename):
             print(f"Error al procesar la prenda {prenda['Nombre']}: {e}")
 
     output_path = os.path.join(OUTFIT_FOLDER, outfit_filename)
-    canvas.save(output_path, 'PNG')
-    return output_path
\ No newline at end of file
+    guardar_imagen_atomica(canvas, output_path)
+    return output_path
+
+
+VERSION_ATUENDO = 1 # Cambiarla invalida las imágenes de atuendos ya generadas (p. ej. si cambia la composición).
+SUFIJO_INCOMPLETO = '.incompleto.png' # Imágenes a las que les faltaba alguna prenda; se vuelven a intentar.
+
+def huella_atuendo(outfit_prendas):
+    """
+    Huella de la imagen de un atuendo: hash del tipo de cada prenda y del contenido de su imagen
+    original. Si cambia una imagen o el catálogo (aunque los IDs sean los mismos), la huella cambia.
+    """
+    cache = obtener_cache_miniaturas()
+    huella = hashlib.sha256(repr(VERSION_ATUENDO).encode())
+    for tipo, fname in zip(outfit_prendas['Tipo'], outfit_prendas['Imagen']):
+        ruta = os.path.join(IMG_FOLDER, fname) if isinstance(fname, str) else None
+        contenido = cache.hash_contenido(ruta) if ruta and os.path.exists(ruta) else None
+        huella.update(repr((str(tipo), fname if isinstance(fname, str) else None, contenido)).encode())
+    return huella.hexdigest()
+
+
+def nombre_imagen_atuendo(outfit_prendas):
+    """Nombre del fichero de un atuendo, que depende solo del contenido de sus prendas (ver `huella_atuendo`)."""
+    return f'atuendo_{huella_atuendo(outfit_prendas)}.png'
+
+
+class PrecargadorAtuendos:
+    """
+    Renderiza imágenes de atuendos en segundo plano, en un pool de hilos, para que al pasar
+    al siguiente atuendo la imagen ya esté lista. Cada atuendo se identifica por la huella de
+    sus prendas, así que un mismo atuendo se renderiza una sola vez aunque lo pidan varias
+    sesiones, y nunca se sirve la imagen de otro catálogo con los mismos IDs.
+    Recuerda como mucho `max_atuendos` (LRU); las imágenes ya escritas en disco se reutilizan.
+    """
+
+    def __init__(self, max_atuendos=64, num_hilos=2):
+        self.max_atuendos = max_atuendos
+        self._executor = ThreadPoolExecutor(max_workers=num_hilos, thread_name_prefix='precarga_atuendos')
+        self._futuros = OrderedDict() # Nombre de la imagen del atuendo -> Future con su ruta.
+        self._cerrojo = threading.Lock()
+
+    def _renderizar(self, outfit_prendas, nombre):
+        ruta = os.path.join(OUTFIT_FOLDER, nombre)
+        if os.path.exists(ruta):
+            return ruta
+        ruta = create_outfit_image(outfit_prendas, nombre)
+        if ruta is None: # Atuendo vacío o sin ninguna imagen que componer.
+            return None
+        completa = all(isinstance(fname, str) and os.path.exists(os.path.join(TRANSPARENT_FOLDER, fname)) for fname in outfit_prendas['Imagen'])
+        if not completa: # Falta el fondo quitado de alguna prenda: la imagen se sirve, pero no se reutiliza.
+            ruta_incompleta = ruta[:-len('.png')] + SUFIJO_INCOMPLETO
+            os.replace(ruta, ruta_incompleta)
+            return ruta_incompleta
+        return ruta
+
+    def _futuro(self, catalogo_df, atuendo_ids):
+        outfit_prendas = catalogo_df.loc[list(atuendo_ids)]
+        nombre = nombre_imagen_atuendo(outfit_prendas)
+        with self._cerrojo:
+            futuro = self._futuros.get(nombre)
+            # Se vuelve a renderizar si falló, si no se pudo componer o si le faltaban prendas sin fondo.
+            if futuro is None or (futuro.done() and (futuro.exception() is not None or futuro.result() is None
+                                                     or futuro.result().endswith(SUFIJO_INCOMPLETO))):
+                futuro = self._executor.submit(self._renderizar, outfit_prendas, nombre)
+                self._futuros[nombre] = futuro
+            self._futuros.move_to_end(nombre)
+            while len(self._futuros) > self.max_atuendos:
+                # Solo se olvida: otra sesión puede estar esperando ese mismo futuro en `obtener`.
+                self._futuros.popitem(last=False)
+            return futuro
+
+    def precargar(self, catalogo_df, atuendos):
+        """Encola el renderizado de los atuendos dados (listas de IDs) que aún no estén hechos."""
+        for atuendo_ids in atuendos:
+            self._futuro(catalogo_df, atuendo_ids)
+
+    def obtener(self, catalogo_df, atuendo_ids):
+        """Devuelve la ruta de la imagen del atuendo, esperando a que termine si se está renderizando."""
+        return self._futuro(catalogo_df, atuendo_ids).result()
+
+
+_precargador = None
+_cerrojo_precargador = threading.Lock()
+
+def obtener_precargador():
+    """Devuelve el precargador de atuendos del proceso (compartido por todas las sesiones)."""
+    global _precargador
+    with _cerrojo_precargador:
+        if _precargador is None:
+            _precargador = PrecargadorAtuendos()
+        return _precargador
\ No newline at end of file
@@ -0,0 +1,139 @@
+# parallel_evaluation.py
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from compatibility import MatrizCompatibilidad
+from database import CatalogIndex
+from genetic_algorithm import EcoClosetAG
+
+# Estado de cada proceso trabajador: un AG reconstruido sobre la memoria compartida.
+_ag_trabajador = None
+_segmentos_trabajador = []
+
+
+def publicar_arrays(arrays):
+    """
+    Copia un diccionario de arrays de NumPy a bloques de memoria compartida.
+    Devuelve los segmentos creados (hay que liberarlos con `liberar_segmentos`) y sus
+    descriptores (nombre, forma y tipo), que es lo único que viaja a los otros procesos.
+    """
+    segmentos, descriptores = [], {}
+    for nombre, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        segmento = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segmento.buf)[...] = array
+        segmentos.append(segmento)
+        descriptores[nombre] = (segmento.name, array.shape, array.dtype.str)
+    return segmentos, descriptores
+
+
+def adjuntar_arrays(descriptores):
+    """
+    Abre los bloques descritos por `publicar_arrays` y devuelve vistas de NumPy sobre
+    ellos, sin copiar datos, junto con los segmentos abiertos (hay que mantenerlos vivos).
+    """
+    segmentos, arrays = [], {}
+    for nombre, (nombre_segmento, forma, tipo) in descriptores.items():
+        segmento = shared_memory.SharedMemory(name=nombre_segmento)
+        segmentos.append(segmento)
+        arrays[nombre] = np.ndarray(forma, dtype=np.dtype(tipo), buffer=segmento.buf)
+    return arrays, segmentos
+
+
+def liberar_segmentos(segmentos):
+    """Cierra y elimina bloques de memoria compartida creados con `publicar_arrays`."""
+    for segmento in segmentos:
+        segmento.close()
+        segmento.unlink()
+
+
+def publicar_catalogo(ag):
+    """
+    Publica en memoria compartida el índice del catálogo y las tablas de compatibilidad
+    de un `EcoClosetAG`. Devuelve los segmentos creados y la tupla de argumentos con la
+    que `reconstruir_ag` rehace un AG equivalente en otro proceso.
+    """
+    segmentos = []
+    try:
+        segmentos_indice, descriptores_indice = publicar_arrays(ag.indice.arrays())
+        segmentos += segmentos_indice
+        segmentos_matriz, descriptores_matriz = publicar_arrays(ag.matriz_compatibilidad.arrays())
+        segmentos += segmentos_matriz
+    except Exception:
+        liberar_segmentos(segmentos)
+        raise
+    user_inputs = ag.entradas_usuario()
+    hiperparametros = {nombre: getattr(ag, nombre) for nombre in ('tam_poblacion', 'prob_cruce', 'prob_mutacion', 'tam_cache_fitness')}
+    argumentos = (descriptores_indice, ag.indice.categorias, list(ag.indice.etiquetas),
+                  descriptores_matriz, ag.matriz_compatibilidad.perfiles, user_inputs, hiperparametros)
+    return segmentos, argumentos
+
+
+def reconstruir_ag(descriptores_indice, categorias, etiquetas, descriptores_matriz, perfiles, user_inputs, hiperparametros):
+    """
+    Rehace, en el proceso actual, el AG publicado con `publicar_catalogo` sobre la memoria
+    compartida (sin copiar los arrays). Devuelve el AG y los segmentos abiertos, que hay
+    que mantener vivos mientras se use. El AG no tiene DataFrame del catálogo.
+    """
+    arrays_indice, segmentos_indice = adjuntar_arrays(descriptores_indice)
+    arrays_matriz, segmentos_matriz = adjuntar_arrays(descriptores_matriz)
+    indice = CatalogIndex.desde_arrays(arrays_indice, categorias, etiquetas)
+    matriz = MatrizCompatibilidad.desde_arrays(arrays_matriz, perfiles, etiquetas)
+    ag = EcoClosetAG(None, user_inputs, indice_catalogo=indice, matriz_compatibilidad=matriz)
+    for nombre, valor in hiperparametros.items():
+        setattr(ag, nombre, valor)
+    return ag, segmentos_indice + segmentos_matriz
+
+
+def _inicializar_trabajador(*argumentos):
+    # Se ejecuta una vez por proceso: reconstruye el AG sobre la memoria compartida.
+    global _ag_trabajador, _segmentos_trabajador
+    _ag_trabajador, _segmentos_trabajador = reconstruir_ag(*argumentos)
+
+
+def _evaluar_bloque(bloque, con_estados):
+    return _ag_trabajador.evaluar_poblacion(bloque, con_estados=con_estados)
+
+
+class EvaluadorParalelo:
+    """
+    Reparte la evaluación del fitness de una población entre un pool de procesos.
+
+    El índice del catálogo y las tablas de compatibilidad se copian una sola vez a
+    memoria compartida; cada proceso se adjunta a ellas al arrancar, así que por tarea
+    solo viajan las posiciones de los armarios y sus resultados. Como cada armario se
+    evalúa con el mismo código que en serie, los resultados son idénticos.
+    """
+
+    def __init__(self, ag, num_procesos, tam_bloque=8):
+        self.tam_bloque = max(1, tam_bloque)
+        self._segmentos, argumentos = publicar_catalogo(ag)
+        try:
+            self._pool = ProcessPoolExecutor(max_workers=num_procesos, initializer=_inicializar_trabajador, initargs=argumentos)
+        except Exception:
+            liberar_segmentos(self._segmentos)
+            raise
+
+    def evaluar_poblacion(self, poblacion, con_estados=False):
+        """Igual que `EcoClosetAG.evaluar_poblacion`, repartiendo la población en bloques entre los procesos."""
+        if len(poblacion) == 0:
+            return {'fitness': np.zeros(0)}
+        bloques = [poblacion[i:i + self.tam_bloque] for i in range(0, len(poblacion), self.tam_bloque)]
+        partes = list(self._pool.map(_evaluar_bloque, bloques, [con_estados] * len(bloques)))
+        resultado = {clave: np.concatenate([parte[clave] for parte in partes]) for clave in partes[0] if clave != 'estados'}
+        if con_estados:
+            resultado['estados'] = [estado for parte in partes for estado in parte['estados']]
+        return resultado
+
+    def cerrar(self):
+        """Detiene los procesos y libera la memoria compartida."""
+        self._pool.shutdown()
+        liberar_segmentos(self._segmentos)
+        self._segmentos = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cerrar()
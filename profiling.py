@@ -0,0 +1,102 @@
+# profiling.py
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from utils import escribir_atomico
+
+
+class PerfiladorAG:
+    """
+    Registra en qué se va el tiempo de `EcoClosetAG.ejecutar(profiler=...)` y lo exporta como
+    traza en formato Chrome (`chrome://tracing` o Perfetto).
+
+    Las fases largas (población inicial, evaluación de cada generación, creación de la nueva
+    generación, selección final y conteo de combinaciones) quedan como intervalos; las llamadas
+    cortas y muy frecuentes (selección por torneo, cruce, mutación, fitness incremental) se
+    acumulan por generación para no generar un evento por llamada. Cada generación añade además
+    sus conteos de evaluaciones y el desglose del fitness de su mejor armario.
+    Si no se pasa un perfilador, el AG no hace ninguna medición.
+    """
+
+    def __init__(self):
+        self.eventos = []
+        self._origen = time.perf_counter()
+        self._pid = os.getpid()
+        self._tid = threading.get_ident()
+        self._inicio_generacion = None
+        self._acumulado = defaultdict(float) # Segundos por operación frecuente en la generación en curso.
+        self._llamadas = Counter()            # Llamadas por operación frecuente en la generación en curso.
+
+    def _microsegundos(self, instante):
+        return round((instante - self._origen) * 1e6, 3)
+
+    def _intervalo(self, nombre, inicio, fin, args=None):
+        self.eventos.append({'name': nombre, 'cat': 'ag', 'ph': 'X', 'pid': self._pid, 'tid': self._tid,
+                             'ts': self._microsegundos(inicio), 'dur': round((fin - inicio) * 1e6, 3), 'args': args or {}})
+
+    def _contador(self, nombre, instante, valores):
+        self.eventos.append({'name': nombre, 'cat': 'ag', 'ph': 'C', 'pid': self._pid, 'tid': self._tid,
+                             'ts': self._microsegundos(instante), 'args': valores})
+
+    def envolver(self, nombre, funcion, intervalo=False):
+        """
+        Devuelve `funcion` instrumentada: con `intervalo=True` cada llamada es un intervalo de la
+        traza; si no, su tiempo y su número de llamadas se acumulan en la generación en curso.
+        """
+        @functools.wraps(funcion)
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                fin = time.perf_counter()
+                if intervalo:
+                    self._intervalo(nombre, inicio, fin)
+                else:
+                    self._acumulado[nombre] += fin - inicio
+                    self._llamadas[nombre] += 1
+        return medida
+
+    def empezar_generacion(self):
+        self._inicio_generacion = time.perf_counter()
+        self._acumulado.clear()
+        self._llamadas.clear()
+
+    def terminar_generacion(self, generacion, evaluaciones, desglose):
+        """
+        Cierra el intervalo de la generación con sus datos: `evaluaciones` (conteos de la caché y
+        de evaluaciones incrementales) y `desglose` (contribución de cada componente al fitness
+        del mejor armario). Los tiempos acumulados de las operaciones frecuentes van en milisegundos.
+        """
+        fin = time.perf_counter()
+        tiempos_ms = {nombre: round(segundos * 1e3, 4) for nombre, segundos in self._acumulado.items()}
+        self._intervalo(f'generacion {generacion}', self._inicio_generacion, fin, {
+            'generacion': generacion, 'tiempos_ms': tiempos_ms, 'llamadas': dict(self._llamadas),
+            'evaluaciones': evaluaciones, 'desglose_fitness': desglose,
+        })
+        self._contador('evaluaciones', fin, evaluaciones)
+        self._contador('desglose_fitness', fin, desglose)
+        if tiempos_ms:
+            self._contador('tiempos_ms', fin, tiempos_ms)
+
+    def resumen(self):
+        """Tiempo total (ms) por intervalo, sumando todas las generaciones bajo 'generacion'."""
+        totales = defaultdict(float)
+        for evento in self.eventos:
+            if evento['ph'] == 'X':
+                nombre = 'generacion' if evento['name'].startswith('generacion ') else evento['name']
+                totales[nombre] += evento['dur'] / 1e3
+                for operacion, ms in evento['args'].get('tiempos_ms', {}).items():
+                    totales[operacion] += ms
+        return dict(totales)
+
+    def traza(self):
+        """La traza completa en formato Chrome (diccionario listo para `json.dump`)."""
+        return {'traceEvents': list(self.eventos), 'displayTimeUnit': 'ms'}
+
+    def guardar(self, ruta):
+        escribir_atomico(ruta, json.dumps(self.traza(), ensure_ascii=False).encode('utf-8'))
@@ -0,0 +1,159 @@
+# result_cache.py
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils import escribir_atomico
+
+CARPETA_RESULTADOS = 'resultados_cache'
+
+
+def huella_catalogo(catalogo_df):
+    """Hash del contenido del catálogo (columnas, índice y valores de cada fila)."""
+    huella = hashlib.sha256(repr(list(catalogo_df.columns)).encode())
+    huella.update(pd.util.hash_pandas_object(catalogo_df, index=True).to_numpy().tobytes())
+    return huella.hexdigest()
+
+
+def _a_json(valor):
+    # Los tipos de NumPy (p. ej. IDs de prendas np.int64) se escriben como sus equivalentes de Python.
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return str(valor)
+
+
+def clave_resultado(catalogo_df, user_inputs, hiperparametros, semilla):
+    """
+    Clave canónica de una optimización: hash del catálogo, de las entradas del usuario, de los
+    hiperparámetros del AG y de la semilla. El orden de las claves de los diccionarios no influye.
+    """
+    descripcion = json.dumps(
+        {'catalogo': huella_catalogo(catalogo_df), 'user_inputs': user_inputs,
+         'hiperparametros': hiperparametros, 'semilla': semilla},
+        sort_keys=True, default=_a_json, ensure_ascii=False,
+    )
+    return hashlib.sha256(descripcion.encode('utf-8')).hexdigest()
+
+
+class CacheResultados:
+    """
+    Almacén de resultados del AG (mejores armarios, historial de fitness y estadísticas) con una
+    capa en memoria (LRU de `max_entradas_memoria`) y otra en disco en `carpeta`, que se desaloja
+    por antigüedad de uso cuando supera `max_bytes_disco`.
+    """
+
+    def __init__(self, carpeta=CARPETA_RESULTADOS, max_bytes_disco=64 * 1024 * 1024, max_entradas_memoria=32):
+        self.carpeta = carpeta
+        self.max_bytes_disco = max_bytes_disco
+        self.max_entradas_memoria = max_entradas_memoria
+        self._memoria = OrderedDict()
+        self._cerrojo = threading.Lock()
+
+    def _ruta(self, clave):
+        return os.path.join(self.carpeta, f'{clave}.pkl')
+
+    def obtener(self, clave):
+        """
+        Devuelve el resultado guardado con esa clave o None si no existe. Cada llamada devuelve
+        una copia nueva: quien lo use puede modificarlo sin tocar la caché. Un fichero que no se
+        puede cargar (truncado, o de una versión con otras clases) se borra y cuenta como fallo.
+        """
+        with self._cerrojo:
+            datos = self._memoria.get(clave)
+            if datos is not None:
+                self._memoria.move_to_end(clave)
+        ruta = self._ruta(clave)
+        if datos is None:
+            try:
+                with open(ruta, 'rb') as f:
+                    datos = f.read()
+                os.utime(ruta) # Marca el uso para el desalojo LRU del disco.
+            except FileNotFoundError:
+                return None
+        try:
+            resultado = pickle.loads(datos)
+        except Exception:
+            with self._cerrojo:
+                self._memoria.pop(clave, None)
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            return None
+        self._guardar_en_memoria(clave, datos)
+        return resultado
+
+    def guardar(self, clave, resultado):
+        """Guarda una copia del resultado en memoria y en disco (escritura atómica)."""
+        datos = pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL) # Serializado: ya no le afecta lo que cambie quien llama.
+        self._guardar_en_memoria(clave, datos)
+        os.makedirs(self.carpeta, exist_ok=True)
+        escribir_atomico(self._ruta(clave), datos)
+        self._desalojar_disco(conservar=self._ruta(clave))
+
+    def _guardar_en_memoria(self, clave, datos):
+        # En memoria se guardan los bytes serializados; cada acierto los deserializa en una copia nueva.
+        with self._cerrojo:
+            self._memoria[clave] = datos
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_entradas_memoria:
+                self._memoria.popitem(last=False)
+
+    def _desalojar_disco(self, conservar):
+        # Borra los resultados usados hace más tiempo mientras la carpeta supere el límite.
+        ficheros = []
+        for nombre in os.listdir(self.carpeta):
+            ruta = os.path.join(self.carpeta, nombre)
+            if nombre.endswith('.pkl') and ruta != conservar:
+                estado = os.stat(ruta)
+                ficheros.append((estado.st_mtime_ns, estado.st_size, ruta))
+        total = sum(tam for _, tam, _ in ficheros) + os.path.getsize(conservar)
+        for _, tam, ruta in sorted(ficheros):
+            if total <= self.max_bytes_disco:
+                break
+            try:
+                os.remove(ruta)
+            except FileNotFoundError: # Otro proceso ya lo había borrado.
+                pass
+            total -= tam
+
+
+_caches_resultados = {}
+
+def obtener_cache_resultados(carpeta=CARPETA_RESULTADOS):
+    """Devuelve la caché de resultados compartida de `carpeta` (una por carpeta y proceso)."""
+    if carpeta not in _caches_resultados:
+        _caches_resultados[carpeta] = CacheResultados(carpeta)
+    return _caches_resultados[carpeta]
+
+
+def ejecutar_con_cache(ag, cache=None, streamlit_callback=None, callback_mejor=None, cancelacion=None):
+    """
+    Igual que `ag.ejecutar`, pero si ya se optimizó el mismo catálogo con las mismas entradas,
+    hiperparámetros y semilla devuelve al instante los mejores armarios y el historial guardados.
+    En `ag.estadisticas['resultado_en_cache']` queda si el resultado salió de la caché. Las
+    ejecuciones canceladas no se guardan: su resultado es parcial.
+    """
+    cache = cache if cache is not None else obtener_cache_resultados()
+    clave = clave_resultado(ag.catalogo, ag.entradas_usuario(), ag.hiperparametros(), ag.semilla)
+    resultado = cache.obtener(clave)
+    if resultado is not None:
+        mejores_armarios, historial, estadisticas = resultado
+        ag.estadisticas = dict(estadisticas, resultado_en_cache=True)
+        if streamlit_callback:
+            streamlit_callback(1.0, "Resultado recuperado de una optimización anterior.")
+        if callback_mejor and mejores_armarios:
+            callback_mejor(mejores_armarios[0]['individuo'][:], mejores_armarios[0]['fitness'], list(historial))
+        return mejores_armarios, historial
+
+    mejores_armarios, historial = ag.ejecutar(streamlit_callback=streamlit_callback, callback_mejor=callback_mejor, cancelacion=cancelacion)
+    if ag.estadisticas.get('motivo_parada') != 'cancelado':
+        cache.guardar(clave, (mejores_armarios, historial, dict(ag.estadisticas)))
+    ag.estadisticas['resultado_en_cache'] = False
+    return mejores_armarios, historial
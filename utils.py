@@ -1,32 +1,220 @@
 # utils.py
 from PIL import Image
 import pillow_avif # Para soportar .avif
+import hashlib
+import io
 import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
 from Conocimientos import COLOR_PALETTES
 
-# --- NUEVA FUNCIÓN PARA REESCALAR IMÁGENES GRANDES ---
+# --- CACHÉ DE MINIATURAS ---
+# Tamaños (lado máximo en px) que se guardan: los de las miniaturas de `crear_mood_board`
+# y el reescalado a 800 que usa `create_outfit_image`.
+NIVELES_MINIATURA = (80, 100, 150, 200, 800)
+CARPETA_MINIATURAS = os.path.join('imagenes_temp', 'miniaturas')
+
+
+class CacheMiniaturas:
+    """
+    Caché de miniaturas de imágenes de prendas, indexada por el hash del contenido del fichero
+    y el nivel de tamaño. Tiene dos capas: una en memoria (LRU de imágenes ya decodificadas) y
+    otra en disco (PNG en `carpeta`, con desalojo LRU cuando se supera `max_bytes_disco`).
+    Si cambia el contenido de la imagen original cambia su hash, así que nunca se sirve una
+    miniatura antigua. Un nivel que falta se genera a partir del nivel mayor ya guardado, si lo
+    hay, sin volver a decodificar la imagen original a resolución completa.
+    """
+
+    def __init__(self, carpeta=CARPETA_MINIATURAS, max_bytes_disco=256 * 1024 * 1024, max_imagenes_memoria=256, max_hashes=4096):
+        self.carpeta = carpeta
+        self.max_bytes_disco = max_bytes_disco
+        self.max_imagenes_memoria = max_imagenes_memoria
+        self.max_hashes = max_hashes
+        self._memoria = OrderedDict() # (hash, nivel) -> imagen decodificada.
+        self._hashes = OrderedDict() # (ruta, mtime, tamaño) -> hash del contenido (LRU), para no releer ficheros sin cambios.
+        self._bytes_disco = None # Se calcula al escribir por primera vez.
+        self._cerrojo = threading.RLock() # Streamlit atiende cada sesión en un hilo distinto.
+
+    @staticmethod
+    def nivel(tam):
+        """Menor nivel que cubre un lado de `tam` px (o `tam` si supera el mayor nivel)."""
+        return next((nivel for nivel in NIVELES_MINIATURA if nivel >= tam), tam)
+
+    def hash_contenido(self, ruta_imagen):
+        estado = os.stat(ruta_imagen)
+        clave = (os.path.abspath(ruta_imagen), estado.st_mtime_ns, estado.st_size)
+        with self._cerrojo:
+            if clave in self._hashes:
+                self._hashes.move_to_end(clave)
+                return self._hashes[clave]
+            with open(ruta_imagen, 'rb') as f:
+                hash_imagen = hashlib.sha256(f.read()).hexdigest()
+            self._hashes[clave] = hash_imagen
+            while len(self._hashes) > self.max_hashes:
+                self._hashes.popitem(last=False) # Solo se pierde el atajo: el hash se recalcula si vuelve a hacer falta.
+            return hash_imagen
+
+    def _ruta_nivel(self, hash_imagen, nivel):
+        return os.path.join(self.carpeta, f'{hash_imagen}_{nivel}.png')
+
+    def ruta(self, ruta_imagen, tam):
+        """
+        Devuelve la ruta en disco de la miniatura de `ruta_imagen` con lado máximo
+        `nivel(tam)`, generándola si aún no existe.
+        """
+        hash_imagen = self.hash_contenido(ruta_imagen)
+        nivel = self.nivel(tam)
+        ruta_miniatura = self._ruta_nivel(hash_imagen, nivel)
+        with self._cerrojo:
+            if os.path.exists(ruta_miniatura):
+                os.utime(ruta_miniatura) # Marca el uso para el desalojo LRU del disco.
+                return ruta_miniatura
+            imagen = self._memoria.get((hash_imagen, nivel))
+        # La decodificación y la codificación se hacen fuera del cerrojo para no bloquear a otros hilos.
+        if imagen is None:
+            imagen = self._generar(ruta_imagen, hash_imagen, nivel)
+        self._guardar_en_disco(ruta_miniatura, imagen)
+        with self._cerrojo:
+            self._guardar_en_memoria((hash_imagen, nivel), imagen)
+        return ruta_miniatura
+
+    def obtener(self, ruta_imagen, tam):
+        """Devuelve (una copia de) la miniatura de `ruta_imagen` con lado máximo `nivel(tam)`."""
+        clave = (self.hash_contenido(ruta_imagen), self.nivel(tam))
+        with self._cerrojo:
+            imagen = self._memoria.get(clave)
+            if imagen is not None:
+                self._memoria.move_to_end(clave)
+                return imagen.copy()
+        ruta_miniatura = self.ruta(ruta_imagen, tam)
+        with self._cerrojo:
+            imagen = self._memoria.get(clave) # Si se acaba de generar ya está en memoria.
+        if imagen is None:
+            imagen = Image.open(ruta_miniatura)
+            imagen.load()
+            with self._cerrojo:
+                self._guardar_en_memoria(clave, imagen)
+        return imagen.copy()
+
+    def vaciar(self, disco=False):
+        """Vacía la capa de memoria y los hashes recordados (y la capa de disco si `disco` es True)."""
+        with self._cerrojo:
+            self._memoria.clear()
+            self._hashes.clear()
+            if disco and os.path.isdir(self.carpeta):
+                for nombre in os.listdir(self.carpeta):
+                    if nombre.endswith('.png'):
+                        os.remove(os.path.join(self.carpeta, nombre))
+                self._bytes_disco = 0
+
+    def _generar(self, ruta_imagen, hash_imagen, nivel):
+        # Parte del nivel mayor más pequeño ya disponible; si no hay ninguno, de la imagen original.
+        origen = ruta_imagen
+        for nivel_mayor in NIVELES_MINIATURA:
+            if nivel_mayor > nivel:
+                with self._cerrojo:
+                    imagen_mayor = self._memoria.get((hash_imagen, nivel_mayor))
+                if imagen_mayor is not None:
+                    origen = imagen_mayor
+                    break
+                if os.path.exists(self._ruta_nivel(hash_imagen, nivel_mayor)):
+                    origen = self._ruta_nivel(hash_imagen, nivel_mayor)
+                    break
+        imagen = origen.copy() if isinstance(origen, Image.Image) else Image.open(origen)
+        if imagen.mode not in ('RGB', 'RGBA'):
+            imagen = imagen.convert('RGBA' if 'transparency' in imagen.info or imagen.mode in ('LA', 'PA') else 'RGB')
+        imagen.thumbnail((nivel, nivel))
+        return imagen
+
+    def _guardar_en_memoria(self, clave, imagen):
+        self._memoria[clave] = imagen
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_imagenes_memoria:
+            self._memoria.popitem(last=False)
+
+    def _guardar_en_disco(self, ruta_miniatura, imagen):
+        os.makedirs(self.carpeta, exist_ok=True)
+        salida = io.BytesIO()
+        imagen.save(salida, 'PNG')
+        escribir_atomico(ruta_miniatura, salida.getvalue())
+        with self._cerrojo:
+            if self._bytes_disco is None:
+                self._bytes_disco = sum(os.path.getsize(os.path.join(self.carpeta, n)) for n in os.listdir(self.carpeta) if n.endswith('.png'))
+            else:
+                self._bytes_disco += salida.tell()
+            if self._bytes_disco > self.max_bytes_disco:
+                self._desalojar(conservar=ruta_miniatura)
+
+    def _desalojar(self, conservar):
+        # Borra las miniaturas usadas hace más tiempo hasta quedar por debajo del 90 % del límite.
+        ficheros = []
+        for nombre in os.listdir(self.carpeta):
+            ruta = os.path.join(self.carpeta, nombre)
+            if nombre.endswith('.png') and ruta != conservar:
+                estado = os.stat(ruta)
+                ficheros.append((estado.st_mtime_ns, estado.st_size, ruta))
+        self._bytes_disco = sum(tam for _, tam, _ in ficheros) + os.path.getsize(conservar)
+        for _, tam, ruta in sorted(ficheros):
+            if self._bytes_disco <= self.max_bytes_disco * 0.9:
+                break
+            try:
+                os.remove(ruta)
+                self._bytes_disco -= tam
+            except FileNotFoundError: # Otro proceso ya la había borrado.
+                pass
+
+
+_caches_miniaturas = {}
+
+def obtener_cache_miniaturas(carpeta=CARPETA_MINIATURAS):
+    """Devuelve la caché de miniaturas compartida de `carpeta` (una por carpeta y proceso)."""
+    if carpeta not in _caches_miniaturas:
+        _caches_miniaturas[carpeta] = CacheMiniaturas(carpeta)
+    return _caches_miniaturas[carpeta]
+
+
 def reescale_image_if_needed(image_path, max_size=(800, 800), output_folder='imagenes_temp'):
     """
-    Reescala la imagen si es más grande que max_size y guarda la versión reescalada en output_folder.
-    Devuelve la ruta de la imagen reescalada (o la original si no fue necesario).
+    Devuelve la ruta de una versión de la imagen que cabe en max_size, tomada de la caché de
+    miniaturas de output_folder (se genera la primera vez). Como la miniatura ya está decodificada
+    y reescalada, abrirla es mucho más barato que abrir la original (sobre todo en AVIF).
+    Si algo falla, devuelve la ruta original.
     """
     if not os.path.exists(image_path):
         return image_path
     try:
-        img = Image.open(image_path)
-        if img.width > max_size[0] or img.height > max_size[1]:
-            os.makedirs(output_folder, exist_ok=True)
-            new_path = os.path.join(output_folder, os.path.basename(image_path))
-            img.thumbnail(max_size)
-            img.save(new_path)
-            return new_path
-        else:
-            return image_path
+        cache = obtener_cache_miniaturas(os.path.join(output_folder, 'miniaturas'))
+        return cache.ruta(image_path, max(max_size))
     except Exception:
         return image_path
 
 
+# Máscara de permisos del proceso, leída una sola vez (os.umask solo se puede leer cambiándola).
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def escribir_atomico(ruta, datos):
+    """
+    Escribe `datos` (bytes) en `ruta` de forma atómica: primero en un fichero temporal de la misma
+    carpeta y luego se renombra. Quien lea la ruta ve el fichero completo o no lo ve.
+    """
+    carpeta = os.path.dirname(ruta) or '.'
+    descriptor, ruta_temporal = tempfile.mkstemp(dir=carpeta, prefix='.' + os.path.basename(ruta) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(datos)
+        os.chmod(ruta_temporal, 0o666 & ~_UMASK) # mkstemp crea el fichero con permisos 0600.
+        os.replace(ruta_temporal, ruta)
+    except BaseException:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        raise
+
+
 def get_color_category(color):
     """
     Devuelve la categoría de un color (Neutro, Cálido, Frío) según COLOR_PALETTES.
@@ -39,39 +227,52 @@ def get_color_category(color):
 
 # --- FUNCIONES EXISTENTES (con una pequeña modificación en graficar_evolucion) ---
 
+# --- MOOD BOARDS ---
+CARPETA_MOOD_BOARDS = 'moodboards_temp'
+MAX_COLUMNAS_MOOD_BOARD = 8 # Permitir hasta 8 columnas para moodboards grandes
+MAX_MOOD_BOARDS_EN_DISCO = 200
+HILOS_MOOD_BOARD = 8
+VERSION_MOOD_BOARD = 1 # Forma parte de la huella: hay que subirla si cambia la composición del collage.
+
+
+def _tam_miniatura_mood_board(num_images):
+    # Ajustar el tamaño de las miniaturas según la cantidad de prendas
+    if num_images <= 8:
+        return 200
+    elif num_images <= 16:
+        return 150
+    elif num_images <= 32:
+        return 100
+    return 80
+
+
 def crear_mood_board(armario_df, output_path, img_folder='imagenes'):
     """
     Crea un collage (mood board) de imágenes de prendas.
     Si no hay imágenes, genera un placeholder blanco.
-    Guarda el resultado en output_path.
+    Guarda el resultado en output_path (de forma atómica).
     El collage se adapta dinámicamente para mostrar todas las prendas, haciéndose más ancho si es necesario.
     """
     image_paths = [os.path.join(img_folder, fname) for fname in armario_df['Imagen']]
-    # Reescalar imágenes si es necesario
-    images = [Image.open(reescale_image_if_needed(p)) for p in image_paths if os.path.exists(p)]
+    image_paths = [p for p in image_paths if os.path.exists(p)]
 
-    if not images:
+    if not image_paths:
         print("No se encontraron imágenes para crear el mood board.")
         # Crear una imagen en blanco como placeholder si no hay imágenes
         placeholder = Image.new('RGB', (200, 200), 'white')
-        placeholder.save(output_path)
+        guardar_imagen_atomica(placeholder, output_path)
         return
 
-    num_images = len(images)
-    # Permitir hasta 8 columnas para moodboards grandes
-    max_cols = 8
-    cols = min(max_cols, num_images) if num_images > 0 else 1
+    num_images = len(image_paths)
+    cols = min(MAX_COLUMNAS_MOOD_BOARD, num_images) if num_images > 0 else 1
     rows = (num_images + cols - 1) // cols if cols > 0 else 1
+    thumb_width = thumb_height = _tam_miniatura_mood_board(num_images)
 
-    # Ajustar el tamaño de las miniaturas según la cantidad de prendas
-    if num_images <= 8:
-        thumb_width = thumb_height = 200
-    elif num_images <= 16:
-        thumb_width = thumb_height = 150
-    elif num_images <= 32:
-        thumb_width = thumb_height = 100
-    else:
-        thumb_width = thumb_height = 80
+    # Las miniaturas salen de la caché (nivel del tamaño elegido); las que falten se decodifican
+    # en paralelo en varios hilos (Pillow libera el GIL mientras decodifica).
+    cache = obtener_cache_miniaturas()
+    with ThreadPoolExecutor(max_workers=min(HILOS_MOOD_BOARD, num_images)) as executor:
+        images = list(executor.map(lambda p: cache.obtener(p, thumb_width), image_paths))
 
     collage_width = cols * thumb_width
     collage_height = rows * thumb_height
@@ -83,10 +284,61 @@ def crear_mood_board(armario_df, output_path, img_folder='imagenes'):
         y = (i // cols) * thumb_height
         collage.paste(img, (x, y))
 
-    collage.save(output_path)
+    guardar_imagen_atomica(collage, output_path)
     print(f"Mood board guardado en: {output_path}")
 
 
+def huella_mood_board(armario_df, img_folder='imagenes'):
+    """
+    Huella de un mood board: hash de los IDs de las prendas, del contenido de sus imágenes y de los
+    parámetros de composición. Dos armarios con la misma huella producen el mismo mood board.
+    """
+    cache = obtener_cache_miniaturas()
+    huella = hashlib.sha256()
+    huella.update(repr((VERSION_MOOD_BOARD, MAX_COLUMNAS_MOOD_BOARD, img_folder)).encode())
+    for prenda_id, fname in zip(armario_df.index, armario_df['Imagen']):
+        ruta = os.path.join(img_folder, fname) if isinstance(fname, str) else None
+        contenido = cache.hash_contenido(ruta) if ruta and os.path.exists(ruta) else None
+        huella.update(repr((prenda_id, fname, contenido)).encode())
+    return huella.hexdigest()
+
+
+def mood_board_en_cache(armario_df, img_folder='imagenes', carpeta=CARPETA_MOOD_BOARDS):
+    """
+    Devuelve la ruta del mood board del armario, creándolo solo si no existe ya uno con la misma
+    huella. El nombre del fichero es la huella, así que sesiones distintas nunca se pisan: o
+    comparten el mismo mood board o escriben ficheros diferentes.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = os.path.join(carpeta, f'moodboard_{huella_mood_board(armario_df, img_folder)}.png')
+    if os.path.exists(ruta):
+        os.utime(ruta) # Marca el uso para conservar los más recientes.
+        return ruta
+    crear_mood_board(armario_df, ruta, img_folder=img_folder)
+    _podar_mood_boards(carpeta)
+    return ruta
+
+
+def _podar_mood_boards(carpeta):
+    # Conserva solo los MAX_MOOD_BOARDS_EN_DISCO usados más recientemente.
+    rutas = [os.path.join(carpeta, n) for n in os.listdir(carpeta) if n.startswith('moodboard_') and n.endswith('.png')]
+    if len(rutas) <= MAX_MOOD_BOARDS_EN_DISCO:
+        return
+    for ruta in sorted(rutas, key=os.path.getmtime)[:len(rutas) - MAX_MOOD_BOARDS_EN_DISCO]:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError: # Otra sesión ya lo había borrado.
+            pass
+
+
+def guardar_imagen_atomica(imagen, ruta):
+    """Guarda una imagen de PIL de forma atómica, con el formato de la extensión (PNG por defecto)."""
+    formato = Image.registered_extensions().get(os.path.splitext(ruta)[1].lower(), 'PNG')
+    salida = io.BytesIO()
+    imagen.save(salida, formato)
+    escribir_atomico(ruta, salida.getvalue())
+
+
 def graficar_evolucion_fitness(historial):
     """
     Grafica la evolución del mejor fitness por generación.